@@ -13,13 +13,35 @@ enum Command: uint8_t {
     setPinFunction,
     startLoop,
     stopLoop,
+    setStreamMode,
+    setSampleRate,
+    getAllPinFunctions,
 };
 
+// A command byte with this bit set is followed by a sequence byte; the reply is then
+// one line "@<seq> <reply>\r\n" so the host can match it to its request.
+#define COMMAND_TAG 0x80
+
 enum Response: uint8_t {
     ok,
     error,
 };
 
+// Loop data format, selected with Command::setStreamMode
+enum StreamMode: uint8_t {
+    ascii,   // one Serial.println(value) per sample
+    binary,  // packed sample frames, see README "Binary Sample Frame"
+};
+
+// Binary sample frame layout (little-endian):
+// 0xA5 0x5A <len: uint8> <seq: uint16> <time_ms: uint32> <dt_ms: uint16> <pin_mask: uint16>
+// <values: uint16 * n> <checksum: uint8>
+// len counts the bytes from seq to the last value, checksum is the 8-bit sum of len..last value.
+#define FRAME_SYNC_1 0xA5
+#define FRAME_SYNC_2 0x5A
+#define FRAME_HEADER_SIZE 13
+#define FRAME_MAX_VALUES 64
+
 enum PinFunction: uint8_t {
     disable,
     readDigital,
@@ -15,6 +15,23 @@ TaskHandle_t taskCommandInterfaceHandle = NULL;
 void taskLooper(void* parameters);
 TaskHandle_t taskLooperHandle = NULL;
 
+// Loop data streaming state
+// sampling period, changed with Command::setSampleRate (0 = as fast as possible)
+uint16_t samplePeriodMs = (100 / portTICK_PERIOD_MS) * portTICK_PERIOD_MS;
+TickType_t samplePeriodTicks = 100 / portTICK_PERIOD_MS;
+StreamMode streamMode = StreamMode::ascii;
+uint8_t samplesPerFrame = 8;
+uint16_t frameSequence = 0;
+uint16_t frameValues[FRAME_MAX_VALUES];
+uint8_t frameValueCount = 0;
+uint8_t frameTicks = 0;
+uint16_t framePinMask = 0;
+uint32_t frameStartMs = 0;
+
+bool waitForArguments(uint8_t count);
+uint16_t pinMaskOf(int pin);
+void sendSampleFrame(uint16_t pinMask, uint8_t valueCount);
+
 void setup() {
     // NewPinConfiguration(2, ARRAY(PinFunction::readDigital, PinFunction::writeDigital))
     // NewPinConfiguration(3, ARRAY(PinFunction::readDigital, PinFunction::writeDigital, PinFunction::writeAnalog))
@@ -68,14 +85,21 @@ void taskCommandInterface(void* parameters) {
     while (true) {         
         if (SerialCommand.available() > 0) {
             uint8_t command = SerialCommand.read();
-           
+            bool tagged = (command & COMMAND_TAG) && waitForArguments(1);
+            if (tagged) {
+                command &= ~COMMAND_TAG;
+                SerialCommand.print('@');
+                SerialCommand.print(SerialCommand.read());
+                SerialCommand.print(' ');
+            }
+
             switch (command) {
             case Command::functionMap:
                 //SerialCommand.print(Response::ok);
                 Serial.println(F("Function Map"));
                 break;
             case Command::getPinFunction:
-                if (SerialCommand.available() > 0) {
+                if (waitForArguments(1)) {
                     uint8_t pin = SerialCommand.read();
                     // 查找引脚配置
                     for (int i = 0; i < PinConfigurations.count(); i++) {
@@ -94,7 +118,7 @@ void taskCommandInterface(void* parameters) {
                 }
                 break;
             case Command::getCurrentPinFunction:
-                if (SerialCommand.available() > 0) {
+                if (waitForArguments(1)) {
                     uint8_t pin = SerialCommand.read();
                     // 查找引脚配置
                     for (int i = 0; i < PinConfigurations.count(); i++) {
@@ -109,8 +133,16 @@ void taskCommandInterface(void* parameters) {
                     }
                 }
                 break;
+            case Command::getAllPinFunctions:
+                // one digit per pin in PinConfigurations order, replaces a round-trip per pin
+                SerialCommand.print(Response::ok);
+                for (int i = 0; i < PinConfigurations.count(); i++) {
+                    SerialCommand.print(PinConfigurations[i].selectedFunction);
+                }
+                Serial.println(F("All pin functions getted"));
+                break;
             case Command::setPinFunction:
-                if (SerialCommand.available() > 1) {
+                if (waitForArguments(2)) {
                     uint8_t pin = SerialCommand.read();
                     uint8_t function = SerialCommand.read();
                     // 查找引脚配置并设置功能
@@ -143,56 +175,177 @@ void taskCommandInterface(void* parameters) {
                 SerialCommand.print(Response::ok);
                 Serial.println(F("Stop Loop"));
                 break;
+            case Command::setStreamMode:
+                if (waitForArguments(2)) {
+                    uint8_t mode = SerialCommand.read();
+                    uint8_t samples = SerialCommand.read();
+                    if (mode <= StreamMode::binary && samples > 0 && samples <= FRAME_MAX_VALUES) {
+                        streamMode = static_cast<StreamMode>(mode);
+                        samplesPerFrame = samples;
+                        frameValueCount = 0;
+                        SerialCommand.print(Response::ok);
+                        Serial.print(F("Stream mode set to "));
+                        Serial.println(mode);
+                    } else {
+                        SerialCommand.print(Response::error);
+                    }
+                }
+                break;
+            case Command::setSampleRate:
+                if (waitForArguments(2)) {
+                    uint16_t periodMs = SerialCommand.read();
+                    periodMs |= (uint16_t)SerialCommand.read() << 8;
+                    // vTaskDelay works in whole ticks, reply with the period actually used
+                    samplePeriodTicks = periodMs / portTICK_PERIOD_MS;
+                    if (periodMs > 0 && samplePeriodTicks == 0) {
+                        samplePeriodTicks = 1;
+                    }
+                    samplePeriodMs = samplePeriodTicks * portTICK_PERIOD_MS;
+                    frameValueCount = 0;
+                    SerialCommand.print(Response::ok);
+                    SerialCommand.print(samplePeriodMs);
+                    Serial.print(F("Sample period set to "));
+                    Serial.println(samplePeriodMs);
+                }
+                break;
             default:
                 //SerialCommand.print(Response::error);
                 //Serial.print(F("Error"));
                 break;
             }
+            if (tagged) {
+                SerialCommand.println();
+            }
         }
     }
-}  
+}
+
+// arguments may still be on the wire right after the command byte
+bool waitForArguments(uint8_t count) {
+    for (uint8_t i = 0; i < 4 && SerialCommand.available() < count; i++) {
+        vTaskDelay(1);
+    }
+    return SerialCommand.available() >= count;
+}
+
 void taskLooper(void* parameters) {
     while (true) {
-        float V_A = analogRead(A0);
-        Serial.println(V_A);
-
-// for(int i = 0; i < PinConfigurations.count(); i++) {
-        //     switch (PinConfigurations[i].selectedFunction) {
-        //         case PinFunction::readDigital:
-        //             Serial.println(F("read digital"));
-        //             break;
-        //         case PinFunction::writeDigital:
-        //             Serial.println(F("write digital"));
-        //             break;
-        //         case PinFunction::readAnalog:
-        //             Serial.println(F("read analog")); // 修正错误信息
-        //             break;
-        //         case PinFunction::writeAnalog:
-        //             Serial.println(F("write analog")); // 修正错误信息
-        //             break;
-        //         case PinFunction::disable:
-        //             Serial.println(F("disable")); // 修正错误信息
-        //             break;
-        //     }
-        // }
-        
-        if (SerialCommand.available() > 0) {
-            uint8_t command = SerialCommand.read();
-            switch (command) {
-            case Command::stopLoop:
-                vTaskSuspend(taskLooperHandle);
-                vTaskResume(taskCommandInterfaceHandle);
-                SerialCommand.print(Response::ok);
-                Serial.println(F("Stop Loop"));
-                break;
-            default:
-                //SerialCommand.print(Response::error);
-                //Serial.println(F("Error"));
-                break;
+        // sample every pin whose selectedFunction reads, in PinConfigurations order
+        uint16_t pinMask = 0;
+        int tickPins[16];
+        uint16_t tickValues[16];
+        uint8_t tickCount = 0;
+        for (int i = 0; i < PinConfigurations.count() && i < 16; i++) {
+            switch (PinConfigurations[i].selectedFunction) {
+                case PinFunction::readDigital:
+                    tickPins[tickCount] = PinConfigurations[i].pin;
+                    tickValues[tickCount++] = digitalRead(PinConfigurations[i].pin);
+                    pinMask |= (uint16_t)1 << i;
+                    break;
+                case PinFunction::readAnalog:
+                    tickPins[tickCount] = PinConfigurations[i].pin;
+                    tickValues[tickCount++] = analogRead(PinConfigurations[i].pin);
+                    pinMask |= (uint16_t)1 << i;
+                    break;
+                default:
+                    break;
+            }
+        }
+        // no pin is set to read: keep streaming A0 as before
+        bool defaultA0 = pinMask == 0;
+        if (defaultA0) {
+            tickPins[tickCount] = A0;
+            tickValues[tickCount++] = analogRead(A0);
+            pinMask = pinMaskOf(A0);
+        }
+
+        if (streamMode == StreamMode::binary) {
+            // one frame holds whole ticks of a single pin mask
+            if (frameValueCount > 0 && (pinMask != framePinMask || frameValueCount + tickCount > FRAME_MAX_VALUES)) {
+                sendSampleFrame(framePinMask, frameValueCount);
+                frameValueCount = 0;
+            }
+            if (frameValueCount == 0) {
+                frameStartMs = millis();
+                framePinMask = pinMask;
+                frameTicks = 0;
+            }
+            for (uint8_t i = 0; i < tickCount; i++) {
+                frameValues[frameValueCount++] = tickValues[i];
+            }
+            frameTicks++;
+            if (frameTicks >= samplesPerFrame) {
+                sendSampleFrame(framePinMask, frameValueCount);
+                frameValueCount = 0;
+            }
+        } else if (defaultA0) {
+            float V_A = tickValues[0];
+            Serial.println(V_A);
+        } else {
+            // one "pin,value" line per pin, pins from A0 on are printed as A0..A5
+            for (uint8_t i = 0; i < tickCount; i++) {
+                if (tickPins[i] >= A0) {
+                    Serial.print('A');
+                    Serial.print(tickPins[i] - A0);
+                } else {
+                    Serial.print(tickPins[i]);
+                }
+                Serial.print(',');
+                Serial.println(tickValues[i]);
             }
         }
 
         // delay depending on capture Hz
-        vTaskDelay(100 / portTICK_PERIOD_MS);
+        if (samplePeriodTicks > 0) {
+            vTaskDelay(samplePeriodTicks);
+        } else {
+            taskYIELD();
+        }
+    }
+}
+
+// bit i of the mask stands for PinConfigurations[i]
+uint16_t pinMaskOf(int pin) {
+    for (int i = 0; i < PinConfigurations.count(); i++) {
+        if (PinConfigurations[i].pin == pin) {
+            return (uint16_t)1 << i;
+        }
+    }
+    return 0;
+}
+
+void sendSampleFrame(uint16_t pinMask, uint8_t valueCount) {
+    static uint8_t frame[FRAME_HEADER_SIZE + FRAME_MAX_VALUES * 2 + 1];
+    uint16_t dtMs = samplePeriodMs;
+    if (dtMs == 0 && frameTicks > 1) {
+        // running as fast as possible: use the measured average interval
+        dtMs = (millis() - frameStartMs) / (frameTicks - 1);
+    }
+    uint8_t size = 0;
+
+    frame[size++] = FRAME_SYNC_1;
+    frame[size++] = FRAME_SYNC_2;
+    frame[size++] = FRAME_HEADER_SIZE - 3 + valueCount * 2;
+    frame[size++] = frameSequence & 0xFF;
+    frame[size++] = frameSequence >> 8;
+    for (uint8_t i = 0; i < 4; i++) {
+        frame[size++] = (frameStartMs >> (i * 8)) & 0xFF;
+    }
+    frame[size++] = dtMs & 0xFF;
+    frame[size++] = dtMs >> 8;
+    frame[size++] = pinMask & 0xFF;
+    frame[size++] = pinMask >> 8;
+    for (uint8_t i = 0; i < valueCount; i++) {
+        frame[size++] = frameValues[i] & 0xFF;
+        frame[size++] = frameValues[i] >> 8;
     }
+
+    uint8_t checksum = 0;
+    for (uint8_t i = 2; i < size; i++) {
+        checksum += frame[i];
+    }
+    frame[size++] = checksum;
+
+    Serial.write(frame, size);
+    frameSequence++;
 }
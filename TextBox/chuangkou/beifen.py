@@ -3,11 +3,10 @@ import serial
 import time
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTextEdit, QPushButton
 from PyQt5.QtGui import QFont
+from protocol import BAUDRATE, TIMEOUT, function_map, pin_functions, pin_ranges
 
 # 配置串口参数
 PORT = 'COM4'  # 根据实际情况修改
-BAUDRATE = 115200
-TIMEOUT = 1
 
 # 定义命令类型及其枚举值
 command_map = {
@@ -19,36 +18,6 @@ command_map = {
     'stopLoop': 5
 }
 
-# 定义功能名称及其枚举值
-function_map = {
-    'disable': 0,
-    'readDigital': 1,
-    'writeDigital': 2,
-    'readAnalog': 3,
-    'writeAnalog': 4
-}
-
-# 假设引脚范围，可根据实际情况调整
-pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
-
-# 定义每个引脚支持的功能
-pin_functions = {
-    4: ['readDigital', 'writeDigital'],
-    5: ['readDigital', 'writeDigital', 'writeAnalog'],
-    6: ['readDigital', 'writeDigital', 'writeAnalog'],
-    7: ['readDigital', 'writeDigital'],
-    8: ['readDigital', 'writeDigital'],
-    9: ['readDigital', 'writeDigital', 'writeAnalog'],
-    10: ['readDigital', 'writeDigital', 'writeAnalog'],
-    11: ['readDigital', 'writeDigital', 'writeAnalog'],
-    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A5': ['readDigital', 'writeDigital', 'readAnalog']
-}
-
 
 class ArduinoCommunicator(QWidget):
     def __init__(self):
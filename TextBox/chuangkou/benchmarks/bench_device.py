@@ -0,0 +1,103 @@
+# 采集核心基准：不启动 Qt，只测 TestBoxDevice（读取线程、分帧、解析、命令通道）加 ChannelStore 的接收速率和 CPU 占用，
+# 与界面无关的热点路径可以单独优化和对比。虚拟 TestBox 在独立进程中运行，CPU 统计只包含上位机。
+# --boards 同时连接多块板子，--workers 为服务它们的读取线程数（见 io_pool.py，0 为每个串口一个读取线程），线程数一并列出。
+# 用法（Linux/macOS，无需硬件）：python benchmarks/bench_device.py [--seconds 5] [--rates 1000 10000] [--mode ascii binary] [--pins 1 4]
+#     python benchmarks/bench_device.py --rates 10 --mode binary --pins 1 --boards 32 --workers 0 2
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from device import ChannelStore, TestBoxDevice
+from device_simulator import VirtualTestBox
+from io_pool import IO_WORKERS, IOPool
+from protocol import function_map, pin_number, stream_mode_map
+
+RATES = [1000, 10000]
+MODES = ['ascii', 'binary']
+PIN_COUNTS = [1, 4]
+BOARD_COUNTS = [1]
+SAMPLES_PER_FRAME = 8
+WARMUP_SECONDS = 1.0
+
+
+def run_device(rate, boards, conn):
+    devices = [VirtualTestBox(1000 / rate, noise=2, debug=False).start() for _ in range(boards)]
+    conn.send([device.port for device in devices])
+    conn.recv()
+    for device in devices:
+        device.stop()
+
+
+def configure(device, mode, pins):
+    # ASCII 模式下固件只输出 A0；二进制模式下打开 pins 个模拟引脚
+    futures = []
+    if mode == 'binary':
+        for i in range(pins):
+            futures.append(device.send('setPinFunction', (pin_number(f'A{i}'), function_map['readAnalog'])))
+        futures.append(device.send('setStreamMode', (stream_mode_map[mode], SAMPLES_PER_FRAME)))
+    futures.append(device.send('startLoop'))
+    for future in futures:
+        future.result()
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(rate, mode, pins, seconds, boards=1, workers=0):
+    conn, device_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=run_device, args=(rate, boards, device_conn), daemon=True)
+    process.start()
+    store = ChannelStore()
+    pool = IOPool(workers) if workers > 0 else None
+    devices = []
+    for index, port in enumerate(conn.recv()):
+        device = TestBoxDevice(port, index, pool=pool)
+        device.subscribe(on_samples=store)
+        devices.append(device.open())
+    for device in devices:
+        configure(device, mode, pins)
+    threads = threading.active_count()
+    time.sleep(WARMUP_SECONDS)
+    start, start_cpu, start_total = time.monotonic(), cpu_time(), store.total()
+    time.sleep(seconds)
+    elapsed, cpu, total = time.monotonic() - start, cpu_time() - start_cpu, store.total() - start_total
+    for device in devices:
+        device.close()
+    if pool is not None:
+        pool.close()
+    conn.send('stop')
+    process.join()
+    return total / elapsed, 100 * cpu / elapsed, threads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TestBoxDevice 采集核心基准（无界面）')
+    parser.add_argument('--seconds', type=float, default=5.0, help='每个组合的测量时长（不含 1 秒预热）')
+    parser.add_argument('--rates', type=int, nargs='+', default=RATES, help='采样率 Hz')
+    parser.add_argument('--mode', nargs='+', default=MODES, choices=MODES, help='循环数据格式')
+    parser.add_argument('--pins', type=int, nargs='+', default=PIN_COUNTS, help='二进制模式下的引脚数')
+    parser.add_argument('--boards', type=int, nargs='+', default=BOARD_COUNTS, help='同时连接的板子数')
+    parser.add_argument('--workers', type=int, nargs='+', default=[IO_WORKERS],
+                        help='服务所有串口的读取线程数，0 为每个串口一个读取线程')
+    args = parser.parse_args()
+
+    print(f'{"格式":>8} {"引脚":>4} {"采样率":>8} {"板子":>4} {"读线程":>6} {"目标/秒":>9} {"处理/秒":>9} {"CPU%":>7} {"线程":>5}')
+    for mode in args.mode:
+        for pins in args.pins if mode == 'binary' else [1]:
+            for rate in args.rates:
+                for boards in args.boards:
+                    for workers in args.workers:
+                        processed, cpu, threads = run(rate, mode, pins, args.seconds, boards, workers)
+                        print(f'{mode:>8} {pins:>4} {rate:>8} {boards:>4} {workers:>6} {rate * pins * boards:>9} '
+                              f'{processed:>9.0f} {cpu:>7.1f} {threads:>5}', flush=True)
+
+
+if __name__ == '__main__':
+    main()
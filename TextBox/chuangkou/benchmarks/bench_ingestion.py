@@ -0,0 +1,180 @@
+# 接收链路基准：虚拟 TestBox 以 10/100/1k/10k 采样/秒向 1~3 个串口输出 ASCII 循环数据，
+# 测量 disiban.ArduinoCommunicator 完整数据路径（read_serial_data/read_samples → loop_data/raw_data → QTextEdit.append → update_raw_image）的
+# 持续处理速率、CPU 占用、峰值内存和端到端延迟（设备写出到界面线程处理完该批数据）。
+# 无界面运行（offscreen），每个组合在独立子进程中运行，峰值内存互不影响，结果可在版本之间对比。
+# --processes 时每个串口在独立的采集进程中读取（disiban.PROCESS_PER_PORT），CPU 和内存只统计界面进程。
+# 用法（Linux/macOS，无需硬件）：python benchmarks/bench_ingestion.py [--seconds 5] [--rates 10 100 1000 10000] [--ports 1 2 3]
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from device_simulator import VirtualTestBox
+
+RATES = [10, 100, 1000, 10000]
+PORT_COUNTS = [1, 2, 3]
+WARMUP_SECONDS = 1.0
+
+
+def run_devices(count, rate, conn):
+    # 设备在独立进程中运行，CPU 和内存统计只包含上位机；time.monotonic 在进程之间可比较
+    devices = [VirtualTestBox(1000 / rate, noise=2, debug=False, record_send_times=True).start()
+               for _ in range(count)]
+    conn.send([device.port for device in devices])
+    conn.recv()
+    conn.send([device.send_log for device in devices])
+    for device in devices:
+        device.stop()
+
+
+def run_single(rate, ports, seconds, processes=False):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    import disiban
+    disiban.PROCESS_PER_PORT = processes
+    # 不写采集文件：只测接收链路，也不在当前目录留下 captures/
+    disiban.CAPTURE_DIR = None
+
+    class BenchCommunicator(disiban.ArduinoCommunicator):
+        # 记录每批采样处理完的时间和累计采样数；按采样而不是数据行计数，采集进程只转发部分数据行
+        def __init__(self):
+            self.batches = {}
+            super().__init__()
+
+        def read_samples(self, index, samples):
+            super().read_samples(index, samples)
+            log = self.batches.setdefault(index, [])
+            count = sum(len(values) for _, values in samples.values())
+            log.append(((log[-1][0] if log else 0) + count, time.monotonic()))
+
+    conn, device_conn = multiprocessing.Pipe()
+    device_process = multiprocessing.Process(target=run_devices, args=(ports, rate, device_conn), daemon=True)
+    device_process.start()
+    device_ports = conn.recv()
+
+    app = QApplication.instance() or QApplication([])
+    window = BenchCommunicator()
+    # 不指定配置串口，每个串口都创建图表
+    window.config_port_combo.setCurrentIndex(-1)
+    while len(window.port_combos) < len(device_ports):
+        window.add_port()
+    for index, port in enumerate(device_ports):
+        window.port_combos[index].setEditText(port)
+        window.on_connect(index)
+    # 采集进程在后台启动，全部连上后再开始循环
+    while window.opening:
+        app.processEvents()
+        time.sleep(0.01)
+    for index in range(len(device_ports)):
+        window.send_general_command(index, 'startLoop')
+
+    marks = {}
+
+    def mark(name):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        marks[name] = (time.monotonic(), usage.ru_utime + usage.ru_stime,
+                       {index: (log[-1][0] if log else 0) for index, log in list(window.batches.items())})
+
+    def measure():
+        # 测量在普通线程中进行：界面线程跟不上时排队的信号会一直压着 Qt 定时器，
+        # 结束时也不等积压处理完，直接输出结果并退出
+        time.sleep(WARMUP_SECONDS)
+        mark('start')
+        time.sleep(seconds)
+        mark('end')
+        for device in list(window.devices.values()):
+            if device is not None:
+                device.close()
+        conn.send('stop')
+        send_logs = conn.recv()
+        device_process.join()
+        print(json.dumps(summarize(rate, ports, marks, window.batches, send_logs)), flush=True)
+        os._exit(0)
+
+    threading.Thread(target=measure, daemon=True).start()
+    app.exec_()
+
+
+def summarize(rate, ports, marks, batches, send_logs):
+    start_time, start_cpu, start_counts = marks['start']
+    end_time, end_cpu, end_counts = marks['end']
+    elapsed = end_time - start_time
+    processed = sum(end_counts.get(i, 0) - start_counts.get(i, 0) for i in range(ports))
+    latencies = []
+    backlog = 0
+    for index, send_log in enumerate(send_logs):
+        if not send_log:
+            continue
+        sent_counts, sent_times = np.array(send_log).T
+        # 测量结束时已写出但界面线程还没处理的采样数
+        written = np.searchsorted(sent_times, end_time, side='right')
+        if written:
+            backlog += int(sent_counts[written - 1]) - end_counts.get(index, 0)
+        for count, done in list(batches.get(index, [])):
+            if start_time <= done <= end_time:
+                # 这一批最后一个采样写出的时间
+                position = min(np.searchsorted(sent_counts, count), len(sent_times) - 1)
+                latencies.append(done - sent_times[position])
+    latencies = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        'rate': rate,
+        'ports': ports,
+        'target': rate * ports,
+        'processed_rate': processed / elapsed,
+        'backlog': max(0, backlog),
+        'cpu_percent': 100 * (end_cpu - start_cpu) / elapsed,
+        # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 if sys.platform != 'darwin' else 1024 ** 2),
+        'latency_ms': {f'p{p}': float(np.percentile(latencies, p)) for p in (50, 95, 99)},
+        'latency_max_ms': float(latencies.max()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='disiban 接收链路基准')
+    parser.add_argument('--seconds', type=float, default=5.0, help='每个组合的测量时长（不含 1 秒预热）')
+    parser.add_argument('--rates', type=int, nargs='+', default=RATES, help='每个串口的采样率 Hz')
+    parser.add_argument('--ports', type=int, nargs='+', default=PORT_COUNTS, help='串口数')
+    parser.add_argument('--processes', action='store_true', help='每个串口在独立的采集进程中读取')
+    parser.add_argument('--json', help='把结果另存为 JSON，便于版本之间对比')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # 结果由 run_single 打印为一行 JSON
+        run_single(args.rates[0], args.ports[0], args.seconds, args.processes)
+        return
+
+    results = []
+    print(f'{"采样率":>8} {"串口":>4} {"目标/秒":>9} {"处理/秒":>9} {"积压":>9} {"CPU%":>7} {"峰值MB":>8} '
+          f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>9}')
+    for ports in args.ports:
+        for rate in args.rates:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--single', '--rates', str(rate),
+                 '--ports', str(ports), '--seconds', str(args.seconds)] + (['--processes'] if args.processes else []),
+                capture_output=True, text=True)
+            if output.returncode != 0:
+                print(f'{rate:>8} {ports:>4} 失败: {output.stderr.strip().splitlines()[-1:]}')
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            results.append(result)
+            latency = result['latency_ms']
+            print(f'{rate:>8} {ports:>4} {result["target"]:>9} {result["processed_rate"]:>9.0f} '
+                  f'{result["backlog"]:>9} {result["cpu_percent"]:>7.1f} {result["peak_rss_mb"]:>8.1f} {latency["p50"]:>8.1f} '
+                  f'{latency["p95"]:>8.1f} {latency["p99"]:>8.1f} {result["latency_max_ms"]:>9.1f}', flush=True)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# 分帧微基准：对比逐行 readline() 与 LineFramer 批量读取的每秒行数
+# 用法（Linux/macOS，无需硬件）：python benchmarks/bench_line_framer.py [行数]
+import os
+import sys
+import threading
+import time
+
+import serial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from line_framer import LineFramer
+
+CHUNK = 4096
+
+
+def make_payload(count):
+    # 与固件 Serial.println(float) 的输出格式一致，例如 "512.00\r\n"
+    return b''.join(b'%.2f\r\n' % (i % 1024) for i in range(count))
+
+
+def open_pty():
+    master, slave = os.openpty()
+    ser = serial.Serial(os.ttyname(slave), 115200, timeout=1)
+    return master, slave, ser
+
+
+def feed(master, payload):
+    for start in range(0, len(payload), CHUNK):
+        os.write(master, payload[start:start + CHUNK])
+
+
+def run(name, count, consume):
+    master, slave, ser = open_pty()
+    writer = threading.Thread(target=feed, args=(master, make_payload(count)), daemon=True)
+    start = time.perf_counter()
+    writer.start()
+    received = consume(ser, count)
+    elapsed = time.perf_counter() - start
+    writer.join()
+    ser.close()
+    os.close(master)
+    os.close(slave)
+    print(f'{name:<28} {received:>9} 行  {elapsed:8.3f} s  {received / elapsed:12.0f} 行/秒')
+
+
+def consume_readline(ser, count):
+    # 现有做法：每个采样一次 readline().decode().strip() 和 float()
+    received = 0
+    while received < count:
+        line = ser.readline().decode().strip()
+        if line:
+            float(line)
+            received += 1
+    return received
+
+
+def consume_framer_lines(ser, count):
+    framer = LineFramer()
+    received = 0
+    while received < count:
+        for line in framer.feed_lines(ser.read(ser.in_waiting or 1)):
+            float(line)
+            received += 1
+    return received
+
+
+def consume_framer_values(ser, count):
+    framer = LineFramer()
+    received = 0
+    while received < count:
+        values, invalid = framer.feed_values(ser.read(ser.in_waiting or 1))
+        received += len(values) + len(invalid)
+    return received
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    run('readline() 逐行', count, consume_readline)
+    run('LineFramer.feed_lines', count, consume_framer_lines)
+    run('LineFramer.feed_values', count, consume_framer_values)
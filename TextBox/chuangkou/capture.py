@@ -0,0 +1,449 @@
+import argparse
+import bisect
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from csv_export import write_csv
+
+# 二进制采集文件：一个目录（约定以 .tbcap 结尾），包含 header.json 和若干块文件 chunk_000000.bin ...
+# 块文件只追加定长记录（小端）：<time: float64 Unix 秒> <channel: uint16> <value: float32>，没有文件头，
+# 任何块都可以直接 numpy.memmap 打开。header.json 记录格式版本、通道编号到名称的映射和块索引
+# （每块的文件名、记录数、最早和最晚的时间），每写满一块和关闭时原子地更新一次；
+# 异常退出时最后一块不在索引中，打开时按文件大小补上，最后一条不完整的记录被忽略。
+# 写入的同时为每个通道逐级生成摘要（summary/c<通道>_l<级>.bin）：第 1 级每 SUMMARY_FACTOR 个采样一条，
+# 第 k 级每 SUMMARY_FACTOR 条第 k-1 级摘要一条，记录这一组的起始时间、最小值、最大值和平均值。
+# 查看任意时间范围时选择点数不超过画布宽度的那一级（CaptureReader.view），只读取几千条记录，与文件长度无关。
+FORMAT_NAME = 'TestBox capture'
+FORMAT_VERSION = 1
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('channel', '<u2'), ('value', '<f4')])
+# 每块的记录数（约 14 MB），块越大索引越小，越小则按时间截取时多读的越少
+CHUNK_RECORDS = 1 << 20
+HEADER_FILE = 'header.json'
+SUMMARY_DIR = 'summary'
+SUMMARY_DTYPE = np.dtype([('time', '<f8'), ('min', '<f4'), ('max', '<f4'), ('mean', '<f4')])
+SUMMARY_FACTOR = 16
+# 第 6 级每条摘要约 1600 万个采样，10 kHz 记录 24 小时也只有约 50 条
+SUMMARY_LEVELS = 6
+# float32 的有效位数，转成 CSV 时不写出多余的尾数
+VALUE_FORMAT = '%.7g'
+CSV_HEADER = ['timestamp', 'channel', 'value']
+
+
+def chunk_file(number):
+    return f'chunk_{number:06d}.bin'
+
+
+def summary_file(channel, level):
+    return os.path.join(SUMMARY_DIR, f'c{channel:03d}_l{level}.bin')
+
+
+def summarize_groups(entries, factor):
+    # 把 entries（SUMMARY_DTYPE）每 factor 条合并为一条，最后不足 factor 条的一组也合并为一条
+    count = -(-len(entries) // factor)
+    padded = np.empty(count * factor, SUMMARY_DTYPE)
+    padded[:len(entries)] = entries
+    # 补齐的部分复制最后一条，不影响最小值和最大值；平均值按实际条数计算
+    padded[len(entries):] = entries[-1]
+    groups = padded.reshape(count, factor)
+    out = np.empty(count, SUMMARY_DTYPE)
+    out['time'] = groups['time'][:, 0]
+    out['min'] = groups['min'].min(axis=1)
+    out['max'] = groups['max'].max(axis=1)
+    sizes = np.full(count, factor)
+    sizes[-1] = len(entries) - (count - 1) * factor
+    out['mean'] = np.add.reduceat(entries['mean'].astype(np.float64), np.arange(0, len(entries), factor)) / sizes
+    return out
+
+
+class CaptureWriter:
+    # 追加写入采集文件，不是线程安全的；在采集线程中使用时应放到后台线程（见 CaptureRecorder）
+    def __init__(self, path, chunk_records=CHUNK_RECORDS):
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, HEADER_FILE)):
+            raise FileExistsError(f'采集文件已存在: {path}')
+        self.path = path
+        self.chunk_records = chunk_records
+        self.channels = {}  # 名称 -> 编号
+        self.chunks = []  # 已写满的块的索引
+        self.records = 0
+        self.created = time.time()
+        self._file = None
+        self._count = 0
+        self._t_min = np.inf
+        self._t_max = -np.inf
+        self._sorted = True  # 当前块的时间是否单调不减，读取时可以二分查找
+        self._t_last = -np.inf
+        self._summary_files = {}  # (通道, 级) -> 文件
+        self._summary_pending = {}  # (通道, 级) -> 还不够一组的下一级输入
+        os.makedirs(os.path.join(path, SUMMARY_DIR), exist_ok=True)
+        self._write_header()
+
+    def channel_id(self, name):
+        name = str(name)
+        if name not in self.channels:
+            self.channels[name] = len(self.channels)
+            self._write_header()
+        return self.channels[name]
+
+    def append(self, channel, times, values):
+        # 写入一个通道的一批数据，times 为 Unix 时间（秒）
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values)
+        if len(times) != len(values):
+            raise ValueError(f'时间戳和数值个数不一致: {len(times)} != {len(values)}')
+        number = self.channel_id(channel)
+        records = np.empty(len(times), RECORD_DTYPE)
+        records['time'] = times
+        records['channel'] = number
+        records['value'] = values
+        self.write_records(records)
+        if len(records):
+            entries = np.empty(len(records), SUMMARY_DTYPE)
+            entries['time'] = times
+            entries['min'] = entries['max'] = entries['mean'] = records['value']
+            self._summarize(number, 1, entries)
+
+    def write_records(self, records):
+        start = 0
+        while start < len(records):
+            if self._file is None:
+                self._file = open(os.path.join(self.path, chunk_file(len(self.chunks))), 'wb')
+            part = records[start:start + self.chunk_records - self._count]
+            part.tofile(self._file)
+            if self._sorted and (np.any(np.diff(part['time']) < 0) or (self._count and part['time'][0] < self._t_last)):
+                self._sorted = False
+            self._t_last = float(part['time'][-1])
+            self._count += len(part)
+            self._t_min = min(self._t_min, float(part['time'].min()))
+            self._t_max = max(self._t_max, float(part['time'].max()))
+            self.records += len(part)
+            start += len(part)
+            if self._count >= self.chunk_records:
+                self._finish_chunk()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+        for f in self._summary_files.values():
+            f.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._finish_chunk()
+        # 不足一组的尾部也写成一条摘要，逐级向上合并
+        for level in range(1, SUMMARY_LEVELS + 1):
+            for channel in self.channels.values():
+                pending = self._summary_pending.pop((channel, level), None)
+                if pending is None or not len(pending):
+                    continue
+                out = summarize_groups(pending, SUMMARY_FACTOR)
+                self._write_summary(channel, level, out)
+                if level < SUMMARY_LEVELS:
+                    upper = self._summary_pending.get((channel, level + 1), np.empty(0, SUMMARY_DTYPE))
+                    self._summary_pending[(channel, level + 1)] = np.concatenate((upper, out))
+        for f in self._summary_files.values():
+            f.close()
+        self._summary_files = {}
+        self._write_header()
+
+    def _summarize(self, channel, level, entries):
+        # entries 为第 level - 1 级的新数据（第 0 级即采样本身），凑满 SUMMARY_FACTOR 条就生成一条第 level 级摘要
+        key = (channel, level)
+        pending = self._summary_pending.get(key)
+        if pending is not None and len(pending):
+            entries = np.concatenate((pending, entries))
+        full = len(entries) // SUMMARY_FACTOR * SUMMARY_FACTOR
+        self._summary_pending[key] = entries[full:].copy()
+        if not full:
+            return
+        out = summarize_groups(entries[:full], SUMMARY_FACTOR)
+        self._write_summary(channel, level, out)
+        if level < SUMMARY_LEVELS:
+            self._summarize(channel, level + 1, out)
+
+    def _write_summary(self, channel, level, entries):
+        f = self._summary_files.get((channel, level))
+        if f is None:
+            f = self._summary_files[(channel, level)] = open(
+                os.path.join(self.path, summary_file(int(channel), level)), 'ab')
+        entries.tofile(f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _finish_chunk(self):
+        self._file.close()
+        self._file = None
+        self.chunks.append({'file': chunk_file(len(self.chunks)), 'records': self._count,
+                            't_min': self._t_min, 't_max': self._t_max, 'sorted': self._sorted})
+        self._count = 0
+        self._t_min = np.inf
+        self._t_max = -np.inf
+        self._sorted = True
+        self._write_header()
+
+    def _write_header(self):
+        header = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'record': [[name, RECORD_DTYPE.fields[name][0].str] for name in RECORD_DTYPE.names],
+            'created': self.created,
+            'channels': {str(number): name for name, number in self.channels.items()},
+            'summary_factor': SUMMARY_FACTOR,
+            'summary_levels': SUMMARY_LEVELS,
+            'chunks': self.chunks,
+        }
+        # 先写临时文件再替换，任何时候读到的 header.json 都是完整的
+        temp = os.path.join(self.path, HEADER_FILE + '.tmp')
+        with open(temp, 'w') as f:
+            json.dump(header, f, indent=1)
+        os.replace(temp, os.path.join(self.path, HEADER_FILE))
+
+
+class CaptureReader:
+    # 只读打开采集文件：每块一个 numpy.memmap，打开时不读取数据，按时间截取时只访问时间范围重叠的块
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE)) as f:
+            header = json.load(f)
+        if header.get('format') != FORMAT_NAME or header.get('version') != FORMAT_VERSION:
+            raise ValueError(f'不支持的采集文件格式: {header.get("format")} {header.get("version")}')
+        self.created = header['created']
+        self.channels = {int(number): name for number, name in header['channels'].items()}
+        self.summary_factor = header.get('summary_factor', SUMMARY_FACTOR)
+        self.summary_levels = header.get('summary_levels', 0)
+        self._summaries = {}
+        self.index = list(header['chunks'])
+        # 索引之后异常退出时还没写进索引的块
+        while os.path.exists(os.path.join(path, chunk_file(len(self.index)))):
+            self.index.append({'file': chunk_file(len(self.index)), 'records': None, 't_min': None, 't_max': None})
+        self.chunks = []
+        for entry in self.index:
+            file_path = os.path.join(path, entry['file'])
+            count = os.path.getsize(file_path) // RECORD_DTYPE.itemsize
+            if entry['records'] is not None:
+                count = min(count, entry['records'])
+            chunk = np.memmap(file_path, RECORD_DTYPE, 'r', shape=(count,)) if count else np.empty(0, RECORD_DTYPE)
+            if entry['t_min'] is None and count:
+                entry.update(records=count, t_min=float(chunk['time'].min()), t_max=float(chunk['time'].max()))
+            self.chunks.append(chunk)
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self.chunks)
+
+    def channel_names(self):
+        return [self.channels[number] for number in sorted(self.channels)]
+
+    def time_range(self):
+        entries = [entry for entry in self.index if entry['records']]
+        if not entries:
+            return None
+        return min(entry['t_min'] for entry in entries), max(entry['t_max'] for entry in entries)
+
+    def iter_chunks(self, start=None, end=None, channel=None):
+        # 依次给出每块中落在 [start, end) 内、属于 channel（名称，None 表示全部）的记录；
+        # 整块都符合条件时给出 memmap 视图，否则给出筛选后的副本，内存占用不超过一块
+        number = None
+        if channel is not None:
+            number = self.channel_number(channel)
+            if number is None:
+                return
+        for entry, chunk in zip(self.index, self.chunks):
+            if not len(chunk):
+                continue
+            if (start is not None and entry['t_max'] < start) or (end is not None and entry['t_min'] >= end):
+                continue
+            if entry.get('sorted'):
+                # 时间有序的块二分查找范围，只访问 log(n) 条记录和范围内的数据
+                times = chunk['time']
+                first = bisect.bisect_left(times, start) if start is not None else 0
+                last = bisect.bisect_left(times, end) if end is not None else len(chunk)
+                records = chunk[first:last]
+                if number is not None and len(self.channels) > 1:
+                    records = records[records['channel'] == number]
+                if len(records):
+                    yield records
+                continue
+            mask = None
+            if start is not None and entry['t_min'] < start:
+                mask = chunk['time'] >= start
+            if end is not None and entry['t_max'] >= end:
+                mask = chunk['time'] < end if mask is None else mask & (chunk['time'] < end)
+            if number is not None and len(self.channels) > 1:
+                mask = chunk['channel'] == number if mask is None else mask & (chunk['channel'] == number)
+            records = chunk if mask is None else chunk[mask]
+            if len(records):
+                yield records
+
+    def read(self, start=None, end=None, channel=None):
+        # [start, end) 内 channel 的全部记录，返回 (时间, 数值) 副本；范围很大时用 iter_chunks 分块处理
+        parts = list(self.iter_chunks(start, end, channel))
+        if not parts:
+            return np.empty(0), np.empty(0, np.float32)
+        records = np.concatenate(parts)
+        return records['time'].copy(), records['value'].copy()
+
+
+    def channel_number(self, channel):
+        return next((n for n, name in self.channels.items() if name == str(channel)), None)
+
+    def summary(self, channel, level):
+        # 第 level 级摘要（SUMMARY_DTYPE 的 memmap），按时间排列；没有时返回空数组
+        number = self.channel_number(channel)
+        key = (number, level)
+        if key not in self._summaries:
+            path = os.path.join(self.path, summary_file(number, level)) if number is not None else ''
+            count = os.path.getsize(path) // SUMMARY_DTYPE.itemsize if os.path.exists(path) else 0
+            self._summaries[key] = np.memmap(path, SUMMARY_DTYPE, 'r', shape=(count,)) if count else np.empty(0, SUMMARY_DTYPE)
+        return self._summaries[key]
+
+    def view(self, channel, start, end, max_points):
+        # 绘制 [start, end) 所需的点：选择点数不超过 max_points 的最细一级。
+        # 范围内的采样足够少时返回原始采样，否则返回摘要的包络（每条摘要在其起始时间给出最小值和最大值两个点），
+        # 两侧各多给一条，曲线能延伸到坐标区边缘。返回 (时间, 数值, 级)，只读取返回的这些记录
+        for level in range(1, self.summary_levels + 1):
+            entries = self.summary(channel, level)
+            times = entries['time']
+            first = max(0, bisect.bisect_left(times, start) - 1)
+            last = min(len(entries), bisect.bisect_left(times, end) + 1)
+            if level == 1 and (last - first) * self.summary_factor <= max_points:
+                # 原始采样也向两侧多读到相邻的摘要边界，放大到只剩一两个采样时曲线仍然贯穿坐标区
+                raw_start = min(start, times[first]) if first < len(entries) else start
+                raw_end = times[last] if last < len(entries) else None
+                times, values = self.read(raw_start, raw_end, channel)
+                return times, values, 0
+            if 2 * (last - first) <= max_points or level == self.summary_levels:
+                break
+        else:
+            # 旧版本没有摘要的文件
+            times, values = self.read(start, end, channel)
+            return times, values, 0
+        part = entries[first:last]
+        return np.repeat(part['time'], 2), np.column_stack((part['min'], part['max'])).ravel(), level
+
+
+def capture_series(reader, start=None, end=None):
+    # 按通道逐块给出 (通道名, 时间, 数值)，作为 csv_export.write_csv / export_in_background 的 series
+    for name in reader.channel_names():
+        for records in reader.iter_chunks(start, end, name):
+            yield name, records['time'], records['value']
+
+
+def capture_to_csv(path, csv_path, start=None, end=None, progress=None, cancelled=None):
+    # CSV 导出建立在采集文件之上：按通道逐块读取 memmap，交给 csv_export.write_csv 分块格式化，
+    # 内存占用与采集文件大小无关；返回是否写完
+    reader = CaptureReader(path)
+    total = len(reader) if start is None and end is None else None
+    return write_csv(csv_path, CSV_HEADER, capture_series(reader, start, end), total=total,
+                     value_format=VALUE_FORMAT, progress=progress, cancelled=cancelled)
+
+
+_STOP = object()
+
+
+class CaptureRecorder(threading.Thread):
+    # 后台写采集文件：write(channel, times, values) 只把一批数据放进队列，写线程一次取空队列后写盘，
+    # 每 flush_interval 秒 flush 一次，磁盘变慢不会拖住采集；队列满时丢弃的采样数记在 dropped 中
+    def __init__(self, path, flush_interval=1.0, max_queued=10000):
+        super().__init__(name=f'CaptureRecorder-{os.path.basename(path)}', daemon=True)
+        self.writer = CaptureWriter(path)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.error = None
+        self._queue = queue.Queue(max_queued)
+        self._closed = False
+
+    @property
+    def path(self):
+        return self.writer.path
+
+    def write(self, channel, times, values):
+        if self._closed or not len(values):
+            return
+        try:
+            self._queue.put_nowait((channel, times, values))
+        except queue.Full:
+            self.dropped += len(values)
+
+    def close(self, timeout=5.0):
+        if self._closed:
+            return
+        self._closed = True
+        if self.is_alive():
+            self._queue.put(_STOP)
+            self.join(timeout)
+        else:
+            self._drain(block=False)
+            self.writer.close()
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            stop = self._drain(block=True)
+            if stop:
+                break
+            now = time.monotonic()
+            if now - last_flush >= self.flush_interval:
+                self.writer.flush()
+                last_flush = now
+        try:
+            self.writer.close()
+        except OSError as e:
+            self.error = e
+
+    def _drain(self, block):
+        # 取空队列并写入，返回是否收到停止标记
+        batches = []
+        try:
+            if block:
+                batches.append(self._queue.get(timeout=self.flush_interval))
+            while True:
+                batches.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        stop = False
+        for batch in batches:
+            if batch is _STOP:
+                stop = True
+                continue
+            try:
+                self.writer.append(*batch)
+            except (OSError, ValueError) as e:
+                self.error = e
+        return stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TestBox 采集文件工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    info = subparsers.add_parser('info', help='显示通道、记录数和时间范围')
+    info.add_argument('path')
+    to_csv = subparsers.add_parser('csv', help='转换为 CSV')
+    to_csv.add_argument('path')
+    to_csv.add_argument('output')
+    to_csv.add_argument('--start', type=float, help='起始 Unix 时间（秒）')
+    to_csv.add_argument('--end', type=float, help='结束 Unix 时间（秒，不含）')
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        reader = CaptureReader(args.path)
+        print(f'通道: {", ".join(reader.channel_names())}')
+        print(f'记录数: {len(reader)}，块数: {len(reader.chunks)}')
+        span = reader.time_range()
+        if span:
+            print(f'时间: {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(span[0]))} - '
+                  f'{time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(span[1]))}')
+    else:
+        capture_to_csv(args.path, args.output, args.start, args.end)
+
+
+if __name__ == '__main__':
+    main()
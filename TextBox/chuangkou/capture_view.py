@@ -0,0 +1,60 @@
+from PyQt5.QtCore import QTimer
+
+from live_plot import MIN_POINTS
+
+# 缩放、平移停止后多久重新取数据（毫秒），拖动过程中不反复读取
+REFRESH_DELAY_MS = 50
+
+
+class CaptureView:
+    # 在 matplotlib 坐标区中回看采集文件：横轴范围改变（工具栏缩放、平移）后，
+    # 按当前范围和坐标区宽度向 CaptureReader.view 查询匹配的摘要级别，每条曲线只读取约 2 倍像素宽度的点，
+    # 从整段记录缩放到单个采样都与文件长度无关。横轴为相对记录开始的秒数。
+    def __init__(self, canvas, ax, reader, channels=None):
+        self.canvas = canvas
+        self.ax = ax
+        self.reader = reader
+        self.channels = list(channels) if channels is not None else reader.channel_names()
+        span = reader.time_range()
+        self.origin = span[0] if span else 0.0
+        self.levels = {}  # 每个通道当前显示的级别，0 为原始采样
+        self.lines = {}
+        for channel in self.channels:
+            self.lines[channel], = ax.plot([], [], label=str(channel))
+        if len(self.channels) > 1:
+            ax.legend()
+        ax.set_xlabel('时间 (s)')
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.refresh)
+        self._callback = ax.callbacks.connect('xlim_changed', lambda ax: self._timer.start(REFRESH_DELAY_MS))
+
+    def point_budget(self):
+        return max(MIN_POINTS, 2 * int(self.ax.bbox.width))
+
+    def show_all(self):
+        # 显示整段记录
+        span = self.reader.time_range()
+        if span is None:
+            return
+        self.ax.set_xlim(0, (span[1] - self.origin) or 1.0)
+        self.refresh()
+        self.ax.relim()
+        self.ax.autoscale_view(scalex=False)
+        self.canvas.draw_idle()
+
+    def refresh(self):
+        x0, x1 = self.ax.get_xlim()
+        budget = self.point_budget()
+        for channel, line in self.lines.items():
+            times, values, level = self.reader.view(channel, self.origin + x0, self.origin + x1, budget)
+            line.set_data(times - self.origin, values)
+            self.levels[channel] = level
+        self.canvas.draw_idle()
+
+    def close(self):
+        self._timer.stop()
+        self.ax.callbacks.disconnect(self._callback)
+        for line in self.lines.values():
+            line.remove()
+        self.lines = {}
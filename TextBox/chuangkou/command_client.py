@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+
+# 带序号命令的标志位，与 TestBox/include/Configuration.h 中的 COMMAND_TAG 一致
+COMMAND_TAG = 0x80
+# 带序号命令的应答行格式为 "@<seq> <应答>"
+REPLY_PREFIX = '@'
+
+# 固件 Response 枚举以数字形式打印在应答的开头
+RESPONSE_OK = 0
+RESPONSE_ERROR = 1
+
+
+def parse_reply(response):
+    # 把应答拆成 (状态, 其余内容)，状态无法识别时为 None
+    if response and response[0].isdigit():
+        return int(response[0]), response[1:]
+    return None, response or ''
+
+
+def reply_or_none(future):
+    # 已完成的 Future 取应答；超时、取消或写入失败时为 None，与回调接口的约定一致
+    if future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+class CommandClient:
+    # 带序号的命令通道：每个请求带一个序号，固件在应答行开头回显该序号，
+    # 读取线程把应答行交给 handle_line，再按序号完成等待该应答的 Future。
+    # 不再需要 sleep 等待，延迟等于实际往返时间；循环数据不会被当作应答；最多 256 个命令同时在途。
+    # 写串口由每个串口独立的写线程按提交顺序完成，调用 submit / send 的线程（界面线程）从不阻塞；
+    # 写线程空闲时也负责检查超时，没有读取线程调用 expire 时超时照样生效。
+    # Future 在调用 handle_line / expire 的线程或写线程中完成，GUI 端需要经 Qt 信号回到界面线程。
+    # writer=False 时不启动写线程，由调用方（IOPool 的工作线程）调用 flush_writes 写出排队的命令，
+    # 每次提交命令后调用 on_submit() 唤醒它。
+    def __init__(self, ser, timeout, poll_interval=0.05, writer=True, on_submit=None):
+        self.ser = ser
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.on_submit = on_submit
+        self._lock = threading.Lock()
+        self._next_seq = 0
+        self._pending = {}
+        self._writes = queue.Queue()
+        self._closed = False
+        self._writer = None
+        if writer:
+            self._writer = threading.Thread(target=self._write_loop, name='CommandWriter', daemon=True)
+            self._writer.start()
+
+    def submit(self, command, args=(), timeout=None):
+        # 返回 Future：结果为应答字符串（已去掉序号），超时为 TimeoutError，断开时被取消
+        future = Future()
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('命令通道已关闭')
+            seq = self._allocate_seq()
+            self._pending[seq] = (future, deadline)
+        future.seq = seq
+        self._writes.put((seq, bytes([command | COMMAND_TAG, seq, *args]) + b'\r\n'))
+        if self.on_submit is not None:
+            self.on_submit()
+        return future
+
+    def send(self, command, args=(), callback=None, timeout=None):
+        # 回调接口：callback(response) 在 Future 完成的线程中调用，超时、取消或写入失败时 response 为 None
+        future = self.submit(command, args, timeout)
+        if callback is not None:
+            future.add_done_callback(lambda done: callback(reply_or_none(done)))
+        return future
+
+    def _allocate_seq(self):
+        for _ in range(256):
+            seq = self._next_seq
+            self._next_seq = (self._next_seq + 1) % 256
+            if seq not in self._pending:
+                return seq
+        raise RuntimeError('在途命令过多，没有可用的序号')
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self._writes.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self.expire()
+                continue
+            if item is None:
+                return
+            self._write(*item)
+
+    def flush_writes(self):
+        # 没有写线程时写出所有排队的命令，不阻塞等待新命令
+        while True:
+            try:
+                item = self._writes.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self._write(*item)
+
+    def _write(self, seq, packet):
+        with self._lock:
+            entry = self._pending.get(seq)
+        if entry is None or entry[0].done():
+            # 已超时或被调用方取消的命令不再发送
+            return
+        try:
+            self.ser.write(packet)
+        except Exception as e:
+            with self._lock:
+                self._pending.pop(seq, None)
+            _complete(entry[0], exception=e)
+
+    def handle_line(self, line):
+        # 是应答行则完成对应的 Future 并返回 True，否则返回 False（循环数据、调试信息）
+        if not line.startswith(REPLY_PREFIX):
+            return False
+        head, _, response = line[len(REPLY_PREFIX):].partition(' ')
+        try:
+            seq = int(head)
+        except ValueError:
+            return False
+        with self._lock:
+            future, _ = self._pending.pop(seq, (None, None))
+        if future is not None:
+            _complete(future, result=response.strip())
+        return True
+
+    def expire(self):
+        # 超时的请求以 TimeoutError 结束
+        now = time.monotonic()
+        with self._lock:
+            expired = [seq for seq, (_, deadline) in self._pending.items() if deadline <= now]
+            futures = [(seq, self._pending.pop(seq)[0]) for seq in expired]
+        for seq, future in futures:
+            _complete(future, exception=TimeoutError(f'命令 {seq} 在 {self.timeout} 秒内没有应答'))
+
+    def cancel_all(self):
+        with self._lock:
+            futures = [future for future, _ in self._pending.values()]
+            self._pending.clear()
+        for future in futures:
+            future.cancel()
+
+    def close(self, timeout=1.0):
+        # 停止写线程并取消所有在途命令，断开串口前调用
+        with self._lock:
+            self._closed = True
+        self._writes.put(None)
+        if self._writer is not None and self._writer.is_alive() and threading.current_thread() is not self._writer:
+            self._writer.join(timeout)
+        self.cancel_all()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+
+def _complete(future, result=None, exception=None):
+    # 调用方可能已经取消了 Future，此时忽略迟到的应答
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+from PyQt5.QtWidgets import QProgressDialog
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# 每次格式化并写入的行数，内存占用只与它有关，与导出的总行数无关；
+# 一块的格式化是一次 C 调用，期间不释放 GIL，块太大会让界面线程卡顿
+CHUNK_ROWS = 8192
+TIME_FORMAT = '%.6f'
+VALUE_FORMAT = '%.10g'
+
+
+def format_block(times, values, label=None, time_format=TIME_FORMAT, value_format=VALUE_FORMAT):
+    # 把一块数据一次格式化成 CSV 文本：整块只做一次 % 运算，不逐行调用 csv.writer
+    # label 不为 None 时作为中间一列（例如引脚名）原样写入每一行
+    count = len(values)
+    if count == 0:
+        return ''
+    if label is None:
+        row = f'{time_format},{value_format}\n'
+    else:
+        # label 中的 % 和逗号需要转义
+        text = str(label).replace('%', '%%')
+        if ',' in text:
+            text = f'"{text}"'
+        row = f'{time_format},{text},{value_format}\n'
+    pairs = np.empty((count, 2))
+    pairs[:, 0] = times
+    pairs[:, 1] = values
+    return (row * count) % tuple(pairs.ravel().tolist())
+
+
+def write_csv(path, header, series, chunk_rows=CHUNK_ROWS, progress=None, cancelled=None, total=None,
+              value_format=VALUE_FORMAT):
+    # series 为 (label, 时间戳数组, 数值数组) 的列表或生成器，数组可以是内存中的副本或磁盘上的 memmap，按块切片读取；
+    # 时间戳直接写入（调用方先换算成 Unix 时间）。total 为总行数，series 为列表时可以不给，未知时为 0，只用于进度；
+    # progress(已写行数, 总行数) 在每块之后调用，cancelled() 返回 True 时停止并删除未写完的文件，返回是否写完
+    if total is None:
+        total = sum(len(values) for _, _, values in series) if isinstance(series, (list, tuple)) else 0
+    done = 0
+    stopped = False
+    with open(path, 'w', newline='') as f:
+        f.write(','.join(header) + '\n')
+        for label, times, values in series:
+            for start in range(0, len(values), chunk_rows):
+                if cancelled is not None and cancelled():
+                    stopped = True
+                    break
+                end = min(start + chunk_rows, len(values))
+                f.write(format_block(times[start:end], values[start:end], label, value_format=value_format))
+                done += end - start
+                if progress is not None:
+                    progress(done, total)
+            if stopped:
+                break
+    if stopped:
+        os.remove(path)
+        return False
+    return True
+
+
+class ExportWorker(QThread):
+    # 在后台线程中导出 CSV，界面线程只接收进度；cancel() 后在下一块之前停止
+    progress = pyqtSignal(int, int)  # 已写行数, 总行数
+    finished_export = pyqtSignal(str, bool)  # 文件路径, 是否写完（取消时为 False）
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, header, series, parent=None, **options):
+        super().__init__(parent)
+        self.path = path
+        self.header = header
+        self.series = series
+        self.options = options  # 传给 write_csv 的其他参数，例如 total、value_format
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            complete = write_csv(self.path, self.header, self.series, progress=self.progress.emit,
+                                 cancelled=lambda: self._cancelled, **self.options)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        self.finished_export.emit(self.path, complete)
+
+
+def export_in_background(parent, path, header, series, report, **options):
+    # 启动 ExportWorker 并显示带“取消”按钮的进度对话框，结果通过 report(消息) 告知调用方；返回 worker
+    dialog = QProgressDialog(f'正在导出 {os.path.basename(path)} ...', '取消', 0, 100, parent)
+    dialog.setWindowTitle('导出数据为CSV')
+    dialog.setMinimumDuration(500)
+    dialog.setAutoClose(False)
+    dialog.setAutoReset(False)
+    worker = ExportWorker(path, header, series, parent, **options)
+    dialog.canceled.connect(worker.cancel)
+    worker.progress.connect(lambda done, total: dialog.setValue(100 * done // total if total else 100))
+
+    def on_finished(path, complete):
+        dialog.close()
+        dialog.deleteLater()
+        report(f'数据已导出到 {path}' if complete else '导出已取消。')
+
+    def on_failed(error):
+        dialog.close()
+        dialog.deleteLater()
+        report(f'导出数据时出错: {error}')
+
+    worker.finished_export.connect(on_finished)
+    worker.failed.connect(on_failed)
+    worker.finished.connect(worker.deleteLater)
+    worker.start()
+    return worker
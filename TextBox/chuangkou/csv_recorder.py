@@ -0,0 +1,143 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+# 默认每隔多少秒把缓冲的数据刷到磁盘
+FLUSH_INTERVAL = 1.0
+# 队列中最多积压的批数，写盘跟不上时丢弃新数据而不是阻塞采集
+MAX_QUEUED_BATCHES = 10000
+
+_STOP = object()
+
+
+class CsvRecorder(threading.Thread):
+    # 后台 CSV 记录器：采集线程调用 write_rows 只把一批行放进队列（不阻塞、不碰磁盘），
+    # 专门的写线程把队列里已有的批次一次取空后 writerows，每 flush_interval 秒 flush 一次，
+    # 磁盘偶尔变慢只会让队列暂时变长，不会拖住采集。
+    # 文件超过 max_bytes 字节或打开超过 max_seconds 秒时换新文件（path_001.csv、path_002.csv ...），每个文件都写表头。
+    # 写盘出错时记录在 error 中并丢弃该批，队列满时丢弃的行数记在 dropped 中。
+    # 用完必须调用 close()：写完队列中剩余的数据并关闭文件。
+    def __init__(self, path, header, flush_interval=FLUSH_INTERVAL, max_bytes=None, max_seconds=None,
+                 max_queued=MAX_QUEUED_BATCHES):
+        super().__init__(name=f'CsvRecorder-{os.path.basename(path)}', daemon=True)
+        self.path = path
+        self.header = list(header)
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.files = []  # 已写过的文件路径，按先后顺序
+        self.rows_written = 0
+        self.dropped = 0
+        self.error = None
+        self._queue = queue.Queue(max_queued)
+        self._file = None
+        self._writer = None
+        self._opened_at = 0.0
+        self._closed = False
+        # 在调用线程中打开第一个文件，路径不可写时立即报错
+        self._open_next()
+
+    def write_rows(self, rows):
+        # 任何线程都可以调用，立即返回
+        if not rows or self._closed:
+            return
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+
+    def close(self, timeout=5.0):
+        # 写完已排队的数据后关闭文件；写线程未启动时在当前线程中写完
+        if self._closed:
+            return
+        self._closed = True
+        if self.is_alive():
+            self._queue.put(_STOP)
+            self.join(timeout)
+        else:
+            self._drain()
+            self._close_file()
+
+    def run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                batch = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                batch = None
+            # 一次取空队列，合并成一次 writerows
+            batches = [] if batch is None else [batch]
+            while True:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(batch is _STOP for batch in batches)
+            self._write([row for batch in batches if batch is not _STOP for row in batch])
+            now = time.monotonic()
+            if stop:
+                self._close_file()
+                return
+            if now - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = now
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                batch = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if batch is not _STOP:
+                rows.extend(batch)
+        self._write(rows)
+
+    def _write(self, rows):
+        if not rows or self._file is None:
+            return
+        try:
+            self._writer.writerows(rows)
+            self.rows_written += len(rows)
+            if self._should_rotate():
+                self._close_file()
+                self._open_next()
+        except (OSError, ValueError) as e:
+            self.error = e
+
+    def _should_rotate(self):
+        if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+            return True
+        return self.max_seconds is not None and time.monotonic() - self._opened_at >= self.max_seconds
+
+    def _open_next(self):
+        if self.files:
+            root, ext = os.path.splitext(self.path)
+            path = f'{root}_{len(self.files):03d}{ext}'
+        else:
+            path = self.path
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.header)
+        self._opened_at = time.monotonic()
+        self.files.append(path)
+
+    def _flush(self):
+        if self._file is None:
+            return
+        try:
+            self._file.flush()
+        except OSError as e:
+            self.error = e
+
+    def _close_file(self):
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except OSError as e:
+            self.error = e
+        self._file = None
+        self._writer = None
@@ -0,0 +1,86 @@
+import numpy as np
+
+
+def minmax_buckets(times, values, bucket):
+    # 把长度为 bucket 整数倍的数据按桶取最小值和最大值，每桶两个点按时间先后排列，返回 (时间, 数值)
+    count = len(values) // bucket
+    if count == 0:
+        return np.empty(0), np.empty(0)
+    values = values[:count * bucket].reshape(count, bucket)
+    times = times[:count * bucket].reshape(count, bucket)
+    rows = np.arange(count)
+    low = values.argmin(axis=1)
+    high = values.argmax(axis=1)
+    first = np.minimum(low, high)
+    second = np.maximum(low, high)
+    out_times = np.empty((count, 2))
+    out_values = np.empty((count, 2))
+    out_times[:, 0] = times[rows, first]
+    out_times[:, 1] = times[rows, second]
+    out_values[:, 0] = values[rows, first]
+    out_values[:, 1] = values[rows, second]
+    return out_times.ravel(), out_values.ravel()
+
+
+class MinMaxDecimator:
+    # 绘图前的抽取：把一个 RingBuffer 的全部历史缩减到不超过 max_points 个点（每桶取最小值和最大值，波形包络不丢失），
+    # 重绘开销只与画布宽度有关，与缓冲区里的采样数无关。
+    # 桶按采样的绝对序号对齐，大小取 2 的幂，已完成的桶的结果缓存下来，新数据到达时只计算新完成的桶；
+    # 历史变长使桶大小翻倍时才整体重算一次，摊销后每个采样只计算常数次。
+    def __init__(self, ring):
+        self.ring = ring
+        self.bucket = 0
+        self._first_bucket = 0  # 缓存中第一个桶的绝对序号
+        self._times = np.empty(0)
+        self._values = np.empty(0)
+
+    def decimate(self, max_points):
+        ring = self.ring
+        size = len(ring)
+        if size <= max_points:
+            return ring.last()
+        bucket = 1 << int(np.ceil(np.log2(2 * size / max_points)))
+        first = ring.total - size  # 缓冲区中最早的采样的绝对序号
+        if bucket != self.bucket or ring.total < (self._first_bucket + len(self._times) // 2) * bucket:
+            self.bucket = bucket
+            self._first_bucket = -(-first // bucket)
+            self._times = np.empty(0)
+            self._values = np.empty(0)
+
+        # 丢掉已被环形缓冲区覆盖的桶
+        head_bucket = -(-first // bucket)
+        if head_bucket > self._first_bucket:
+            drop = min(head_bucket - self._first_bucket, len(self._times) // 2)
+            self._times = self._times[2 * drop:]
+            self._values = self._values[2 * drop:]
+            self._first_bucket += drop
+        if not len(self._times):
+            self._first_bucket = head_bucket
+
+        # 计算新完成的桶
+        done = (self._first_bucket + len(self._times) // 2) * bucket
+        complete = ring.total // bucket * bucket
+        if complete > done:
+            times, values = self._samples(done, complete)
+            new_times, new_values = minmax_buckets(times, values, bucket)
+            self._times = np.concatenate((self._times, new_times))
+            self._values = np.concatenate((self._values, new_values))
+
+        # 头部不足一桶的部分和尾部未完成的桶各按一个桶处理
+        parts = []
+        head_end = self._first_bucket * bucket
+        if head_end > first:
+            parts.append(self._partial(first, head_end))
+        parts.append((self._times, self._values))
+        if ring.total > complete:
+            parts.append(self._partial(max(complete, first), ring.total))
+        return np.concatenate([t for t, _ in parts]), np.concatenate([v for _, v in parts])
+
+    def _samples(self, start, end):
+        # 绝对序号 [start, end) 的采样视图
+        times, values = self.ring.last(self.ring.total - start)
+        return times[:end - start], values[:end - start]
+
+    def _partial(self, start, end):
+        times, values = self._samples(start, end)
+        return minmax_buckets(times, values, len(values))
@@ -0,0 +1,232 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+import serial
+
+from capture import CaptureRecorder
+from command_client import CommandClient
+from frame_protocol import frames_to_columns
+from port_probe import PROBE_RETRY_INTERVAL, PROBE_TIMEOUT
+from protocol import BAUDRATE, TIMEOUT, command_map
+from ring_buffer import RingBuffer
+from serial_ports import open_serial
+from serial_reader import SerialReader
+
+# 默认采样周期（毫秒），与固件上电时一致
+DEFAULT_SAMPLE_PERIOD_MS = 100
+# ChannelStore 每个通道默认保留的采样数
+STORE_CAPACITY = 200000
+
+
+class TestBoxDevice:
+    # 一台 TestBox 的连接，不依赖 Qt，可以在没有显示器的环境中运行，也可以单独做性能测试：
+    # 打开串口（或 replay:// 回放）、带序号的命令通道、读取线程和可选的采集文件。
+    # 读取线程把循环数据解析成一批批采样 {通道: (时间戳, 数值)}：ASCII 数值行为 'raw' 通道，
+    # 时间戳按 sample_period_ms 换算为秒（最快模式下为采样序号），改变周期后从改变时的时间和采样数接着按新周期计算，
+    # 之前的时间戳不变；二进制帧按引脚拆分，时间戳为帧中的毫秒 / 1000。
+    # 订阅者的回调都在读取线程中调用：on_lines(index, lines) 收到全部数据行，on_samples(index, samples) 收到一批采样，
+    # on_error(index, error) 在读取出错时调用；界面需要经 Qt 信号转交给界面线程。
+    # 给出 pool（IOPool）时不启动本串口自己的读取线程和命令写线程，由池中的工作线程服务，回调在工作线程中调用。
+    def __init__(self, port, index=0, baudrate=BAUDRATE, timeout=TIMEOUT, sample_period_ms=DEFAULT_SAMPLE_PERIOD_MS,
+                 pool=None):
+        self.port = port
+        self.index = index
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self._sample_period_ms = sample_period_ms
+        self.pool = pool
+        self.ser = None
+        self.command_client = None
+        self.reader = None
+        self.recorder = None
+        self._subscribers = []
+        self._raw_count = 0  # ASCII 数值行的累计采样数，用于换算时间戳
+        self._raw_base = (0.0, 0)  # 最近一次改变采样周期时的 (时间戳, 累计采样数)
+        self._raw_lock = threading.Lock()
+        self._time_offsets = {}  # 每个通道第一个采样的 Unix 时间与时间戳之差
+
+    @property
+    def is_open(self):
+        return self.ser is not None
+
+    @property
+    def sample_period_ms(self):
+        return self._sample_period_ms
+
+    @sample_period_ms.setter
+    def sample_period_ms(self, value):
+        # 读取线程同时在换算时间戳，按旧周期算出改变时的时间作为新的起点
+        with self._raw_lock:
+            base_time, base_count = self._raw_base
+            if self._sample_period_ms > 0:
+                base_time += (self._raw_count - base_count) * self._sample_period_ms / 1000.0
+            self._raw_base = (base_time, self._raw_count)
+            self._sample_period_ms = value
+
+    def subscribe(self, on_lines=None, on_samples=None, on_error=None):
+        self._subscribers.append((on_lines, on_samples, on_error))
+
+    def open(self, ser=None):
+        # 打开串口并启动读取线程，失败时抛出 serial.SerialException。
+        # ser 为已经打开的串口（例如 port_probe 探测成功的串口），直接使用，不再重新打开（打开会让 Arduino 复位）
+        self.ser = ser if ser is not None else open_serial(self.port, self.baudrate, self.timeout)
+        self.command_client = CommandClient(self.ser, self.timeout, writer=self.pool is None)
+        self.reader = SerialReader(self.index, self.ser, self._on_lines, self._on_error, self._on_frames,
+                                   self.command_client)
+        if self.pool is not None:
+            self.pool.add(self.reader)
+        else:
+            self.reader.start()
+        return self
+
+    def wait_ready(self, timeout=PROBE_TIMEOUT):
+        # 打开串口会让 Arduino 复位，固件启动完成前收不到命令。与 port_probe 一样每隔 PROBE_RETRY_INTERVAL 秒
+        # 重发 functionMap，任何一次收到应答即可配置；timeout 秒内都没有应答时抛出 serial.SerialException
+        deadline = time.monotonic() + timeout
+        pending = set()
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise serial.SerialException(f'{self.port} {timeout:g} 秒内没有应答 TestBox 命令')
+                # 每次的超时到截止时间为止，应答较慢时之前发出的命令也能完成
+                pending.add(self.command_client.submit(command_map['functionMap'], timeout=remaining))
+                done, pending = wait(pending, min(PROBE_RETRY_INTERVAL, remaining), FIRST_COMPLETED)
+                for future in done:
+                    error = future.exception()
+                    if error is None:
+                        return
+                    if not isinstance(error, TimeoutError):
+                        raise serial.SerialException(f'{self.port} 写入失败: {error}')
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def start_recording(self, path):
+        # 把之后收到的采样写入采集文件，文件无法创建时抛出 OSError
+        recorder = CaptureRecorder(path)
+        recorder.start()
+        self.recorder = recorder
+
+    def close(self):
+        # 先停止读取线程和命令通道，再关闭采集文件和串口
+        if self.reader is not None:
+            if self.pool is not None:
+                self.pool.remove(self.reader)
+            self.reader.stop()
+            self.reader = None
+        if self.command_client is not None:
+            self.command_client.close()
+            self.command_client = None
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        ser, self.ser = self.ser, None
+        if ser is not None:
+            try:
+                ser.close()
+            except (OSError, AttributeError):
+                pass
+
+    def send(self, command, args=(), callback=None):
+        # command 为命令名或编号；返回 Future，callback(response) 在读取线程或写线程中调用，超时或断开时 response 为 None
+        if self.command_client is None:
+            raise RuntimeError('串口未连接')
+        if isinstance(command, str):
+            command = command_map[command]
+        return self.command_client.send(command, args, callback)
+
+    def _on_lines(self, index, lines):
+        values = []
+        for line in lines:
+            try:
+                values.append(float(line))
+            except ValueError:
+                pass
+        samples = {}
+        if values:
+            with self._raw_lock:
+                period_ms = self._sample_period_ms
+                base_time, base_count = self._raw_base
+                positions = np.arange(self._raw_count, self._raw_count + len(values), dtype=np.float64)
+                self._raw_count += len(values)
+            if period_ms > 0:
+                positions = base_time + (positions - base_count) * (period_ms / 1000.0)
+            samples['raw'] = (positions, np.asarray(values))
+            # 最快模式下时间戳是采样序号，记录收到这批数据的时间
+            self._record('raw', positions, samples['raw'][1], period_ms > 0)
+        for on_lines, on_samples, _ in self._subscribers:
+            if on_lines is not None:
+                on_lines(index, lines)
+            if samples and on_samples is not None:
+                on_samples(index, samples)
+
+    def _on_frames(self, index, frames):
+        samples = {}
+        for pin, (times, values) in frames_to_columns(frames).items():
+            samples[pin] = (times / 1000.0, values)
+            self._record(pin, samples[pin][0], values, True)
+        for _, on_samples, _ in self._subscribers:
+            if on_samples is not None:
+                on_samples(index, samples)
+
+    def _on_error(self, index, error):
+        for _, _, on_error in self._subscribers:
+            if on_error is not None:
+                on_error(index, error)
+
+    def unix_times(self, channel, times, timed=True):
+        # 把一批采样的时间戳换算为 Unix 时间：每个通道第一个采样对齐收到它的时间，之后按时间戳的间隔往后排。
+        # timed 为 False（最快模式，时间戳只是采样序号）时整批取收到的时间
+        if timed:
+            offset = self._time_offsets.setdefault(channel, time.time() - times[0])
+            return times + offset
+        return np.full(len(times), time.time())
+
+    def _record(self, channel, times, values, timed):
+        # 写入采集文件，时间换算为 Unix 时间；只放进队列，不等待写盘
+        if self.recorder is None:
+            return
+        self.recorder.write(channel, self.unix_times(channel, times, timed), values)
+
+
+class ChannelStore:
+    # 按通道保存最近的采样（每个通道一个 RingBuffer），可以直接作为 TestBoxDevice 的 on_samples 订阅者，
+    # 在读取线程中写入；其他线程通过 snapshot 取得副本
+    def __init__(self, capacity=STORE_CAPACITY):
+        self.capacity = capacity
+        self.rings = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, index, samples):
+        self.extend(samples)
+
+    def extend(self, samples):
+        with self._lock:
+            for channel, (times, values) in samples.items():
+                ring = self.rings.get(channel)
+                if ring is None:
+                    ring = self.rings[channel] = RingBuffer(self.capacity)
+                ring.extend(times, values)
+
+    def channels(self):
+        with self._lock:
+            return list(self.rings)
+
+    def total(self, channel=None):
+        # 累计收到的采样数（包括已被覆盖的），不给通道时为所有通道之和
+        with self._lock:
+            if channel is not None:
+                return self.rings[channel].total if channel in self.rings else 0
+            return sum(ring.total for ring in self.rings.values())
+
+    def snapshot(self, channel):
+        # (Unix 时间戳, 数值) 的副本
+        with self._lock:
+            return self.rings[channel].snapshot()
+
+    def clear(self):
+        with self._lock:
+            self.rings = {}
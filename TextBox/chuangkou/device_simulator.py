@@ -0,0 +1,464 @@
+import argparse
+import os
+import select
+import threading
+import time
+import tty
+from urllib.parse import parse_qs
+
+import numpy as np
+import serial
+
+from command_client import COMMAND_TAG, RESPONSE_ERROR, RESPONSE_OK
+from frame_protocol import FRAME_MAX_VALUES, STREAM_MODE_ASCII, STREAM_MODE_BINARY, encode_frame
+from serial_ports import SIMULATOR_SCHEME
+
+# 虚拟 TestBox：用一对伪终端模拟 TestBox/src/main.cpp 中的 taskCommandInterface 和 taskLooper，
+# 没有 Arduino 也能连接、配置引脚、开始循环，用于测量和回归测试上位机的接收性能（仅 Linux/macOS）。
+# 真实设备的命令走 SoftwareSerial、数据走 USB 串口，这里两者合并在同一个伪终端上，与上位机的用法一致。
+
+# 与固件 Command 枚举一致
+CMD_FUNCTION_MAP = 0
+CMD_GET_PIN_FUNCTION = 1
+CMD_GET_CURRENT_PIN_FUNCTION = 2
+CMD_SET_PIN_FUNCTION = 3
+CMD_START_LOOP = 4
+CMD_STOP_LOOP = 5
+CMD_SET_STREAM_MODE = 6
+CMD_SET_SAMPLE_RATE = 7
+CMD_GET_ALL_PIN_FUNCTIONS = 8
+
+# 与固件 PinFunction 枚举一致
+DISABLE, READ_DIGITAL, WRITE_DIGITAL, READ_ANALOG, WRITE_ANALOG = range(5)
+
+# 与固件 setup() 中的 NewPinConfiguration 顺序一致，A0..A5 在 Uno 上是 14..19
+A0 = 14
+PIN_FUNCTIONS = (
+    [(4, [READ_DIGITAL, WRITE_DIGITAL])]
+    + [(pin, [READ_DIGITAL, WRITE_DIGITAL, WRITE_ANALOG]) for pin in (5, 6)]
+    + [(pin, [READ_DIGITAL, WRITE_DIGITAL]) for pin in (7, 8)]
+    + [(pin, [READ_DIGITAL, WRITE_DIGITAL, WRITE_ANALOG]) for pin in (9, 10, 11)]
+    + [(A0 + i, [READ_DIGITAL, WRITE_DIGITAL, READ_ANALOG]) for i in range(6)]
+)
+
+# Arduino_FreeRTOS 的看门狗定时器节拍，vTaskDelay 只能按整节拍延时
+TICK_MS = 15
+DEFAULT_SAMPLE_PERIOD_MS = (100 // TICK_MS) * TICK_MS
+# 固件 setStreamMode / waitForArguments 的参数等待时间
+ARGUMENT_TIMEOUT = 4 * TICK_MS / 1000
+# 采样周期为 0（最快）时模拟的采样率
+FASTEST_RATE_HZ = 5000
+# 高采样率下采样线程每次至少积攒的时长，按批写出
+MAX_BATCH_SECONDS = 0.005
+# 上位机读得慢时一次最多补发的时长
+MAX_CATCH_UP_SECONDS = 0.05
+
+WAVEFORMS = ('sine', 'square', 'triangle', 'sawtooth', 'constant')
+
+
+class VirtualTestBox:
+    # sample_period_ms 是初始采样周期，可以小于 1 ms 以模拟比 Uno 更快的设备；之后可用 setSampleRate 改变。
+    # noise 为 ADC 计数的高斯噪声标准差；drop_rate 为循环数据每个字节被丢弃的概率；
+    # latency 为每条命令应答前的延迟（秒）。
+    # record_send_times 为 True 时在 send_log 中记录每批循环数据开始写出时的 (累计采样数, time.monotonic())，用于测量端到端延迟。
+    def __init__(self, sample_period_ms=DEFAULT_SAMPLE_PERIOD_MS, waveform='sine', frequency=1.0,
+                 amplitude=400, offset=512, noise=0.0, drop_rate=0.0, latency=0.0,
+                 tick_ms=TICK_MS, debug=True, seed=None, record_send_times=False):
+        if waveform not in WAVEFORMS:
+            raise ValueError(f'未知波形 {waveform}，可选 {", ".join(WAVEFORMS)}')
+        self.sample_period_ms = sample_period_ms
+        self.waveform = waveform
+        self.frequency = frequency
+        self.amplitude = amplitude
+        self.offset = offset
+        self.noise = noise
+        self.drop_rate = drop_rate
+        self.latency = latency
+        self.tick_ms = tick_ms
+        self.debug = debug
+        self.record_send_times = record_send_times
+        self.send_log = []
+        self.rng = np.random.default_rng(seed)
+
+        self.selected = {pin: DISABLE for pin, _ in PIN_FUNCTIONS}
+        self.stream_mode = STREAM_MODE_ASCII
+        self.samples_per_frame = 8
+        self.looping = False
+
+        # 统计
+        self.bytes_sent = 0
+        self.samples_sent = 0
+        self.frames_sent = 0
+        self.dropped_bytes = 0
+        self.commands = 0
+
+        self._master = None
+        self._slave = None
+        self.port = None
+        self._write_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+        self._input = bytearray()
+        self._tick = 0
+        self._frame_sequence = 0
+        self._frame_values = []
+        self._frame_ticks = 0
+        self._frame_pin_mask = 0
+        self._frame_start_ms = 0
+
+    def start(self):
+        self._master, self._slave = os.openpty()
+        # 从端保持打开：上位机断开重连时主端不会读到 EIO
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._stop_event.clear()
+        self._threads = [
+            threading.Thread(target=self._command_loop, name='VirtualTestBox-command', daemon=True),
+            threading.Thread(target=self._sample_loop, name='VirtualTestBox-looper', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._debug('Debug Start')
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(1.0)
+        self._threads = []
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # 输出
+
+    def _write(self, data):
+        # 上位机不读取时阻塞等待，与 USB 串口芯片的流控一致；停止时放弃剩余数据
+        with self._write_lock:
+            view = memoryview(data)
+            while view and not self._stop_event.is_set():
+                _, writable, _ = select.select([], [self._master], [], 0.1)
+                if writable:
+                    written = os.write(self._master, view)
+                    view = view[written:]
+                    self.bytes_sent += written
+
+    def _debug(self, text):
+        if self.debug:
+            self._write(text.encode() + b'\r\n')
+
+    def _write_loop_data(self, data):
+        if self.drop_rate > 0 and data:
+            keep = self.rng.random(len(data)) >= self.drop_rate
+            self.dropped_bytes += int(len(data) - keep.sum())
+            data = np.frombuffer(data, dtype=np.uint8)[keep].tobytes()
+        self._write(data)
+
+    # taskCommandInterface
+
+    def _command_loop(self):
+        while not self._stop_event.is_set():
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if readable:
+                try:
+                    self._input += os.read(self._master, 4096)
+                except OSError:
+                    return
+            while self._input:
+                reply = self._handle_command()
+                if reply:
+                    if self.latency > 0:
+                        time.sleep(self.latency)
+                    self._write(reply)
+
+    def _take(self, count):
+        # 与 waitForArguments 一致：参数最多等待 ARGUMENT_TIMEOUT，超时后放弃该参数
+        deadline = time.monotonic() + ARGUMENT_TIMEOUT
+        while len(self._input) < count and time.monotonic() < deadline and not self._stop_event.is_set():
+            readable, _, _ = select.select([self._master], [], [], max(0.0, deadline - time.monotonic()))
+            if readable:
+                self._input += os.read(self._master, 4096)
+        if len(self._input) < count:
+            return None
+        taken = bytes(self._input[:count])
+        del self._input[:count]
+        return taken
+
+    def _handle_command(self):
+        # 处理缓冲区开头的一条命令，返回要写回的字节（可以为空）
+        command = self._input.pop(0)
+        prefix = b''
+        tagged = False
+        if command & COMMAND_TAG:
+            seq = self._take(1)
+            if seq is not None:
+                tagged = True
+                command &= ~COMMAND_TAG
+                prefix = b'@%d ' % seq[0]
+        self.commands += 1
+        body = self._execute(command)
+        return prefix + body + b'\r\n' if tagged else body
+
+    def _execute(self, command):
+        ok, error = str(RESPONSE_OK).encode(), str(RESPONSE_ERROR).encode()
+        if command == CMD_FUNCTION_MAP:
+            self._debug('Function Map')
+            return b''
+        if command in (CMD_GET_PIN_FUNCTION, CMD_GET_CURRENT_PIN_FUNCTION):
+            args = self._take(1)
+            if args is None or args[0] not in self.selected:
+                return b''
+            pin = args[0]
+            if command == CMD_GET_PIN_FUNCTION:
+                functions = dict(PIN_FUNCTIONS)[pin]
+                self._debug(f'Pin {pin} function retrieved')
+                return ok + str(len(functions)).encode() + b''.join(str(f).encode() for f in functions)
+            self._debug(f'Pin {pin} function getted')
+            return ok + str(self.selected[pin]).encode()
+        if command == CMD_GET_ALL_PIN_FUNCTIONS:
+            self._debug('All pin functions getted')
+            return ok + b''.join(str(self.selected[pin]).encode() for pin, _ in PIN_FUNCTIONS)
+        if command == CMD_SET_PIN_FUNCTION:
+            args = self._take(2)
+            if args is None or args[0] not in self.selected:
+                return b''
+            with self._state_lock:
+                self.selected[args[0]] = args[1]
+            self._debug(f'Pin {args[0]} function set to {args[1]}')
+            return ok
+        if command == CMD_START_LOOP:
+            with self._state_lock:
+                self.looping = True
+            self._debug('Start Loop')
+            return ok
+        if command == CMD_STOP_LOOP:
+            with self._state_lock:
+                self.looping = False
+            self._debug('Stop Loop')
+            return ok
+        if command == CMD_SET_STREAM_MODE:
+            args = self._take(2)
+            if args is None:
+                return b''
+            mode, samples = args
+            if mode > STREAM_MODE_BINARY or not 0 < samples <= FRAME_MAX_VALUES:
+                return error
+            with self._state_lock:
+                self.stream_mode = mode
+                self.samples_per_frame = samples
+                self._frame_values = []
+            self._debug(f'Stream mode set to {mode}')
+            return ok
+        if command == CMD_SET_SAMPLE_RATE:
+            args = self._take(2)
+            if args is None:
+                return b''
+            period_ms = args[0] | args[1] << 8
+            ticks = period_ms // self.tick_ms
+            if period_ms > 0 and ticks == 0:
+                ticks = 1
+            with self._state_lock:
+                self.sample_period_ms = ticks * self.tick_ms
+                self._frame_values = []
+            self._debug(f'Sample period set to {self.sample_period_ms}')
+            return ok + str(self.sample_period_ms).encode()
+        # 未知命令（包括上位机命令末尾的 \r\n）与固件一样忽略
+        return b''
+
+    # taskLooper
+
+    def _sample_loop(self):
+        next_time = time.monotonic()
+        while not self._stop_event.is_set():
+            with self._state_lock:
+                looping = self.looping
+                period_ms = self.sample_period_ms or 1000 / FASTEST_RATE_HZ
+            if not looping:
+                time.sleep(0.01)
+                next_time = time.monotonic()
+                continue
+            # 按墙钟补齐到期的采样，高采样率下一次写出一批，长期速率与设定一致
+            now = time.monotonic()
+            due = int((now - next_time) * 1000 / period_ms) + 1
+            due = min(due, max(1, int(MAX_CATCH_UP_SECONDS * 1000 / period_ms)))
+            next_time += due * period_ms / 1000
+            if next_time < now - 1:
+                # 上位机长时间不读取，放弃追赶
+                next_time = now
+            self._emit_ticks(due, period_ms)
+            delay = next_time - time.monotonic()
+            if period_ms / 1000 < MAX_BATCH_SECONDS:
+                delay = max(delay, MAX_BATCH_SECONDS)
+            if delay > 0:
+                self._stop_event.wait(delay)
+
+    def _reading_pins(self):
+        # 与固件一致：按 PinConfigurations 顺序采样所有读取引脚，没有读取引脚时采样 A0
+        pins = [(bit, pin, function) for bit, (pin, _) in enumerate(PIN_FUNCTIONS)
+                for function in [self.selected[pin]] if function in (READ_DIGITAL, READ_ANALOG)]
+        if not pins:
+            return [(8, A0, READ_ANALOG)], True
+        return pins, False
+
+    def _signal(self, ticks, period_ms, pins):
+        # 返回 [采样, 引脚] 的 ADC 计数，每个引脚的相位错开
+        t = (self._tick + np.arange(ticks))[:, None] * period_ms / 1000
+        phase = self.frequency * t + np.array([bit for bit, _, _ in pins]) / len(PIN_FUNCTIONS)
+        phase -= np.floor(phase)
+        if self.waveform == 'sine':
+            shape = np.sin(2 * np.pi * phase)
+        elif self.waveform == 'square':
+            shape = np.where(phase < 0.5, 1.0, -1.0)
+        elif self.waveform == 'triangle':
+            shape = 4 * np.abs(phase - 0.5) - 1
+        elif self.waveform == 'sawtooth':
+            shape = 2 * phase - 1
+        else:
+            shape = np.zeros_like(phase)
+        values = self.offset + self.amplitude * shape
+        if self.noise > 0:
+            values = values + self.rng.normal(0, self.noise, values.shape)
+        values = np.clip(np.rint(values), 0, 1023).astype(np.uint16)
+        digital = np.array([function == READ_DIGITAL for _, _, function in pins])
+        values[:, digital] = values[:, digital] >= 512
+        return values
+
+    def _emit_ticks(self, ticks, period_ms):
+        with self._state_lock:
+            pins, default_a0 = self._reading_pins()
+            stream_mode = self.stream_mode
+        values = self._signal(ticks, period_ms, pins)
+        if stream_mode == STREAM_MODE_BINARY:
+            data = self._encode_frames(values, pins, period_ms)
+        elif default_a0:
+            data = b''.join(b'%.2f\r\n' % value for value in values[:, 0].tolist())
+        else:
+            names = [(b'A%d' % (pin - A0) if pin >= A0 else b'%d' % pin) + b',' for _, pin, _ in pins]
+            data = b''.join(name + b'%d\r\n' % value for row in values.tolist() for name, value in zip(names, row))
+        self._tick += ticks
+        self.samples_sent += values.size
+        # 写出前取时间，上位机可能在 write 返回前就已经读到这批数据
+        sent_time = time.monotonic()
+        self._write_loop_data(data)
+        if self.record_send_times:
+            self.send_log.append((self.samples_sent, sent_time))
+
+    def _encode_frames(self, values, pins, period_ms):
+        # 与 taskLooper 的组帧一致：一帧只包含同一 pin_mask 的整拍，满 samplesPerFrame 拍或 64 个数值时发出
+        pin_mask = sum(1 << bit for bit, _, _ in pins)
+        frames = []
+        for row, tick in zip(values, range(self._tick, self._tick + len(values))):
+            if self._frame_values and (pin_mask != self._frame_pin_mask
+                                       or len(self._frame_values) + len(row) > FRAME_MAX_VALUES):
+                frames.append(self._flush_frame(period_ms))
+            if not self._frame_values:
+                self._frame_start_ms = int(tick * period_ms)
+                self._frame_pin_mask = pin_mask
+                self._frame_ticks = 0
+            self._frame_values.extend(row.tolist())
+            self._frame_ticks += 1
+            if self._frame_ticks >= self.samples_per_frame:
+                frames.append(self._flush_frame(period_ms))
+        return b''.join(frames)
+
+    def _flush_frame(self, period_ms):
+        frame = encode_frame(self._frame_sequence, self._frame_start_ms, max(0, min(0xFFFF, round(period_ms))),
+                             self._frame_pin_mask, self._frame_values)
+        self._frame_sequence = (self._frame_sequence + 1) & 0xFFFF
+        self._frame_values = []
+        self.frames_sent += 1
+        return frame
+
+
+class VirtualSerial(serial.Serial):
+    # 连接虚拟设备伪终端的串口，关闭时一起停止虚拟设备
+    def __init__(self, device, baudrate, timeout):
+        self.device = device
+        super().__init__(device.port, baudrate, timeout=timeout)
+
+    def close(self):
+        super().close()
+        device, self.device = getattr(self, 'device', None), None
+        if device is not None:
+            device.stop()
+
+
+def connect_virtual(device, baudrate, timeout):
+    # 启动虚拟设备并返回连接它的 VirtualSerial
+    device.start()
+    try:
+        return VirtualSerial(device, baudrate, timeout)
+    except serial.SerialException:
+        device.stop()
+        raise
+
+
+def parse_simulator_url(url):
+    # sim://?rate=采样率&waveform=波形&frequency=频率&noise=噪声&drop_rate=丢字节概率&latency=应答延迟&start=1，
+    # 返回 VirtualTestBox 的参数
+    _, _, query = url[len(SIMULATOR_SCHEME):].partition('?')
+    query = {key: values[0] for key, values in parse_qs(query).items()}
+    options = {'debug': False}
+    if 'rate' in query:
+        options['sample_period_ms'] = 1000 / float(query.pop('rate'))
+    if 'waveform' in query:
+        options['waveform'] = query.pop('waveform')
+    for key in ('frequency', 'noise', 'drop_rate', 'latency'):
+        if key in query:
+            options[key] = float(query.pop(key))
+    start = query.pop('start', '0') not in ('0', 'false', '')
+    if query:
+        raise ValueError(f'未知参数: {", ".join(query)}')
+    return options, start
+
+
+def open_simulator(url, baudrate, timeout):
+    # 地址有误时与打不开串口一样抛出 SerialException
+    try:
+        options, start = parse_simulator_url(url)
+        device = VirtualTestBox(**options)
+    except ValueError as e:
+        raise serial.SerialException(f'无法启动虚拟设备 {url}: {e}') from e
+    device.looping = start
+    return connect_virtual(device, baudrate, timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='虚拟 TestBox 设备：在伪终端上模拟固件，打印可连接的串口路径')
+    parser.add_argument('--count', type=int, default=1, help='同时模拟的设备数')
+    parser.add_argument('--rate', type=float, default=1000 / DEFAULT_SAMPLE_PERIOD_MS, help='初始采样率 Hz')
+    parser.add_argument('--waveform', choices=WAVEFORMS, default='sine')
+    parser.add_argument('--frequency', type=float, default=1.0, help='波形频率 Hz')
+    parser.add_argument('--noise', type=float, default=0.0, help='噪声标准差（ADC 计数）')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='循环数据字节丢弃概率')
+    parser.add_argument('--latency', type=float, default=0.0, help='命令应答延迟（秒）')
+    parser.add_argument('--start', action='store_true', help='不等 startLoop 直接开始输出循环数据')
+    args = parser.parse_args()
+
+    devices = []
+    for _ in range(args.count):
+        device = VirtualTestBox(1000 / args.rate, args.waveform, args.frequency, noise=args.noise,
+                                drop_rate=args.drop_rate, latency=args.latency).start()
+        device.looping = args.start
+        devices.append(device)
+        print(device.port, flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for device in devices:
+            device.stop()
+
+
+if __name__ == '__main__':
+    main()
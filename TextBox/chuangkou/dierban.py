@@ -5,11 +5,14 @@ from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLa
 from PyQt5.QtGui import QFont, QTextCursor
 from PyQt5.QtCore import QTimer
 import csv
+from command_client import CommandClient
+from line_framer import LineFramer
+from protocol import BAUDRATE, TIMEOUT, function_map, pin_functions, pin_ranges
 
 # 配置串口参数
 PORT = 'COM4'  # 根据实际情况修改
-BAUDRATE = 115200
-TIMEOUT = 1
+# 读取串口的间隔（毫秒），命令应答和循环数据都在这里取出
+POLL_INTERVAL_MS = 20
 
 # 定义命令类型及其枚举值
 command_map = {
@@ -21,36 +24,6 @@ command_map = {
     'stopLoop': 5
 }
 
-# 定义功能名称及其枚举值
-function_map = {
-    'disable': 0,
-    'readDigital': 1,
-    'writeDigital': 2,
-    'readAnalog': 3,
-    'writeAnalog': 4
-}
-
-# 假设引脚范围，可根据实际情况调整
-pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
-
-# 定义每个引脚支持的功能
-pin_functions = {
-    4: ['readDigital', 'writeDigital'],
-    5: ['readDigital', 'writeDigital', 'writeAnalog'],
-    6: ['readDigital', 'writeDigital', 'writeAnalog'],
-    7: ['readDigital', 'writeDigital'],
-    8: ['readDigital', 'writeDigital'],
-    9: ['readDigital', 'writeDigital', 'writeAnalog'],
-    10: ['readDigital', 'writeDigital', 'writeAnalog'],
-    11: ['readDigital', 'writeDigital', 'writeAnalog'],
-    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A5': ['readDigital', 'writeDigital', 'readAnalog']
-}
-
 
 class ArduinoCommunicator(QWidget):
     def __init__(self):
@@ -58,15 +31,22 @@ class ArduinoCommunicator(QWidget):
 
         self.init_ui()
         self.ser = None
+        self.command_client = None
         try:
             self.ser = self.connect_serial()
         except Exception as e:
             print(f"串口连接错误: {e}")
-        self.init_pins()
         self.is_looping = False
         self.loop_data = []
+        # 命令带序号发送，应答和循环数据都由定时器经分帧器读出，再按序号交给命令通道，
+        # 不再在发送命令后直接 readline()，不会和定时器抢同一个串口
+        self.framer = LineFramer()
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.read_serial_data)
+        if self.ser:
+            self.command_client = CommandClient(self.ser, TIMEOUT, writer=False)
+            self.timer.start(POLL_INTERVAL_MS)
+        self.init_pins()
 
         # 添加导出按钮
         self.export_button = QPushButton('导出数据到 CSV')
@@ -158,18 +138,16 @@ class ArduinoCommunicator(QWidget):
         try:
             if isinstance(pin, str) and pin.startswith('A'):
                 pin_num = ord(pin[1]) - ord('0') + 10
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
             else:
                 pin_num = int(pin)
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
+            label = self.pin_labels[pin]
 
-            self.ser.write(cmd_bytes + b'\r\n')
-            time.sleep(0.1)
-            response = self.ser.readline().decode().strip()
-            if response:
-                self.pin_labels[pin].setText(f'引脚 {pin}: {response}')
-            else:
-                self.pin_labels[pin].setText(f'引脚 {pin}: 未获取到功能')
+            def handle_response(response):
+                if response:
+                    label.setText(f'引脚 {pin}: {response}')
+                else:
+                    label.setText(f'引脚 {pin}: 未获取到功能')
+            self.send_request('getcurrentPinFunction', (pin_num,), handle_response)
         except KeyError:
             print(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
             self.response_text.append(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
@@ -213,40 +191,37 @@ class ArduinoCommunicator(QWidget):
         if not self.ser:
             self.response_text.append("串口未连接，无法执行操作。")
             return
-        cmd_bytes = bytes([command_map['functionMap']])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"响应: {response}")
-        else:
-            self.response_text.append("未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"响应: {response}")
+            else:
+                self.response_text.append("未收到响应。")
+        self.send_request('functionMap', (), handle_response)
 
     def send_get_pin_function(self, pin):
         if not self.ser:
             self.response_text.append("串口未连接，无法执行操作。")
             return
-        cmd_bytes = bytes([command_map['getPinFunction'], pin])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"引脚 {pin} 功能响应: {response}")
-        else:
-            self.response_text.append(f"引脚 {pin} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"引脚 {pin} 功能响应: {response}")
+            else:
+                self.response_text.append(f"引脚 {pin} 未收到响应。")
+        self.send_request('getPinFunction', (pin,), handle_response)
 
     def send_set_pin_function(self, pin, function):
         if not self.ser:
             self.response_text.append("串口未连接，无法执行操作。")
             return
-        cmd_bytes = bytes([command_map['setPinFunction'], pin, function])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"设置引脚 {pin} 功能为 {function} 响应: {response}")
-        else:
-            self.response_text.append(f"设置引脚 {pin} 功能为 {function} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"设置引脚 {pin} 功能为 {function} 响应: {response}")
+            else:
+                self.response_text.append(f"设置引脚 {pin} 功能为 {function} 未收到响应。")
+        self.send_request('setPinFunction', (pin, function), handle_response)
 
     def start_loop(self):
         if not self.ser:
@@ -254,30 +229,29 @@ class ArduinoCommunicator(QWidget):
             return
         self.is_looping = True
         self.send_general_command('startLoop')
-        self.timer.start(100)  # 每 100 毫秒读取一次数据
 
     def stop_loop(self):
         if not self.ser:
             self.response_text.append("串口未连接，无法执行操作。")
             return
-        self.send_general_command('stopLoop')
-        # 等待响应后停止循环
-        time.sleep(0.1)
-        try:
-            response = self.ser.readline().decode().strip()
+
+        # 收到应答后不再把数据行当作循环数据
+        def handle_response(response):
             if response:
                 self.is_looping = False
-                self.timer.stop()
                 self.response_text.append(f"停止循环响应: {response}")
-        except Exception as e:
-            self.response_text.append(f"停止循环时出错: {e}")
+            else:
+                self.response_text.append("停止循环未收到响应。")
+        self.send_request('stopLoop', (), handle_response)
 
     def read_serial_data(self):
-        if self.is_looping and self.ser:
+        if self.ser:
             try:
-                response = self.ser.readline().decode().strip()
-                if response:
-                    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+                timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+                # 一次读完缓冲区内的全部字节，按行分帧；带序号的应答交给命令通道，其余为循环数据
+                for response in self.framer.read_lines(self.ser):
+                    if self.command_client.handle_line(response) or not self.is_looping:
+                        continue
                     formatted_response = f"[{timestamp}] 循环数据: {response}"
                     self.response_text.append(formatted_response)
                     self.loop_data.append(response)
@@ -287,6 +261,8 @@ class ArduinoCommunicator(QWidget):
                     self.response_text.setTextCursor(cursor)
             except Exception as e:
                 self.response_text.append(f"读取串口数据时出错: {e}")
+            # 超时的命令以 None 回调
+            self.command_client.expire()
 
     def export_to_csv(self):
         if not self.loop_data:
@@ -308,14 +284,18 @@ class ArduinoCommunicator(QWidget):
         if not self.ser:
             self.response_text.append("串口未连接，无法执行操作。")
             return
-        cmd_bytes = bytes([command_map[command]])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"响应: {response}")
-        else:
-            self.response_text.append("未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"响应: {response}")
+            else:
+                self.response_text.append("未收到响应。")
+        self.send_request(command, (), handle_response)
+
+    def send_request(self, command, args, handler):
+        # 命令立即写出，不等待应答；handler(response) 由定时器在界面线程中调用，超时或写入失败时为 None
+        self.command_client.send(command_map[command], args, handler)
+        self.command_client.flush_writes()
 
     def update_function_combo_visibility(self):
         command = self.command_combo.currentText()
@@ -338,6 +318,10 @@ class ArduinoCommunicator(QWidget):
         self.function_combo.addItems(functions)
 
     def closeEvent(self, event):
+        self.timer.stop()
+        if self.command_client is not None:
+            self.command_client.close()
+            self.command_client = None
         if self.ser and self.ser.is_open:
             try:
                 self.ser.close()
@@ -5,11 +5,10 @@ import csv
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTextEdit, QPushButton, QFileDialog
 from PyQt5.QtGui import QFont
 from PyQt5.QtCore import QTimer
+from protocol import BAUDRATE, TIMEOUT, Response_map, function_map, pin_functions, pin_number, pin_ranges
 
 # 配置串口参数
 PORT = 'COM4'  # 根据实际情况修改
-BAUDRATE = 115200
-TIMEOUT = 1
 
 # 定义命令类型及其枚举值
 command_map = {
@@ -21,41 +20,6 @@ command_map = {
     'stopLoop': 5
 }
 
-Response_map = {
-    'ok':0,
-    'error':1,
-}
-
-# 定义功能名称及其枚举值
-function_map = {
-    'disable': 0,
-    'readDigital': 1,
-    'writeDigital': 2,
-    'readAnalog': 3,
-    'writeAnalog': 4
-}
-
-# 假设引脚范围，可根据实际情况调整
-pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
-
-# 定义每个引脚支持的功能
-pin_functions = {
-    4: ['readDigital', 'writeDigital'],
-    5: ['readDigital', 'writeDigital', 'writeAnalog'],
-    6: ['readDigital', 'writeDigital', 'writeAnalog'],
-    7: ['readDigital', 'writeDigital'],
-    8: ['readDigital', 'writeDigital'],
-    9: ['readDigital', 'writeDigital', 'writeAnalog'],
-    10: ['readDigital', 'writeDigital', 'writeAnalog'],
-    11: ['readDigital', 'writeDigital', 'writeAnalog'],
-    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A5': ['readDigital', 'writeDigital', 'readAnalog']
-}
-
 class ArduinoCommunicator(QWidget):
     def __init__(self):
         super().__init__()
@@ -154,12 +118,7 @@ class ArduinoCommunicator(QWidget):
 
     def send_get_current_function(self, pin):
         try:
-            if isinstance(pin, str) and pin.startswith('A'):
-                pin_num = ord(pin[1]) - ord('0') + 14  # A0 -> 14, A1 -> 15, etc.
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
-            else:
-                pin_num = int(pin)
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
+            cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_number(pin)])
 
             self.ser.write(cmd_bytes + b'\r\n')
             time.sleep(0.1)
@@ -181,18 +140,12 @@ class ArduinoCommunicator(QWidget):
         elif command == 'functionMap':
             self.send_function_map()
         elif command == 'getPinFunction':
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 14
-            else:
-                pin_num = int(selected_pin)
+            pin_num = pin_number(selected_pin)
             self.send_get_pin_function(pin_num)
         elif command == 'setPinFunction':
             selected_function = self.function_combo.currentText()
             function_num = function_map[selected_function]
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 14
-            else:
-                pin_num = int(selected_pin)
+            pin_num = pin_number(selected_pin)
             self.send_set_pin_function(pin_num, function_num)
         elif command == 'startLoop':
             self.send_general_command(command)
@@ -1,79 +1,86 @@
+import os
 import sys
 import serial
+import threading
 import time
-import csv
-from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTextEdit, QPushButton, QFileDialog, QTabWidget
+from collections import deque
+import numpy as np
+from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton, QFileDialog, QTabWidget, QCheckBox, QScrollArea
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import QObject, pyqtSignal
 from serial.tools import list_ports
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from matplotlib.figure import Figure
+from capture import CSV_HEADER, VALUE_FORMAT, CaptureReader, capture_series
+from capture_view import CaptureView
+from command_client import parse_reply
+from csv_export import export_in_background
+from device import DEFAULT_SAMPLE_PERIOD_MS, TestBoxDevice
+from io_pool import IO_WORKERS, IOPool
+from live_plot import LivePlot
+from log_view import LogView
+from port_process import ProcessDevice
+from protocol import (BAUDRATE, TIMEOUT, Response_map, command_map, command_options, function_map, function_name,
+                      pin_functions, pin_number, pin_ranges, sample_rate_map, stream_mode_map)
+from render_scheduler import RenderScheduler
+from ring_buffer import RingBuffer
+from serial_ports import is_replay
+
+# 二进制流模式下每帧打包的采样数
+SAMPLES_PER_FRAME = 8
+# 每个串口保留的历史时长，点数随采样率换算；最快模式下无法换算时使用 MAX_HISTORY_POINTS
+HISTORY_SECONDS = 600
+MAX_HISTORY_POINTS = 200000
+# 图表最高重绘帧率，数据到达时只标记需要重绘
+RENDER_FPS = 30
+# 每个串口的数据同时记录到采集文件（见 capture.py），图表窗口可以回看全部记录；设为 None 不记录
+CAPTURE_DIR = 'captures'
+# 每个串口在独立的采集进程中读取，采样经共享内存交给界面（见 port_process.py），绘图卡顿不影响接收
+PROCESS_PER_PORT = False
+# 启动时显示的串口行数，之后可以用“添加串口”增加、用“移除”删除
+INITIAL_PORTS = 3
+# 服务所有串口的读取线程数（见 io_pool.py），不随串口数增加；设为 0 时每个串口使用独立的读取线程
+IO_POOL_WORKERS = IO_WORKERS
+# 连接时自动打开图表窗口的串口数上限，其余串口点“图表”按钮时才创建
+AUTO_CHART_LIMIT = 4
+
+
+# 读取线程到界面线程的信号桥：跨线程发射的信号会自动排队到界面线程执行
+class SerialSignals(QObject):
+    lines_received = pyqtSignal(int, list)
+    samples_received = pyqtSignal(int, dict)
+    read_error = pyqtSignal(int, str)
+    command_reply = pyqtSignal(object, object)
+    port_opened = pyqtSignal(int, object, str, str)
 
-# 配置串口参数
-BAUDRATE = 115200
-TIMEOUT = 1
-
-# 定义命令类型及其枚举值
-command_map = {
-    'functionMap': 0,
-    'getPinFunction': 1,
-    'getcurrentPinFunction': 2,
-    'setPinFunction': 3,
-    'startLoop': 4,
-    'stopLoop': 5
-}
-
-# 定义响应映射
-Response_map = {
-    'ok': 'ok',
-    'error': 'error'
-}
-
-# 定义功能名称及其枚举值
-function_map = {
-    'disable': 0,
-    'readDigital': 1,
-    'writeDigital': 2,
-    'readAnalog': 3,
-    'writeAnalog': 4
-}
-
-# 假设引脚范围，可根据实际情况调整
-pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
-
-# 定义每个引脚支持的功能
-pin_functions = {
-    4: ['readDigital', 'writeDigital'],
-    5: ['readDigital', 'writeDigital', 'writeAnalog'],
-    6: ['readDigital', 'writeDigital', 'writeAnalog'],
-    7: ['readDigital', 'writeDigital'],
-    8: ['readDigital', 'writeDigital'],
-    9: ['readDigital', 'writeDigital', 'writeAnalog'],
-    10: ['readDigital', 'writeDigital', 'writeAnalog'],
-    11: ['readDigital', 'writeDigital', 'writeAnalog'],
-    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A5': ['readDigital', 'writeDigital', 'readAnalog']
-}
 
 class ArduinoCommunicator(QWidget):
     def __init__(self):
         super().__init__()
-        self.ser_connections = {}
+        self.devices = {}  # 每个串口的 TestBoxDevice：串口、读取线程、命令通道和采集文件
         self.loop_data = {}
         self.is_looping = {}
         self.plot_data = {}
-        self.timers = {}
+        self.serial_signals = SerialSignals()
+        self.serial_signals.lines_received.connect(self.read_serial_data)
+        self.serial_signals.samples_received.connect(self.read_samples)
+        self.serial_signals.read_error.connect(self.on_read_error)
+        self.serial_signals.command_reply.connect(self.on_command_reply)
+        self.serial_signals.port_opened.connect(self.on_port_opened)
         self.plot_canvases = {}
+        self.live_plots = {}  # 每个图表画布上的增量绘图
+        self.render_scheduler = RenderScheduler(RENDER_FPS, self)
         self.chart_windows = {}
         self.chart_tab_widget = QTabWidget()
-        self.loop_data_labels = {}
-        self.loop_data_texts = {}
+        self.loop_data_texts = {}  # 每个串口的日志控件，第一次显示时才创建（见 port_log）
         self.export_buttons = {}
-        self.raw_data = {}  # 新增：存储原始数据
+        self.raw_data = {}  # 每个串口原始数据的环形缓冲区，横轴为采样时间（秒）或采样序号
+        self.sample_periods = {}  # 每个串口协商后的采样周期（毫秒），各块板子可以不同
+        self.capture_paths = {}  # 每个串口最近一次连接的采集文件，断开后仍可导出
+        self.opening = {}  # 正在后台打开的串口（采集进程启动中）的设备
+        self.io_pool = IOPool(IO_POOL_WORKERS) if IO_POOL_WORKERS > 0 else None
+        self.next_port_index = 0  # 串口编号只增不减，移除的串口不会与新串口混淆
         self.init_ui()
 
     def init_ui(self):
@@ -86,40 +93,26 @@ class ArduinoCommunicator(QWidget):
         serial_tab = QWidget()
         serial_layout = QVBoxLayout()
 
-        # 多个串口选择控件
-        self.port_combos = []  # 存储每个串口的下拉选择框
-        self.connect_buttons = []  # 存储每个串口的连接按钮
-        self.disconnect_buttons = []  # 存储每个串口的断开按钮
-        self.refresh_buttons = []  # 存储每个串口的刷新按钮
-
-        ports = self.get_available_ports()  # 获取当前可用的串口列表
-        for i in range(3):  # 最多支持3个串口，可根据需要调整
-            port_layout = QHBoxLayout()  # 每个串口的水平布局
-            port_label = QLabel(f'选择串口 {i + 1}:')  # 串口选择标签
-            port_combo = QComboBox()  # 串口选择下拉框
-            port_combo.addItems(ports)  # 将可用串口添加到下拉框中
-            refresh_button = QPushButton('刷新串口')  # 刷新串口按钮
-            # 绑定刷新按钮的点击事件，点击时调用 on_refresh_ports 方法
-            refresh_button.clicked.connect(lambda _, idx=i: self.on_refresh_ports(idx))
-            connect_button = QPushButton('连接')  # 连接按钮
-            # 绑定连接按钮的点击事件，点击时调用 on_connect 方法
-            connect_button.clicked.connect(lambda _, idx=i: self.on_connect(idx))
-            disconnect_button = QPushButton('断开')  # 断开按钮
-            # 绑定断开按钮的点击事件，点击时调用 on_disconnect 方法
-            disconnect_button.clicked.connect(lambda _, idx=i: self.on_disconnect(idx))
-            disconnect_button.setEnabled(False)  # 初始时断开按钮不可用
-
-            self.port_combos.append(port_combo)  # 将下拉框添加到列表中
-            self.connect_buttons.append(connect_button)  # 将连接按钮添加到列表中
-            self.disconnect_buttons.append(disconnect_button)  # 将断开按钮添加到列表中
-            self.refresh_buttons.append(refresh_button)  # 将刷新按钮添加到列表中
-
-            port_layout.addWidget(port_label)  # 将标签添加到水平布局中
-            port_layout.addWidget(port_combo)  # 将下拉框添加到水平布局中
-            port_layout.addWidget(refresh_button)  # 将刷新按钮添加到水平布局中
-            port_layout.addWidget(connect_button)  # 将连接按钮添加到水平布局中
-            port_layout.addWidget(disconnect_button)  # 将断开按钮添加到水平布局中
-            serial_layout.addLayout(port_layout)  # 将水平布局添加到串口控制标签页的垂直布局中
+        # 多个串口选择控件，键为串口编号，由 add_port 添加、remove_port 删除
+        self.port_rows = {}  # 存储每个串口的一行控件
+        self.port_combos = {}  # 存储每个串口的下拉选择框
+        self.connect_buttons = {}  # 存储每个串口的连接按钮
+        self.disconnect_buttons = {}  # 存储每个串口的断开按钮
+        self.refresh_buttons = {}  # 存储每个串口的刷新按钮
+        self.chart_buttons = {}  # 存储每个串口的图表按钮
+
+        # 串口行放在滚动区域中，几十个串口也不会把窗口撑大
+        self.port_rows_layout = QVBoxLayout()
+        self.port_rows_layout.addStretch()
+        rows_widget = QWidget()
+        rows_widget.setLayout(self.port_rows_layout)
+        rows_area = QScrollArea()
+        rows_area.setWidgetResizable(True)
+        rows_area.setWidget(rows_widget)
+        serial_layout.addWidget(rows_area)
+        add_port_button = QPushButton('添加串口')
+        add_port_button.clicked.connect(self.add_port)
+        serial_layout.addWidget(add_port_button)
 
         serial_tab.setLayout(serial_layout)  # 设置串口控制标签页的布局
 
@@ -129,8 +122,7 @@ class ArduinoCommunicator(QWidget):
 
         # 添加串口选择下拉框
         self.config_port_label = QLabel('选择发送指令的串口:')
-        self.config_port_combo = QComboBox()
-        self.config_port_combo.addItems([f'串口 {i + 1}' for i in range(3)])
+        self.config_port_combo = QComboBox()  # 条目的数据为串口编号
         config_layout.addWidget(self.config_port_label)
         config_layout.addWidget(self.config_port_combo)
 
@@ -183,8 +175,7 @@ class ArduinoCommunicator(QWidget):
 
         # 循环数据显示部分
         self.loop_data_label = QLabel('循环数据:')
-        self.loop_data_text = QTextEdit()
-        self.loop_data_text.setReadOnly(True)
+        self.loop_data_text = LogView()
         self.loop_data_text.hide()
         self.loop_data_label.hide()
 
@@ -205,27 +196,117 @@ class ArduinoCommunicator(QWidget):
         main_layout.addWidget(self.loop_data_text)
         main_layout.addWidget(self.export_button)
 
-        # 为每个串口创建独立的循环数据显示控件
-        for i in range(3):
-            loop_data_label = QLabel(f'串口 {i + 1} 循环数据:')
-            loop_data_text = QTextEdit()
-            loop_data_text.setReadOnly(True)
-            loop_data_text.hide()
-            loop_data_label.hide()
+        # 每个串口的循环数据各占一个标签页，只有当前标签页的文本框需要排版
+        self.port_log_tabs = QTabWidget()
+        self.port_log_tabs.hide()
+        main_layout.addWidget(self.port_log_tabs)
 
-            export_button = QPushButton(f'导出串口 {i + 1} 数据为CSV')
-            export_button.clicked.connect(lambda _, idx=i: self.export_to_csv(idx))
-            export_button.hide()
-
-            self.loop_data_labels[i] = loop_data_label
-            self.loop_data_texts[i] = loop_data_text
-            self.export_buttons[i] = export_button
+        self.setLayout(main_layout)
 
-            main_layout.addWidget(loop_data_label)
-            main_layout.addWidget(loop_data_text)
-            main_layout.addWidget(export_button)
+        for _ in range(INITIAL_PORTS):
+            self.add_port()
+
+    def add_port(self):
+        # 添加一行串口控件，返回新串口的编号
+        index = self.next_port_index
+        self.next_port_index += 1
+        row = QWidget()
+        port_layout = QHBoxLayout()  # 每个串口的水平布局
+        port_layout.setContentsMargins(0, 0, 0, 0)
+        port_label = QLabel(f'选择串口 {index + 1}:')  # 串口选择标签
+        port_combo = QComboBox()  # 串口选择下拉框
+        port_combo.addItems(self.get_available_ports())  # 将可用串口添加到下拉框中
+        port_combo.setEditable(True)  # 允许手动输入串口路径，例如 device_simulator.py 打印的伪终端或 replay:// 回放地址
+        refresh_button = QPushButton('刷新串口')  # 刷新串口按钮
+        # 绑定刷新按钮的点击事件，点击时调用 on_refresh_ports 方法
+        refresh_button.clicked.connect(lambda _, idx=index: self.on_refresh_ports(idx))
+        connect_button = QPushButton('连接')  # 连接按钮
+        # 绑定连接按钮的点击事件，点击时调用 on_connect 方法
+        connect_button.clicked.connect(lambda _, idx=index: self.on_connect(idx))
+        disconnect_button = QPushButton('断开')  # 断开按钮
+        # 绑定断开按钮的点击事件，点击时调用 on_disconnect 方法
+        disconnect_button.clicked.connect(lambda _, idx=index: self.on_disconnect(idx))
+        disconnect_button.setEnabled(False)  # 初始时断开按钮不可用
+        chart_button = QPushButton('图表')  # 打开图表窗口，连接后可用
+        chart_button.clicked.connect(lambda _, idx=index: self.show_chart(idx))
+        chart_button.setEnabled(False)
+        remove_button = QPushButton('移除')  # 断开并删除这一行
+        remove_button.clicked.connect(lambda _, idx=index: self.remove_port(idx))
+
+        self.port_rows[index] = row
+        self.port_combos[index] = port_combo
+        self.connect_buttons[index] = connect_button
+        self.disconnect_buttons[index] = disconnect_button
+        self.refresh_buttons[index] = refresh_button
+        self.chart_buttons[index] = chart_button
+
+        for widget in (port_label, port_combo, refresh_button, connect_button, disconnect_button, chart_button,
+                       remove_button):
+            port_layout.addWidget(widget)
+        row.setLayout(port_layout)
+        # 插在末尾的伸缩项之前
+        self.port_rows_layout.insertWidget(self.port_rows_layout.count() - 1, row)
+        self.config_port_combo.addItem(f'串口 {index + 1}', index)
+        return index
+
+    def remove_port(self, index):
+        # 断开串口，删除它的控件、图表窗口和数据
+        if index not in self.port_rows:
+            return
+        self.opening.pop(index, None)
+        if self.devices.get(index) is not None:
+            self.on_disconnect(index)
+        window = self.chart_windows.pop(index, None)
+        if window is not None:
+            window.close()
+        self.close_port_log(index)
+        row = self.port_rows.pop(index)
+        self.port_rows_layout.removeWidget(row)
+        row.deleteLater()
+        for widgets in (self.port_combos, self.connect_buttons, self.disconnect_buttons, self.refresh_buttons,
+                        self.chart_buttons):
+            del widgets[index]
+        for data in (self.devices, self.loop_data, self.is_looping, self.plot_data, self.raw_data, self.sample_periods,
+                     self.capture_paths):
+            data.pop(index, None)
+        self.config_port_combo.removeItem(self.config_port_combo.findData(index))
+
+    def config_port_index(self):
+        # 引脚配置标签页选中的串口编号，没有选中时为 -1
+        index = self.config_port_combo.currentData()
+        return -1 if index is None else index
+
+    def port_log(self, index):
+        # 串口的日志控件在第一次需要显示时才创建，按串口编号顺序插入日志标签页
+        if index not in self.loop_data_texts:
+            loop_data_text = LogView()
+            export_button = QPushButton(f'导出串口 {index + 1} 数据为CSV')
+            export_button.clicked.connect(lambda _, idx=index: self.export_to_csv(idx))
+            page = QWidget()
+            layout = QVBoxLayout()
+            layout.addWidget(loop_data_text)
+            layout.addWidget(export_button)
+            page.setLayout(layout)
+            self.loop_data_texts[index] = loop_data_text
+            self.export_buttons[index] = export_button
+            position = sum(1 for other in self.loop_data_texts if other < index)
+            self.port_log_tabs.insertTab(position, page, f'串口 {index + 1} 循环数据')
+            self.port_log_tabs.show()
+        return self.loop_data_texts[index]
+
+    def close_port_log(self, index):
+        # 移除串口时删除它的日志标签页
+        loop_data_text = self.loop_data_texts.pop(index, None)
+        if loop_data_text is None:
+            return
+        del self.export_buttons[index]
+        self.render_scheduler.discard(('log', index))
+        page = loop_data_text.parentWidget()
+        self.port_log_tabs.removeTab(self.port_log_tabs.indexOf(page))
+        page.deleteLater()
+        if not self.port_log_tabs.count():
+            self.port_log_tabs.hide()
 
-        self.setLayout(main_layout)
 
     def get_available_ports(self):
         # 使用 serial.tools.list_ports.comports() 获取当前可用的串口列表
@@ -243,10 +324,13 @@ class ArduinoCommunicator(QWidget):
 
     def on_connect(self, index):
         # 检查指定索引的串口是否已经连接
-        if index in self.ser_connections and self.ser_connections[index] is not None:
+        if index in self.devices and self.devices[index] is not None:
             # 如果已经连接，在循环数据文本框中添加提示信息
             self.loop_data_text.append(f"串口 {index + 1} 已经连接")
             return
+        if index in self.opening:
+            self.loop_data_text.append(f"串口 {index + 1} 正在连接")
+            return
     
         # 获取指定索引的串口下拉选择框中选中的串口
         selected_port = self.port_combos[index].currentText()
@@ -255,70 +339,102 @@ class ArduinoCommunicator(QWidget):
             self.loop_data_text.append(f"请选择串口 {index + 1}")
             return
     
-        try:
-            # 尝试打开指定的串口，设置波特率和超时时间
-            self.ser_connections[index] = serial.Serial(selected_port, BAUDRATE, timeout=TIMEOUT)
-            # 在对应串口的循环数据文本框中添加连接成功的提示信息
-            self.loop_data_texts[index].append(f"已连接到串口 {index + 1}: {selected_port}")
-            # 禁用连接按钮
-            self.connect_buttons[index].setEnabled(False)
-            # 启用断开按钮
+        # 打开串口并启动独立的读取线程，数据在读取线程中解析后成批通过信号交给界面线程，命令应答按序号交给命令通道
+        # 新连接的板子使用上电时的默认周期
+        self.sample_periods[index] = DEFAULT_SAMPLE_PERIOD_MS
+        self.capture_paths.pop(index, None)
+        if PROCESS_PER_PORT:
+            device = ProcessDevice(selected_port, index, BAUDRATE, TIMEOUT, DEFAULT_SAMPLE_PERIOD_MS)
+        else:
+            device = TestBoxDevice(selected_port, index, BAUDRATE, TIMEOUT, DEFAULT_SAMPLE_PERIOD_MS, self.io_pool)
+        device.subscribe(self.serial_signals.lines_received.emit, self.serial_signals.samples_received.emit,
+                         lambda idx, e: self.serial_signals.read_error.emit(idx, str(e)))
+        self.opening[index] = device
+        self.connect_buttons[index].setEnabled(False)
+        if PROCESS_PER_PORT:
+            # 采集进程以 spawn 方式启动要重新导入模块，可能需要数秒，在后台线程中等待，结果经信号交回界面线程
+            self.port_log(index).append(f"正在连接串口 {index + 1}: {selected_port}")
+            # 等待期间可以点“断开”放弃
             self.disconnect_buttons[index].setEnabled(True)
-            # 初始化指定索引的串口的循环数据列表
-            self.loop_data[index] = []
-            # 初始化指定索引的串口的绘图数据字典
-            self.plot_data[index] = {}
-            # 创建一个定时器对象
-            self.timers[index] = QTimer(self)
-            # 绑定定时器的超时事件，超时后调用 read_serial_data 方法
-            self.timers[index].timeout.connect(lambda: self.read_serial_data(index))
-            
-            # 显示对应串口的循环数据相关控件
-            self.loop_data_labels[index].show()
-            self.loop_data_texts[index].show()
-            self.export_buttons[index].show()
-            self.timers[index].start(100)
-    
-            # 获取引脚配置串口的索引
-            selected_index = self.config_port_combo.currentIndex()
-    
-            # 只有当串口索引不是引脚配置串口索引时才创建和显示图表
-            if index != selected_index:
-                # 为新连接的串口创建图表画布
-                self.plot_canvases[index] = FigureCanvas(Figure(figsize=(5, 4), dpi=100))
-                # 创建新的窗口来显示图表
-                self.chart_windows[index] = ChartWindow(self.plot_canvases[index])
-                self.chart_windows[index].setWindowTitle(f"串口 {index + 1} 图表")
-                self.chart_windows[index].show()
-            
-            # 只有引脚配置指定串口才在连接时获取所有引脚 currentpinfunction
-            if index == selected_index:
-                self.get_pin_functions_for_index(index)
-            
-        except serial.SerialException as e:
+            threading.Thread(target=self.open_device, args=(index, device, selected_port),
+                             name=f'OpenPort-{index}', daemon=True).start()
+        else:
+            self.open_device(index, device, selected_port)
+
+    def open_device(self, index, device, port):
+        # 可以在后台线程中调用；打开结果由 on_port_opened 在界面线程中处理，任何错误都要报告，否则串口一直处于连接中
+        try:
+            device.open()
+            error = ''
+        except (serial.SerialException, OSError, RuntimeError, ValueError) as e:
+            error = str(e) or type(e).__name__
+        self.serial_signals.port_opened.emit(index, device, port, error)
+
+    def on_port_opened(self, index, device, port, error):
+        if self.opening.get(index) is not device:
+            # 打开期间串口已被移除或窗口已关闭
+            if not error:
+                device.close()
+            return
+        del self.opening[index]
+        if error:
             # 如果连接失败，在循环数据文本框中添加错误提示信息
-            self.loop_data_texts[index].append(f"无法连接到串口 {index + 1}: {e}")
+            self.port_log(index).append(f"无法连接到串口 {index + 1}: {error}")
             # 将指定索引的串口连接对象设置为 None
-            self.ser_connections[index] = None
+            self.devices[index] = None
+            self.connect_buttons[index].setEnabled(True)
+            self.disconnect_buttons[index].setEnabled(False)
+            return
+        self.devices[index] = device
+        # 在对应串口的循环数据文本框中添加连接成功的提示信息
+        self.port_log(index).append(f"已连接到串口 {index + 1}: {port}")
+        # 禁用连接按钮
+        self.connect_buttons[index].setEnabled(False)
+        # 启用断开按钮
+        self.disconnect_buttons[index].setEnabled(True)
+        self.chart_buttons[index].setEnabled(True)
+        # 初始化指定索引的串口的循环数据列表
+        self.loop_data[index] = deque(maxlen=self.history_limit(index))
+        # 初始化指定索引的串口的绘图数据字典
+        self.plot_data[index] = {}
+        self.start_recorder(index, port)
+
+        # 获取引脚配置串口的索引
+        selected_index = self.config_port_index()
+
+        # 只有当串口索引不是引脚配置串口索引时才创建和显示图表，串口很多时只自动打开前 AUTO_CHART_LIMIT 个
+        if index != selected_index and len(self.live_plots) < AUTO_CHART_LIMIT:
+            self.show_chart(index)
+
+        # 只有引脚配置指定串口才在连接时获取所有引脚 currentpinfunction
+        if index == selected_index:
+            self.get_pin_functions_for_index(index)
 
     def on_disconnect(self, index):
+        if index in self.opening:
+            # 还在打开的串口放弃等待，打开完成后由 on_port_opened 关闭
+            del self.opening[index]
+            self.port_log(index).append(f"串口 {index + 1} 已取消连接。")
+            self.connect_buttons[index].setEnabled(True)
+            self.disconnect_buttons[index].setEnabled(False)
+            return
         # 检查指定索引的串口是否已经连接
-        if index in self.ser_connections and self.ser_connections[index] is not None:
-            # 关闭指定索引的串口连接
-            self.ser_connections[index].close()
+        if index in self.devices and self.devices[index] is not None:
+            # 停止读取线程和命令通道，关闭采集文件和串口
+            self.devices[index].close()
             # 将指定索引的串口连接对象设置为 None
-            self.ser_connections[index] = None
+            self.devices[index] = None
             # 在循环数据文本框中添加断开连接的提示信息
-            self.loop_data_texts[index].append(f"串口 {index + 1} 已断开。")
+            self.port_log(index).append(f"串口 {index + 1} 已断开。")
             # 启用连接按钮
             self.connect_buttons[index].setEnabled(True)
             # 禁用断开按钮
             self.disconnect_buttons[index].setEnabled(False)
+            self.chart_buttons[index].setEnabled(False)
             # 检查指定索引的串口是否正在循环
             if index in self.is_looping and self.is_looping[index]:
-                # 如果正在循环，停止循环并设置循环状态为 False
+                # 如果正在循环，设置循环状态为 False
                 self.is_looping[index] = False
-                self.timers[index].stop()
             # 移除断开串口对应的图表标签页
             if index in self.plot_canvases:
                 # 获取指定索引的图表画布在标签页控件中的索引
@@ -328,33 +444,32 @@ class ArduinoCommunicator(QWidget):
                     self.chart_tab_widget.removeTab(tab_index)
                 # 从图表画布字典中删除指定索引的画布
                 del self.plot_canvases[index]
+                self.live_plots.pop(index, None)
+                self.render_scheduler.discard(index)
 
-            # 隐藏对应串口的循环数据相关控件
-            self.loop_data_labels[index].hide()
-            self.loop_data_texts[index].hide()
-            self.loop_data_texts[index].clear()
-            self.export_buttons[index].hide()
+            # 之后到达的数据不再显示；日志标签页保留，断开提示和历史日志仍可查看，移除串口时才删除
+            self.loop_data.pop(index, None)
         else:
             # 关闭并删除对应的图表窗口
             if index in self.chart_windows:
                 self.chart_windows[index].close()
                 del self.chart_windows[index]
 
-            # 关闭指定索引的串口连接
-            self.ser_connections[index].close()
+            # 停止读取线程和命令通道，关闭采集文件和串口
+            self.devices[index].close()
             # 将指定索引的串口连接对象设置为 None
-            self.ser_connections[index] = None
+            self.devices[index] = None
             # 在循环数据文本框中添加断开连接的提示信息
-            self.loop_data_texts[index].append(f"串口 {index + 1} 已断开。")
+            self.port_log(index).append(f"串口 {index + 1} 已断开。")
             # 启用连接按钮
             self.connect_buttons[index].setEnabled(True)
             # 禁用断开按钮
             self.disconnect_buttons[index].setEnabled(False)
+            self.chart_buttons[index].setEnabled(False)
             # 检查指定索引的串口是否正在循环
             if index in self.is_looping and self.is_looping[index]:
-                # 如果正在循环，停止循环并设置循环状态为 False
+                # 如果正在循环，设置循环状态为 False
                 self.is_looping[index] = False
-                self.timers[index].stop()
             # 移除断开串口对应的图表标签页
             if index in self.plot_canvases:
                 # 获取指定索引的图表画布在标签页控件中的索引
@@ -364,10 +479,12 @@ class ArduinoCommunicator(QWidget):
                     self.chart_tab_widget.removeTab(tab_index)
                 # 从图表画布字典中删除指定索引的画布
                 del self.plot_canvases[index]
+                self.live_plots.pop(index, None)
+                self.render_scheduler.discard(index)
 
     def send_command(self):
-        selected_index = self.config_port_combo.currentIndex()
-        if selected_index not in self.ser_connections or self.ser_connections[selected_index] is None:
+        selected_index = self.config_port_index()
+        if selected_index not in self.devices or self.devices[selected_index] is None:
             self.loop_data_text.append(f"选择的串口 {selected_index + 1} 未连接")
             return
 
@@ -379,78 +496,131 @@ class ArduinoCommunicator(QWidget):
         elif command == 'functionMap':
             self.send_function_map(selected_index)
         elif command == 'getPinFunction':
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 14
-            else:
-                pin_num = int(selected_pin)
+            pin_num = pin_number(selected_pin)
             self.send_get_pin_function(selected_index, pin_num)
         elif command == 'setPinFunction':
             selected_function = self.function_combo.currentText()
             function_num = function_map[selected_function]
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 14
-            else:
-                pin_num = int(selected_pin)
+            pin_num = pin_number(selected_pin)
             self.send_set_pin_function(selected_index, pin_num, function_num)
         elif command == 'startLoop':
             self.send_general_command(selected_index, command)
         elif command == 'stopLoop':
             self.send_general_command(selected_index, command)
+        elif command == 'setStreamMode':
+            mode = stream_mode_map[self.function_combo.currentText()]
+            self.send_set_stream_mode(selected_index, mode)
+        elif command == 'setSampleRate':
+            period_ms = sample_rate_map[self.function_combo.currentText()]
+            self.send_set_sample_rate(selected_index, period_ms)
+        elif command == 'getAllPinFunctions':
+            self.get_pin_functions_for_index(selected_index)
 
     def send_function_map(self, index):
-        if index not in self.ser_connections or self.ser_connections[index] is None:
-            self.loop_data_texts[index].append("未连接串口")
+        if index not in self.devices or self.devices[index] is None:
+            self.port_log(index).append("未连接串口")
             return
-        cmd_bytes = bytes([command_map['functionMap']])
-        self.ser_connections[index].write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser_connections[index].readline().decode().strip()
-        if response:
-            self.loop_data_texts[index].append(f"串口 {index + 1} 响应: {response}")
-        else:
-            self.loop_data_texts[index].append(f"串口 {index + 1} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.port_log(index).append(f"串口 {index + 1} 响应: {response}")
+            else:
+                self.port_log(index).append(f"串口 {index + 1} 未收到响应。")
+        self.send_request(index, 'functionMap', (), handle_response)
 
     def send_get_pin_function(self, index, pin):
-        if index not in self.ser_connections or self.ser_connections[index] is None:
-            self.loop_data_texts[index].append("未连接串口")
+        if index not in self.devices or self.devices[index] is None:
+            self.port_log(index).append("未连接串口")
             return
-        cmd_bytes = bytes([command_map['getPinFunction'], pin])
-        self.ser_connections[index].write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser_connections[index].readline().decode().strip()
-        if response:
-            self.loop_data_texts[index].append(f"串口 {index + 1} 引脚 {pin} 功能响应: {response}")
-        else:
-            self.loop_data_texts[index].append(f"串口 {index + 1} 引脚 {pin} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.port_log(index).append(f"串口 {index + 1} 引脚 {pin} 功能响应: {response}")
+            else:
+                self.port_log(index).append(f"串口 {index + 1} 引脚 {pin} 未收到响应。")
+        self.send_request(index, 'getPinFunction', (pin,), handle_response)
 
     def send_set_pin_function(self, index, pin, function):
-        if index not in self.ser_connections or self.ser_connections[index] is None:
-            self.loop_data_texts[index].append("未连接串口")
+        if index not in self.devices or self.devices[index] is None:
+            self.port_log(index).append("未连接串口")
+            return
+
+        def handle_response(response):
+            if response:
+                self.port_log(index).append(f"串口 {index + 1} 设置引脚 {pin} 功能为 {function} 响应: {response}")
+            else:
+                self.port_log(index).append(f"串口 {index + 1} 设置引脚 {pin} 功能为 {function} 未收到响应。")
+        self.send_request(index, 'setPinFunction', (pin, function), handle_response)
+
+    def send_set_stream_mode(self, index, mode):
+        if index not in self.devices or self.devices[index] is None:
+            self.port_log(index).append("未连接串口")
             return
-        cmd_bytes = bytes([command_map['setPinFunction'], pin, function])
-        self.ser_connections[index].write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser_connections[index].readline().decode().strip()
-        if response:
-            self.loop_data_texts[index].append(f"串口 {index + 1} 设置引脚 {pin} 功能为 {function} 响应: {response}")
-        else:
-            self.loop_data_texts[index].append(f"串口 {index + 1} 设置引脚 {pin} 功能为 {function} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.port_log(index).append(f"串口 {index + 1} 设置传输格式为 {mode} 响应: {response}")
+            else:
+                self.port_log(index).append(f"串口 {index + 1} 设置传输格式为 {mode} 未收到响应。")
+        self.send_request(index, 'setStreamMode', (mode, SAMPLES_PER_FRAME), handle_response)
+
+    def send_set_sample_rate(self, index, period_ms):
+        if index not in self.devices or self.devices[index] is None:
+            self.port_log(index).append("未连接串口")
+            return
+
+        def handle_response(response):
+            if response:
+                # 响应为 ok 枚举值后接实际采样周期，固件按系统节拍取整
+                status, payload = parse_reply(response)
+                try:
+                    actual_ms = int(payload)
+                except ValueError:
+                    actual_ms = period_ms
+                # 只有这个串口的板子改了采样率，其他串口保持各自的周期
+                self.sample_periods[index] = actual_ms
+                if self.devices.get(index) is not None:
+                    self.devices[index].sample_period_ms = actual_ms
+                self.resize_history(index)
+                self.port_log(index).append(
+                    f"串口 {index + 1} 设置采样周期为 {period_ms} ms 响应: {response}，实际周期 {actual_ms} ms")
+            else:
+                self.port_log(index).append(f"串口 {index + 1} 设置采样周期为 {period_ms} ms 未收到响应。")
+        self.send_request(index, 'setSampleRate', (period_ms & 0xFF, period_ms >> 8), handle_response)
+
+    def sample_period(self, index):
+        # 该串口协商后的采样周期（毫秒），0 为最快模式
+        return self.sample_periods.get(index, DEFAULT_SAMPLE_PERIOD_MS)
+
+    def history_limit(self, index):
+        # 历史点数随该串口协商后的采样率变化
+        period_ms = self.sample_period(index)
+        if period_ms > 0:
+            return max(1, HISTORY_SECONDS * 1000 // period_ms)
+        return MAX_HISTORY_POINTS
+
+    def resize_history(self, index):
+        # 采样率改变后按 HISTORY_SECONDS 重新换算该串口各缓冲区的容量，保留最近的数据
+        limit = self.history_limit(index)
+        loop_data = self.loop_data.get(index)
+        if loop_data is not None and loop_data.maxlen != limit:
+            self.loop_data[index] = deque(loop_data, maxlen=limit)
+        if index in self.raw_data:
+            self.raw_data[index].resize(limit)
+        for ring in self.plot_data.get(index, {}).values():
+            ring.resize(limit)
 
     def send_get_current_function(self, index, pin):
-        if index not in self.ser_connections or self.ser_connections[index] is None:
+        if index not in self.devices or self.devices[index] is None:
             self.loop_data_text.append("Serial port not connected.")
             return
-        try:
-            if isinstance(pin, str) and pin.startswith('A'):
-                pin_num = ord(pin[1]) - ord('0') + 14  # A0 -> 14, A1 -> 15, etc.
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
-            else:
-                pin_num = int(pin)
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
+        if pin not in self.pin_labels:
+            print(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
+            self.loop_data_text.append(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
+            return
+        pin_num = pin_number(pin)
 
-            self.ser_connections[index].write(cmd_bytes + b'\r\n')
-            time.sleep(0.1)
-            response = self.ser_connections[index].readline().decode().strip()
+        def handle_response(response):
             if response:
                 try:
                     # 将数字响应转换为对应的功能单词
@@ -461,127 +631,199 @@ class ArduinoCommunicator(QWidget):
                     self.pin_labels[pin].setText(f'引脚 {pin}: {response}')
             else:
                 self.pin_labels[pin].setText(f'引脚 {pin}: 未获取到功能')
-        except KeyError:
-            print(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
-            self.loop_data_text.append(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
+        self.send_request(index, 'getcurrentPinFunction', (pin_num,), handle_response)
 
     def send_general_command(self, index, command):
-        if index not in self.ser_connections or self.ser_connections[index] is None:
+        if index not in self.devices or self.devices[index] is None:
             self.loop_data_text.append("未连接串口")
             return
-        cmd_bytes = bytes([command_map[command]])
-        self.ser_connections[index].write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser_connections[index].readline().decode().strip()
-        if response:
-            self.loop_data_text.append(f"串口 {index + 1} 响应: {response}")
-            if command == 'startLoop' and response == Response_map['ok']:
-                self.is_looping[index] = True
-                self.loop_data_label.show()
-                self.loop_data_text.show()
-                self.export_button.show()
-                self.timers[index].start(100)
-                self.plot_data[index] = {}
-            elif command == 'stopLoop' and response == Response_map['ok']:
-                self.is_looping[index] = False
-                self.timers[index].stop()
-                self.loop_data_label.hide()
-                self.loop_data_text.hide()
-                self.loop_data_text.clear()
-                self.plot_canvases[index].hide()
-        else:
-            self.loop_data_text.append(f"串口 {index + 1} 未收到响应。")
 
-    def read_serial_data(self, index):
+        def handle_response(response):
+            if response:
+                self.loop_data_text.append(f"串口 {index + 1} 响应: {response}")
+                status, _ = parse_reply(response)
+                if command == 'startLoop' and status == Response_map['ok']:
+                    self.is_looping[index] = True
+                    self.loop_data_label.show()
+                    self.loop_data_text.show()
+                    self.export_button.show()
+                    self.plot_data[index] = {}
+                elif command == 'stopLoop' and status == Response_map['ok']:
+                    self.is_looping[index] = False
+                    self.loop_data_label.hide()
+                    self.loop_data_text.hide()
+                    self.loop_data_text.clear()
+                    if index in self.plot_canvases:
+                        self.plot_canvases[index].hide()
+            else:
+                self.loop_data_text.append(f"串口 {index + 1} 未收到响应。")
+        self.send_request(index, command, (), handle_response)
+
+    def read_serial_data(self, index, lines):
+        # 由读取线程通过信号调用（界面线程中执行），lines 为一批完整的数据行，只进入日志
+        if index not in self.loop_data:
+            return
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        # 将数据添加到循环数据列表，日志先排队，每帧成批显示一次
+        self.loop_data[index].extend(lines)
+        self.port_log(index).extend([f"串口 {index + 1} [{timestamp}] {data}" for data in lines])
+        self.render_scheduler.mark_dirty(('log', index), self.port_log(index).flush)
+
+    def read_samples(self, index, samples):
+        # 读取线程中已解析好的一批采样 {通道: (时间戳, 数值)}：ASCII 数值行为 'raw'，二进制帧按引脚拆分，
+        # 每批数据只写入一次缓冲区、重绘一次
+        if index not in self.loop_data:
+            return
+        if index not in self.raw_data:
+            self.raw_data[index] = RingBuffer(self.history_limit(index))
+        raw = self.raw_data[index]
+        if 'raw' in samples:
+            # 原始数据的横轴用设备按采样周期换算的时间戳，改变采样率时之前的数据不会被重新缩放
+            times, values = samples['raw']
+            raw.extend(times, values)
+            self.render_scheduler.mark_dirty(index, lambda: self.update_raw_image(index))
+            return
+        timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
+        for pin, (times, values) in samples.items():
+            if pin not in self.plot_data[index]:
+                self.plot_data[index][pin] = RingBuffer(self.history_limit(index))
+            self.plot_data[index][pin].extend(times, values)
+            values = values.tolist()
+            self.loop_data[index].extend(f"{pin},{value}" for value in values)
+            self.port_log(index).extend([f"串口 {index + 1} [{timestamp}] {pin},{value}" for value in values])
+        self.render_scheduler.mark_dirty(('log', index), self.port_log(index).flush)
+        if len(samples) == 1:
+            # 只有一个引脚时沿用原来的波形图，横轴用帧中的时间
+            (times, values), = samples.values()
+            raw.extend(times, values)
+            self.render_scheduler.mark_dirty(index, lambda: self.update_raw_image(index))
+        elif samples:
+            self.render_scheduler.mark_dirty(index, lambda: self.update_plot(index))
+
+    def on_read_error(self, index, error):
+        # 捕获串口异常并添加错误信息到对应的循环数据文本框
+        self.port_log(index).append(f"串口 {index + 1} 读取数据时发生串口异常: {error}")
+        # 关闭串口连接并清理资源
+        if index in self.devices and self.devices[index] is not None:
+            self.devices[index].close()
+            self.devices[index] = None
+            self.connect_buttons[index].setEnabled(True)
+            self.disconnect_buttons[index].setEnabled(False)
+            self.chart_buttons[index].setEnabled(False)
+            if index in self.plot_canvases:
+                tab_index = self.chart_tab_widget.indexOf(self.plot_canvases[index])
+                if tab_index != -1:
+                    self.chart_tab_widget.removeTab(tab_index)
+                del self.plot_canvases[index]
+                self.live_plots.pop(index, None)
+                self.render_scheduler.discard(index)
+            self.loop_data.pop(index, None)
+
+    def send_request(self, index, command, args, handler):
+        # 命令进入该串口的写队列后立即返回 Future，界面线程不等待写入和应答；
+        # 应答由读取线程按序号转交，再经信号回到界面线程调用 handler，超时（TIMEOUT 秒）、写入失败或断开时 handler 收到 None
         try:
-            if index in self.ser_connections and self.ser_connections[index] and self.ser_connections[index].in_waiting > 0:
-                data = self.ser_connections[index].readline().decode().strip()
-                if data:
-                    # 将数据添加到循环数据列表
-                    self.loop_data[index].append(data)
-                    # 在对应的循环数据文本框中显示数据
-                    timestamp = time.strftime('%Y-%m-%d %H:%M:%S')
-                    self.loop_data_texts[index].append(f"串口 {index + 1} [{timestamp}] {data}")
-                
-                    # 存储原始数据用于波形图
-                    if index not in self.raw_data:
-                        self.raw_data[index] = []
-                    try:
-                        # 尝试将数据转换为数值
-                        value = float(data)
-                        self.raw_data[index].append(value)
-                        self.update_raw_image(index)
-                    except ValueError:
-                        # 如果转换失败，忽略该数据点
-                        pass
-        except serial.SerialException as e:
-            # 捕获串口异常并添加错误信息到对应的循环数据文本框
-            self.loop_data_texts[index].append(f"串口 {index + 1} 读取数据时发生串口异常: {e}")
-            # 关闭串口连接并清理资源
-            if index in self.ser_connections:
-                try:
-                    self.ser_connections[index].close()
-                except:
-                    pass
-                self.ser_connections[index] = None
-                self.connect_buttons[index].setEnabled(True)
-                self.disconnect_buttons[index].setEnabled(False)
-                self.timers[index].stop()
-                if index in self.plot_canvases:
-                    tab_index = self.chart_tab_widget.indexOf(self.plot_canvases[index])
-                    if tab_index != -1:
-                        self.chart_tab_widget.removeTab(tab_index)
-                    del self.plot_canvases[index]
-                self.loop_data_labels[index].hide()
-                self.loop_data_texts[index].hide()
-                self.loop_data_texts[index].clear()
-                self.export_buttons[index].hide()
-        except Exception as e:
-            # 捕获其他异常并添加错误信息到对应的循环数据文本框
-            self.loop_data_texts[index].append(f"串口 {index + 1} 读取数据时发生未知异常: {e}")
+            return self.devices[index].send(
+                command, args,
+                lambda response: self.serial_signals.command_reply.emit(handler, response))
+        except (KeyError, RuntimeError) as e:
+            self.port_log(index).append(f"串口 {index + 1} 发送命令 {command} 失败: {e}")
+
+    def on_command_reply(self, handler, response):
+        handler(response)
+
+    def start_recorder(self, index, port):
+        # 回放的数据本身就来自采集文件，不再重复记录
+        if CAPTURE_DIR is None or is_replay(port):
+            return
+        path = os.path.join(CAPTURE_DIR, f'{os.path.basename(port)}_{time.strftime("%Y%m%d-%H%M%S")}.tbcap')
+        try:
+            self.devices[index].start_recording(path)
+            self.capture_paths[index] = path
+        except OSError as e:
+            self.port_log(index).append(f"串口 {index + 1} 无法创建采集文件 {path}: {e}")
+
+    def show_chart(self, index):
+        # 图表窗口在需要显示时才创建，已经打开时提到最前
+        if index in self.live_plots:
+            self.chart_windows[index].show()
+            self.chart_windows[index].raise_()
+            return
+        if self.devices.get(index) is None:
+            return
+        # 为串口创建图表画布
+        self.plot_canvases[index] = FigureCanvas(Figure(figsize=(5, 4), dpi=100))
+        self.live_plots[index] = LivePlot(self.plot_canvases[index], ylabel='数值')
+        # 创建新的窗口来显示图表
+        recorder = self.devices[index].recorder
+        self.chart_windows[index] = ChartWindow(self.plot_canvases[index],
+                                                recorder.path if recorder is not None else None)
+        self.chart_windows[index].setWindowTitle(f"串口 {index + 1} 图表")
+        self.chart_windows[index].show()
+        # 连接之后才打开的图表先画出已经收到的数据
+        if self.plot_data.get(index):
+            self.update_plot(index)
+        elif index in self.raw_data:
+            self.update_raw_image(index)
 
     def update_raw_image(self, index):
-        if index in self.plot_canvases:
-            canvas = self.plot_canvases[index]
-            fig = canvas.figure
-            fig.clear()
-            ax = fig.add_subplot(111)
-            
-            # 获取原始数据
-            img_data = self.raw_data[index]
-            
-            # 绘制波形图
-            ax.plot(range(len(img_data)), img_data)
-            
-            ax.set_xlabel('数据点')
-            ax.set_ylabel('数值')
-            ax.set_title(f'串口 {index + 1} 波形图')
-            
-            canvas.draw()
+        if index in self.live_plots and not self.is_reviewing(index):
+            plot = self.live_plots[index]
+            # 横轴在写入时已按采样周期换算；环形缓冲区按画布宽度抽取后只更新曲线数据
+            plot.set_labels(f'串口 {index + 1} 波形图', '时间 (s)' if self.sample_period(index) > 0 else '数据点')
+            plot.update_rings({'raw': self.raw_data[index]})
 
     def update_plot(self, index):
-        if index in self.plot_canvases:
-            canvas = self.plot_canvases[index]
-            canvas.figure.clear()
-            ax = canvas.figure.add_subplot(111)
-            for pin, (x, y) in self.plot_data[index].items():
-                ax.plot(x, y, label=pin)
-            ax.legend()
-            canvas.draw()
+        if index in self.live_plots and not self.is_reviewing(index):
+            plot = self.live_plots[index]
+            plot.set_labels(f'串口 {index + 1} 波形图', '时间 (s)')
+            plot.update_rings(self.plot_data[index], legend=True)
+
+    def is_reviewing(self, index):
+        # 图表窗口切换到回看记录时不更新实时图表
+        window = self.chart_windows.get(index)
+        return window is not None and window.reviewing
 
     def export_to_csv(self, index):
-        if index not in self.loop_data:
+        # 有采集文件时从采集文件导出整段记录（与 配置窗口第一版.py 的 SerialTab 相同）：后台线程按块读取并格式化，
+        # 正在记录时只包含已写盘的部分。没有采集文件时（回放、CAPTURE_DIR 为 None）退回导出环形缓冲区，
+        # 只包含最近 HISTORY_SECONDS 秒：多引脚（二进制帧）数据按引脚逐段导出，否则导出原始数据
+        path = self.capture_paths.get(index)
+        if path is not None:
+            try:
+                reader = CaptureReader(path)
+            except (OSError, ValueError) as e:
+                self.port_log(index).append(f"串口 {index + 1} 无法打开采集文件 {path}: {e}")
+                return
+            if not len(reader):
+                self.port_log(index).append(f"串口 {index + 1} 没有可导出的数据。")
+                return
+            file_path, _ = QFileDialog.getSaveFileName(self, "导出数据为CSV", "", "CSV Files (*.csv)")
+            if file_path:
+                export_in_background(self, file_path, CSV_HEADER, capture_series(reader), self.port_log(index).append,
+                                     total=len(reader), value_format=VALUE_FORMAT)
+            return
+
+        pins = self.plot_data.get(index)
+        if pins:
+            header = ['timestamp', 'pin', 'data']
+            series = [(pin, *ring.snapshot()) for pin, ring in pins.items()]
+        elif index in self.raw_data:
+            raw = self.raw_data[index]
+            if self.sample_period(index) > 0:
+                header = ['timestamp', 'data']
+                series = [(None, *raw.snapshot())]
+            else:
+                # 最快模式下横轴是采样序号，没有时间可换算
+                header = ['sample', 'data']
+                series = [(None, raw.times.copy(), raw.values.copy())]
+        else:
+            self.port_log(index).append(f"串口 {index + 1} 没有可导出的数据。")
             return
 
         file_path, _ = QFileDialog.getSaveFileName(self, "导出数据为CSV", "", "CSV Files (*.csv)")
         if file_path:
-            with open(file_path, 'w', newline='') as csvfile:
-                fieldnames = ['timestamp', 'data']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-                writer.writeheader()
-                for item in self.loop_data[index]:
-                    writer.writerow(item)
+            export_in_background(self, file_path, header, series, self.port_log(index).append)
 
     def update_function_combo_visibility(self):
         command = self.command_combo.currentText()
@@ -589,11 +831,19 @@ class ArduinoCommunicator(QWidget):
             self.function_label.show()
             self.function_combo.show()
             self.update_function_options()
+        elif command in command_options:
+            self.function_label.show()
+            self.function_combo.show()
+            self.function_combo.clear()
+            self.function_combo.addItems(list(command_options[command].keys()))
         else:
             self.function_label.hide()
             self.function_combo.hide()
 
     def update_function_options(self):
+        # setStreamMode、setSampleRate 的选项与引脚无关
+        if self.command_combo.currentText() in command_options:
+            return
         selected_pin = self.pin_combo.currentText()
         if isinstance(selected_pin, str) and selected_pin.startswith('A'):
             pin = selected_pin
@@ -604,15 +854,29 @@ class ArduinoCommunicator(QWidget):
         self.function_combo.addItems(functions)
 
     def get_pin_functions_for_index(self, index):
-        for pin in pin_ranges:
-            self.send_get_current_function(index, str(pin))
+        # 一条 getAllPinFunctions 命令取回所有引脚的当前功能，应答为 ok 后按 pin_ranges 顺序每个引脚一位数字
+        if index not in self.devices or self.devices[index] is None:
+            self.loop_data_text.append("Serial port not connected.")
+            return
+
+        def handle_response(response):
+            status, payload = parse_reply(response)
+            if status != Response_map['ok'] or len(payload) < len(pin_ranges):
+                # 旧固件不支持该命令时逐个引脚查询
+                for pin in pin_ranges:
+                    self.send_get_current_function(index, str(pin))
+                return
+            for pin, digit in zip(pin_ranges, payload):
+                self.pin_labels[str(pin)].setText(f'引脚 {pin}: {function_name(digit)}')
+        self.send_request(index, 'getAllPinFunctions', (), handle_response)
 
     def closeEvent(self, event):
-        for index in self.timers:
-            self.timers[index].stop()
-        for index in self.ser_connections:
-            if self.ser_connections[index] is not None:
-                self.ser_connections[index].close()
+        self.opening.clear()
+        for device in self.devices.values():
+            if device is not None:
+                device.close()
+        if self.io_pool is not None:
+            self.io_pool.close()
         print("所有串口已关闭。")
         event.accept()
 
@@ -625,13 +889,57 @@ class PlotCanvas(FigureCanvas):
 
 # 窗口类
 class ChartWindow(QWidget):
-    def __init__(self, canvas):
+    # 显示实时图表；给出采集文件时可以勾选“回看全部记录”，在另一块画布上用工具栏缩放、平移整段记录，
+    # 每次只按当前范围从采集文件的摘要中读取约画布宽度的点（见 CaptureView）
+    def __init__(self, canvas, capture_path=None):
         super().__init__()
         self.setWindowTitle('串口图表')
+        self.canvas = canvas
+        self.capture_path = capture_path
+        self.capture_view = None
         layout = QVBoxLayout()
         layout.addWidget(canvas)
+        if capture_path is not None:
+            self.review_canvas = FigureCanvas(Figure(figsize=(5, 4), dpi=100))
+            self.review_toolbar = NavigationToolbar(self.review_canvas, self)
+            self.review_canvas.hide()
+            self.review_toolbar.hide()
+            self.review_check = QCheckBox('回看全部记录')
+            self.review_check.toggled.connect(self.set_review)
+            layout.addWidget(self.review_toolbar)
+            layout.addWidget(self.review_canvas)
+            layout.addWidget(self.review_check)
         self.setLayout(layout)
 
+    @property
+    def reviewing(self):
+        return self.capture_view is not None
+
+    def set_review(self, review):
+        if review == self.reviewing:
+            return
+        if review:
+            # 每次打开时重新读取索引，包含到目前为止已写盘的数据
+            try:
+                reader = CaptureReader(self.capture_path)
+            except (OSError, ValueError) as e:
+                self.review_check.setChecked(False)
+                self.setWindowTitle(f'无法打开采集文件: {e}')
+                return
+            figure = self.review_canvas.figure
+            figure.clear()
+            self.capture_view = CaptureView(self.review_canvas, figure.add_subplot(111), reader)
+            self.canvas.hide()
+            self.review_toolbar.show()
+            self.review_canvas.show()
+            self.capture_view.show_all()
+        else:
+            self.capture_view.close()
+            self.capture_view = None
+            self.review_toolbar.hide()
+            self.review_canvas.hide()
+            self.canvas.show()
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     communicator = ArduinoCommunicator()
@@ -1,63 +1,30 @@
 import sys
 import serial
-import time
-import csv
+from collections import deque
+import numpy as np
 from PyQt5.QtWidgets import QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QTextEdit, QPushButton, QFileDialog
 from PyQt5.QtGui import QFont
-from PyQt5.QtCore import QTimer
+from PyQt5.QtCore import pyqtSignal
 from serial.tools import list_ports
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-
-# 配置串口参数
-BAUDRATE = 115200
-TIMEOUT = 1
-
-# 定义命令类型及其枚举值
-command_map = {
-    'functionMap': 0,
-    'getPinFunction': 1,
-    'getcurrentPinFunction': 2,
-    'setPinFunction': 3,
-    'startLoop': 4,
-    'stopLoop': 5
-}
-
-# 定义响应映射
-Response_map = {
-    'ok': 'ok',
-    'error': 'error'
-}
-
-# 定义功能名称及其枚举值
-function_map = {
-    'disable': 0,
-    'readDigital': 1,
-    'writeDigital': 2,
-    'readAnalog': 3,
-    'writeAnalog': 4
-}
-
-# 假设引脚范围，可根据实际情况调整
-pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
-
-# 定义每个引脚支持的功能
-pin_functions = {
-    4: ['readDigital', 'writeDigital'],
-    5: ['readDigital', 'writeDigital', 'writeAnalog'],
-    6: ['readDigital', 'writeDigital', 'writeAnalog'],
-    7: ['readDigital', 'writeDigital'],
-    8: ['readDigital', 'writeDigital'],
-    9: ['readDigital', 'writeDigital', 'writeAnalog'],
-    10: ['readDigital', 'writeDigital', 'writeAnalog'],
-    11: ['readDigital', 'writeDigital', 'writeAnalog'],
-    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A5': ['readDigital', 'writeDigital', 'readAnalog']
-}
+from command_client import RESPONSE_OK, parse_reply
+from csv_export import export_in_background
+from device import DEFAULT_SAMPLE_PERIOD_MS, TestBoxDevice
+from live_plot import LivePlot
+from log_view import LogView
+from protocol import (BAUDRATE, TIMEOUT, command_map, command_options, function_map, function_name, pin_functions,
+                      pin_number, pin_ranges, sample_rate_map, stream_mode_map)
+from render_scheduler import RenderScheduler
+from ring_buffer import RingBuffer
+
+# 二进制流模式下每帧打包的采样数
+SAMPLES_PER_FRAME = 4
+# 每个引脚保留的历史时长，点数随采样率换算；最快模式下无法换算时使用 MAX_HISTORY_POINTS
+HISTORY_SECONDS = 600
+MAX_HISTORY_POINTS = 200000
+# 图表最高重绘帧率，数据到达时只标记需要重绘
+RENDER_FPS = 30
 
 class PlotCanvas(FigureCanvas):
     def __init__(self, parent=None, width=5, height=4, dpi=100):
@@ -66,18 +33,29 @@ class PlotCanvas(FigureCanvas):
         super(PlotCanvas, self).__init__(fig)
 
 class ArduinoCommunicator(QWidget):
+    # 命令应答可能在写线程中完成（超时、写入失败），经信号回到界面线程再调用 handler；
+    # 读取线程解析好的数据行、采样和读取错误同样经信号交给界面线程
+    command_reply = pyqtSignal(object, object)
+    lines_received = pyqtSignal(int, list)
+    samples_received = pyqtSignal(int, dict)
+    read_error = pyqtSignal(int, str)
+
     def __init__(self):
         super().__init__()
-        self.ser = None
-        self.loop_data = []
-        self.plot_data = {str(pin): [] for pin in pin_ranges}
+        self.device = None  # TestBoxDevice：串口、读取线程和带序号的命令通道
+        # setSampleRate 协商成功后以固件返回的实际周期为准
+        self.sample_period_ms = DEFAULT_SAMPLE_PERIOD_MS
+        self.loop_data = deque(maxlen=self.history_limit())
+        # 每个引脚一个环形缓冲区，横轴为采样时间（秒）或采样序号
+        self.plot_data = {str(pin): RingBuffer(self.history_limit()) for pin in pin_ranges}
         self.pin_config = {str(pin): 'disable' for pin in pin_ranges}
         self.is_looping = False
-        self.start_time = None
         self.reading_pins = []
+        self.command_reply.connect(lambda handler, response: handler(response))
+        self.lines_received.connect(self.read_serial_data)
+        self.samples_received.connect(self.read_samples)
+        self.read_error.connect(self.on_read_error)
         self.init_ui()
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.read_serial_data)
 
     def init_ui(self):
         self.setWindowTitle('Arduino 命令发送器')
@@ -87,6 +65,7 @@ class ArduinoCommunicator(QWidget):
         self.port_label = QLabel('选择串口:')
         self.port_combo = QComboBox()
         self.port_combo.addItems(self.get_available_ports())
+        self.port_combo.setEditable(True)  # 允许手动输入串口路径，例如 device_simulator.py 打印的伪终端或 replay:// 回放地址
         self.refresh_button = QPushButton('刷新串口')
         self.refresh_button.clicked.connect(self.on_refresh_ports)
         self.connect_button = QPushButton('连接')
@@ -147,13 +126,14 @@ class ArduinoCommunicator(QWidget):
 
         # 循环数据显示部分
         self.loop_data_label = QLabel('循环数据:')
-        self.loop_data_text = QTextEdit()
-        self.loop_data_text.setReadOnly(True)
+        self.loop_data_text = LogView()
         self.loop_data_text.hide()
         self.loop_data_label.hide()
 
         # 图形显示部分
         self.plot_canvas = PlotCanvas(self, width=5, height=4, dpi=100)
+        self.live_plot = LivePlot(self.plot_canvas, self.plot_canvas.axes)
+        self.render_scheduler = RenderScheduler(RENDER_FPS, self)
         self.plot_canvas.hide()
 
         # 导出CSV按钮
@@ -185,7 +165,7 @@ class ArduinoCommunicator(QWidget):
         self.port_combo.addItems(ports)
 
     def on_connect(self):
-        if self.ser is not None:
+        if self.device is not None:
             self.response_text.append("已经连接")
             return
         selected_port = self.port_combo.currentText()
@@ -193,7 +173,12 @@ class ArduinoCommunicator(QWidget):
             self.response_text.append("请选择串口")
             return
         try:
-            self.ser = serial.Serial(selected_port, BAUDRATE, timeout=TIMEOUT)
+            # 连接后读取线程就开始读取，命令应答由命令通道按序号转交，其余数据行和采样经信号交给界面线程
+            device = TestBoxDevice(selected_port, baudrate=BAUDRATE, timeout=TIMEOUT,
+                                   sample_period_ms=self.sample_period_ms)
+            device.subscribe(self.lines_received.emit, self.samples_received.emit,
+                             lambda index, e: self.read_error.emit(index, str(e)))
+            self.device = device.open()
             self.response_text.append(f"已连接到 {selected_port}")
             self.connect_button.setEnabled(False)
             self.disconnect_button.setEnabled(True)
@@ -202,22 +187,22 @@ class ArduinoCommunicator(QWidget):
             self.response_text.append(f"错误：无法打开串口 {selected_port}。{e}")
 
     def on_disconnect(self):
-        if self.ser is not None:
-            self.ser.close()
-            self.ser = None
+        if self.device is not None:
+            # 停止读取线程和命令通道，关闭串口
+            self.device.close()
+            self.device = None
             self.response_text.append("串口已断开。")
             self.connect_button.setEnabled(True)
             self.disconnect_button.setEnabled(False)
             if self.is_looping:
                 self.is_looping = False
-                self.timer.stop()
                 self.loop_data_label.hide()
                 self.loop_data_text.hide()
                 self.plot_canvas.hide()
                 self.export_button.hide()
 
     def send_command(self):
-        if self.ser is None:
+        if self.device is None:
             self.response_text.append("未连接串口")
             return
         command = self.command_combo.currentText()
@@ -228,168 +213,238 @@ class ArduinoCommunicator(QWidget):
         elif command == 'functionMap':
             self.send_function_map()
         elif command == 'getPinFunction':
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 14
-            else:
-                pin_num = int(selected_pin)
+            pin_num = pin_number(selected_pin)
             self.send_get_pin_function(pin_num)
         elif command == 'setPinFunction':
             selected_function = self.function_combo.currentText()
             function_num = function_map[selected_function]
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 14
-            else:
-                pin_num = int(selected_pin)
+            pin_num = pin_number(selected_pin)
             self.send_set_pin_function(pin_num, function_num)
             self.pin_config[selected_pin] = selected_function
         elif command == 'startLoop':
             self.send_general_command(command)
         elif command == 'stopLoop':
             self.send_general_command(command)
+        elif command == 'setStreamMode':
+            self.send_set_stream_mode(stream_mode_map[self.function_combo.currentText()])
+        elif command == 'setSampleRate':
+            self.send_set_sample_rate(sample_rate_map[self.function_combo.currentText()])
+        elif command == 'getAllPinFunctions':
+            self.get_all_current_functions()
+
+    def send_request(self, command, args, handler):
+        # 命令进入写队列后立即返回 Future，不阻塞界面；应答经信号在界面线程交给 handler，超时或写入失败时为 None
+        try:
+            return self.device.send(command, args, lambda response: self.command_reply.emit(handler, response))
+        except (AttributeError, RuntimeError) as e:
+            self.response_text.append(f"发送命令 {command} 失败: {e}")
 
     def send_function_map(self):
-        if self.ser is None:
+        if self.device is None:
             self.response_text.append("未连接串口")
             return
-        cmd_bytes = bytes([command_map['functionMap']])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"响应: {response}")
-        else:
-            self.response_text.append("未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"响应: {response}")
+            else:
+                self.response_text.append("未收到响应。")
+        self.send_request('functionMap', (), handle_response)
 
     def send_get_pin_function(self, pin):
-        if self.ser is None:
+        if self.device is None:
             self.response_text.append("未连接串口")
             return
-        cmd_bytes = bytes([command_map['getPinFunction'], pin])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"引脚 {pin} 功能响应: {response}")
-        else:
-            self.response_text.append(f"引脚 {pin} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"引脚 {pin} 功能响应: {response}")
+            else:
+                self.response_text.append(f"引脚 {pin} 未收到响应。")
+        self.send_request('getPinFunction', (pin,), handle_response)
 
     def send_set_pin_function(self, pin, function):
-        if self.ser is None:
+        if self.device is None:
             self.response_text.append("未连接串口")
             return
-        cmd_bytes = bytes([command_map['setPinFunction'], pin, function])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"设置引脚 {pin} 功能为 {function} 响应: {response}")
-        else:
-            self.response_text.append(f"设置引脚 {pin} 功能为 {function} 未收到响应。")
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"设置引脚 {pin} 功能为 {function} 响应: {response}")
+            else:
+                self.response_text.append(f"设置引脚 {pin} 功能为 {function} 未收到响应。")
+        self.send_request('setPinFunction', (pin, function), handle_response)
+
+    def send_set_stream_mode(self, mode):
+        if self.device is None:
+            self.response_text.append("未连接串口")
+            return
+
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"设置传输格式为 {mode} 响应: {response}")
+            else:
+                self.response_text.append(f"设置传输格式为 {mode} 未收到响应。")
+        self.send_request('setStreamMode', (mode, SAMPLES_PER_FRAME), handle_response)
+
+    def send_set_sample_rate(self, period_ms):
+        if self.device is None:
+            self.response_text.append("未连接串口")
+            return
+
+        def handle_response(response):
+            if response:
+                # 响应为 ok 枚举值后接实际采样周期，固件按系统节拍取整
+                status, payload = parse_reply(response)
+                try:
+                    self.sample_period_ms = int(payload)
+                except ValueError:
+                    self.sample_period_ms = period_ms
+                self.resize_history()
+                self.response_text.append(f"设置采样周期为 {period_ms} ms 响应: {response}，实际周期 {self.sample_period_ms} ms")
+                if self.device is not None:
+                    self.device.sample_period_ms = self.sample_period_ms
+            else:
+                self.response_text.append(f"设置采样周期为 {period_ms} ms 未收到响应。")
+        self.send_request('setSampleRate', (period_ms & 0xFF, period_ms >> 8), handle_response)
+
+    def history_limit(self):
+        if self.sample_period_ms > 0:
+            return max(1, HISTORY_SECONDS * 1000 // self.sample_period_ms)
+        return MAX_HISTORY_POINTS
+
+    def resize_history(self):
+        # 采样率改变后按 HISTORY_SECONDS 重新换算各缓冲区的容量，保留最近的数据
+        limit = self.history_limit()
+        if self.loop_data.maxlen != limit:
+            self.loop_data = deque(self.loop_data, maxlen=limit)
+        for ring in self.plot_data.values():
+            ring.resize(limit)
+
+    def sample_times(self, start, count):
+        # 第 start 个起 count 个采样的横轴位置：按协商后的采样周期换算为秒，最快模式下周期未知，用采样序号
+        positions = np.arange(start, start + count, dtype=np.float64)
+        if self.sample_period_ms > 0:
+            positions *= self.sample_period_ms / 1000.0
+        return positions
 
     def send_get_current_function(self, pin):
-        if self.ser is None:
+        if self.device is None:
             self.response_text.append("Serial port not connected.")
             return
-        try:
-            if isinstance(pin, str) and pin.startswith('A'):
-                pin_num = ord(pin[1]) - ord('0') + 14
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
-            else:
-                pin_num = int(pin)
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
+        if pin not in self.pin_labels:
+            print(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
+            self.response_text.append(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
+            return
+        pin_num = pin_number(pin)
 
-            self.ser.write(cmd_bytes + b'\r\n')
-            time.sleep(0.1)
-            response = self.ser.readline().decode().strip()
+        def handle_response(response):
             if response:
                 self.pin_labels[pin].setText(f'引脚 {pin}: {response}')
             else:
                 self.pin_labels[pin].setText(f'引脚 {pin}: 未获取到功能')
-        except KeyError:
-            print(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
-            self.response_text.append(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
+        self.send_request('getcurrentPinFunction', (pin_num,), handle_response)
+
+    def get_all_current_functions(self):
+        # 一条 getAllPinFunctions 命令取回所有引脚的当前功能，应答为 ok 后按 pin_ranges 顺序每个引脚一位数字
+        if self.device is None:
+            self.response_text.append("未连接串口")
+            return
+
+        def handle_response(response):
+            if response is None:
+                self.response_text.append("getAllPinFunctions 未收到响应。")
+                return
+            status, payload = parse_reply(response)
+            if status != RESPONSE_OK or len(payload) < len(pin_ranges):
+                # 旧固件不认识该命令时逐个引脚查询
+                for pin in pin_ranges:
+                    self.send_get_current_function(str(pin))
+                return
+            for pin, digit in zip(pin_ranges, payload):
+                self.pin_labels[str(pin)].setText(f'引脚 {pin}: {function_name(digit)}')
+        self.send_request('getAllPinFunctions', (), handle_response)
 
     def send_general_command(self, command):
-        if self.ser is None:
+        if self.device is None:
             self.response_text.append("未连接串口")
             return
-        cmd_bytes = bytes([command_map[command]])
-        self.ser.write(cmd_bytes + b'\r\n')
-        time.sleep(0.1)
-        # 修正：添加括号
-        response = self.ser.readline().decode().strip()
-        if response:
-            self.response_text.append(f"响应: {response}")
-            if command == 'startLoop':
-                self.is_looping = True
-                self.start_time = time.time()
-                self.loop_data = []
-                self.loop_data_label.show()
-                self.loop_data_text.show()
-                self.plot_canvas.show()
-                self.export_button.show()
-                self.timer.start(100)  # 每100毫秒读取一次数据
-            elif command == 'stopLoop':
-                self.is_looping = False
-                self.timer.stop()
-        else:
-            self.response_text.append("未收到响应。")
 
-    def read_serial_data(self):
-        if self.ser is None or not self.is_looping:
+        def handle_response(response):
+            if response:
+                self.response_text.append(f"响应: {response}")
+                if command == 'startLoop':
+                    self.is_looping = True
+                    self.loop_data = deque(maxlen=self.history_limit())
+                    # 每次循环重新记录，导出的时间戳从这次循环的第一个采样开始换算
+                    for ring in self.plot_data.values():
+                        ring.clear()
+                    self.loop_data_label.show()
+                    self.loop_data_text.show()
+                    self.plot_canvas.show()
+                    self.export_button.show()
+                elif command == 'stopLoop':
+                    self.is_looping = False
+            else:
+                self.response_text.append("未收到响应。")
+        self.send_request(command, (), handle_response)
+
+    def read_serial_data(self, index, lines):
+        # 由读取线程通过信号调用（界面线程中执行），带序号的命令应答已由命令通道取走，未开始循环时其余数据丢弃
+        if self.device is None or not self.is_looping:
             return
-        try:
-            while self.ser.in_waiting:
-                line = self.ser.readline().decode().strip()
-                if line:
-                    self.loop_data.append(line)
-                    self.loop_data_text.append(line)
-                    # 解析数据并更新绘图
-                    try:
-                        parts = line.split(',')
-                        if len(parts) >= 2:
-                            pin = parts[0]
-                            value = float(parts[1])
-                            if pin in self.plot_data:
-                                self.plot_data[pin].append(value)
-                                self.update_plot()
-                    except ValueError:
-                        pass
-        except serial.SerialException as e:
-            self.response_text.append(f"读取串口数据时出错: {e}")
+        self.loop_data.extend(lines)
+        # 日志先排队，每帧成批显示一次
+        self.loop_data_text.extend(lines)
+        self.render_scheduler.mark_dirty('log', self.loop_data_text.flush)
+        for line in lines:
+            # 解析 "引脚,数值" 数据并更新绘图
+            try:
+                parts = line.split(',')
+                if len(parts) >= 2:
+                    pin = parts[0]
+                    value = float(parts[1])
+                    if pin in self.plot_data:
+                        ring = self.plot_data[pin]
+                        ring.append(self.sample_times(ring.total, 1)[0], value)
+                        self.render_scheduler.mark_dirty('plot', self.update_plot)
+            except ValueError:
+                pass
+
+    def read_samples(self, index, samples):
+        # 二进制帧已在读取线程中按引脚拆好，时间戳为帧中的时间（秒）；ASCII 数值行（'raw'）只进日志
+        if self.device is None or not self.is_looping:
+            return
+        for pin, (times, values) in samples.items():
+            if pin == 'raw':
+                continue
+            if pin in self.plot_data:
+                self.plot_data[pin].extend(times, values)
+            lines = [f"{pin},{value}" for value in values.tolist()]
+            self.loop_data.extend(lines)
+            self.loop_data_text.extend(lines)
+        self.render_scheduler.mark_dirty('log', self.loop_data_text.flush)
+        self.render_scheduler.mark_dirty('plot', self.update_plot)
+
+    def on_read_error(self, index, error):
+        # 读取线程出错后已经停止，断开连接，可以重新连接
+        self.response_text.append(f"读取串口数据时出错: {error}")
+        self.on_disconnect()
 
     def update_plot(self):
-        self.plot_canvas.axes.clear()
-        for pin, data in self.plot_data.items():
-            if data:
-                time_points = [i * 0.1 for i in range(len(data))]  # 假设采样间隔为100毫秒
-                self.plot_canvas.axes.plot(time_points, data, label=f'Pin {pin}')
-        self.plot_canvas.axes.legend()
-        self.plot_canvas.draw()
+        # 环形缓冲区按画布宽度抽取后只更新曲线数据；横轴在写入时已换算为秒（最快模式下的 ASCII 数据为采样序号）
+        self.live_plot.update_rings({f'Pin {pin}': ring for pin, ring in self.plot_data.items() if len(ring)},
+                                    legend=True)
 
     def export_to_csv(self):
-        if not self.loop_data:
+        # 时间戳为每个采样的 Unix 时间；在界面线程中只复制环形缓冲区，格式化和写盘在后台线程中分块进行
+        series = [(pin, *ring.snapshot()) for pin, ring in self.plot_data.items() if len(ring)]
+        if not series:
             self.response_text.append("没有可导出的数据。")
             return
         file_path, _ = QFileDialog.getSaveFileName(self, "导出数据为CSV", "", "CSV Files (*.csv)")
         if file_path:
-            try:
-                with open(file_path, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(['时间戳', '引脚', '数值'])
-                    for line in self.loop_data:
-                        try:
-                            parts = line.split(',')
-                            if len(parts) >= 2:
-                                pin = parts[0]
-                                value = parts[1]
-                                timestamp = time.time() - self.start_time if self.start_time else 0
-                                writer.writerow([timestamp, pin, value])
-                        except ValueError:
-                            pass
-                self.response_text.append(f"数据已导出到 {file_path}")
-            except Exception as e:
-                self.response_text.append(f"导出数据时出错: {e}")
+            export_in_background(self, file_path, ['时间戳', '引脚', '数值'], series, self.response_text.append)
 
     def update_function_combo_visibility(self):
         command = self.command_combo.currentText()
@@ -397,11 +452,19 @@ class ArduinoCommunicator(QWidget):
             self.function_label.show()
             self.function_combo.show()
             self.update_function_options()
+        elif command in command_options:
+            self.function_label.show()
+            self.function_combo.show()
+            self.function_combo.clear()
+            self.function_combo.addItems(list(command_options[command].keys()))
         else:
             self.function_label.hide()
             self.function_combo.hide()
 
     def update_function_options(self):
+        # setStreamMode、setSampleRate 的选项与引脚无关
+        if self.command_combo.currentText() in command_options:
+            return
         selected_pin = self.pin_combo.currentText()
         if isinstance(selected_pin, str) and selected_pin.startswith('A'):
             pin = selected_pin
@@ -413,7 +476,7 @@ class ArduinoCommunicator(QWidget):
 
     def get_pin_functions(self):
         for pin in pin_ranges:
-            self.send_get_pin_function(pin if not isinstance(pin, str) else ord(pin[1]) - ord('0') + 14)
+            self.send_get_pin_function(pin_number(pin))
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
@@ -0,0 +1,182 @@
+from collections import namedtuple
+
+import numpy as np
+
+# 二进制采样帧，与 TestBox/include/Configuration.h 以及 TestBox/README.md 中的定义一致（小端）：
+# 0xA5 0x5A <len: u8> <seq: u16> <time_ms: u32> <dt_ms: u16> <pin_mask: u16> <value: u16>... <checksum: u8>
+FRAME_SYNC = b'\xa5\x5a'
+FRAME_HEADER_SIZE = 13
+FRAME_MAX_VALUES = 64
+
+# setStreamMode 命令的模式参数
+STREAM_MODE_ASCII = 0
+STREAM_MODE_BINARY = 1
+
+# pin_mask 的第 i 位对应固件 setup() 中第 i 个 NewPinConfiguration
+FRAME_PIN_ORDER = [str(pin) for pin in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
+
+SampleFrames = namedtuple('SampleFrames', ['seq', 'time_ms', 'dt_ms', 'pin_mask', 'values'])
+
+_frame_dtypes = {}
+
+
+def frame_dtype(value_count):
+    # 每种帧长度对应一个结构化 dtype，整段同长度的帧可以用一次 np.frombuffer 解出
+    if value_count not in _frame_dtypes:
+        _frame_dtypes[value_count] = np.dtype([
+            ('sync', 'u1', (2,)),
+            ('length', 'u1'),
+            ('seq', '<u2'),
+            ('time_ms', '<u4'),
+            ('dt_ms', '<u2'),
+            ('pin_mask', '<u2'),
+            ('values', '<u2', (value_count,)),
+            ('checksum', 'u1'),
+        ])
+    return _frame_dtypes[value_count]
+
+
+def encode_frame(seq, time_ms, dt_ms, pin_mask, values):
+    values = np.asarray(values, dtype='<u2').ravel()
+    if not 0 < len(values) <= FRAME_MAX_VALUES:
+        raise ValueError(f'每帧数值个数必须在 1..{FRAME_MAX_VALUES} 之间: {len(values)}')
+    record = np.zeros(1, dtype=frame_dtype(len(values)))
+    record['sync'] = np.frombuffer(FRAME_SYNC, dtype=np.uint8)
+    record['length'] = FRAME_HEADER_SIZE - 3 + 2 * len(values)
+    record['seq'] = seq & 0xFFFF
+    record['time_ms'] = time_ms & 0xFFFFFFFF
+    record['dt_ms'] = dt_ms
+    record['pin_mask'] = pin_mask
+    record['values'] = values
+    raw = record.view(np.uint8)
+    raw[-1] = raw[2:-1].sum(dtype=np.uint32) & 0xFF
+    return raw.tobytes()
+
+
+def encode_frames(seq, time_ms, dt_ms, pin_mask, values):
+    # 一次编码多帧数值个数相同的帧：values 为 [帧, 数值] 矩阵，其余参数为每帧一个的数组或标量
+    values = np.asarray(values, dtype='<u2')
+    count, value_count = values.shape
+    if not 0 < value_count <= FRAME_MAX_VALUES:
+        raise ValueError(f'每帧数值个数必须在 1..{FRAME_MAX_VALUES} 之间: {value_count}')
+    records = np.zeros(count, dtype=frame_dtype(value_count))
+    records['sync'] = np.frombuffer(FRAME_SYNC, dtype=np.uint8)
+    records['length'] = FRAME_HEADER_SIZE - 3 + 2 * value_count
+    records['seq'] = np.asarray(seq) & 0xFFFF
+    records['time_ms'] = np.asarray(time_ms, dtype=np.int64) & 0xFFFFFFFF
+    records['dt_ms'] = dt_ms
+    records['pin_mask'] = pin_mask
+    records['values'] = values
+    raw = records.view(np.uint8).reshape(count, -1)
+    raw[:, -1] = raw[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF
+    return raw.tobytes()
+
+
+class FrameDecoder:
+    # 增量解码：帧可以跨多次 feed 拆开到达；帧之间的字节（固件的调试文本、ASCII 模式的数据行）
+    # 原样作为文本返回，交给 LineFramer 处理，因此同一个串口上两种模式可以混用。
+    def __init__(self):
+        self._buffer = b''
+        self.last_seq = None
+        self.frames = 0
+        self.dropped_frames = 0
+        self.checksum_errors = 0
+
+    def feed(self, data):
+        # 返回 (SampleFrames 列表, 帧以外的文本字节)
+        buffer = self._buffer + data if self._buffer else data
+        frames, text = [], []
+        pos = 0
+        while True:
+            start = buffer.find(FRAME_SYNC, pos)
+            if start < 0:
+                # 末尾单独的 0xA5 可能是下一个同步头的前半部分（已解码的帧的最后一个字节除外）
+                end = len(buffer) - 1 if pos < len(buffer) and buffer.endswith(FRAME_SYNC[:1]) else len(buffer)
+                text.append(buffer[pos:end])
+                pos = end
+                break
+            text.append(buffer[pos:start])
+            if start + 3 > len(buffer):
+                pos = start
+                break
+            length = buffer[start + 2]
+            value_count, odd = divmod(length - (FRAME_HEADER_SIZE - 3), 2)
+            if odd or not 0 < value_count <= FRAME_MAX_VALUES:
+                # 不是合法的帧头，同步字节按普通文本处理
+                text.append(buffer[start:start + 1])
+                pos = start + 1
+                continue
+            size = length + 4
+            count = (len(buffer) - start) // size
+            if count == 0:
+                pos = start
+                break
+            # 一次检查这一段里所有连续、等长的帧
+            run = np.frombuffer(buffer, dtype=np.uint8, count=count * size, offset=start).reshape(count, size)
+            aligned = (run[:, 0] == FRAME_SYNC[0]) & (run[:, 1] == FRAME_SYNC[1]) & (run[:, 2] == length)
+            if not aligned.all():
+                count = int(np.argmin(aligned))
+                run = run[:count]
+            checksum_ok = (run[:, 2:-1].sum(axis=1, dtype=np.uint32) & 0xFF) == run[:, -1]
+            if not checksum_ok[0]:
+                # 校验失败时长度字节也不可信（例如帧被截断），只跳过同步头重新搜索
+                self.checksum_errors += 1
+                pos = start + 2
+                continue
+            if not checksum_ok.all():
+                count = int(np.argmin(checksum_ok))
+            records = np.frombuffer(buffer, dtype=frame_dtype(value_count), count=count, offset=start)
+            frames.append(self._to_frames(records))
+            pos = start + count * size
+        self._buffer = buffer[pos:]
+        return frames, b''.join(text)
+
+    def _to_frames(self, records):
+        seq = records['seq']
+        if self.last_seq is not None:
+            previous = np.concatenate(([self.last_seq], seq[:-1])).astype(np.int64)
+        else:
+            previous = np.concatenate(([int(seq[0]) - 1], seq[:-1])).astype(np.int64)
+        self.dropped_frames += int(((seq.astype(np.int64) - previous - 1) % 65536).sum())
+        self.last_seq = int(seq[-1])
+        self.frames += len(records)
+        return SampleFrames(seq, records['time_ms'], records['dt_ms'], records['pin_mask'], records['values'])
+
+
+def pin_count(pin_mask):
+    return bin(int(pin_mask)).count('1')
+
+
+def mask_pins(pin_mask, pin_order=FRAME_PIN_ORDER):
+    return [pin for bit, pin in enumerate(pin_order) if int(pin_mask) >> bit & 1]
+
+
+def frames_to_samples(frames):
+    # 把帧展开为逐采样的 (pin_mask, 时间戳 ms, 数值矩阵[采样, 引脚])，同一 pin_mask 的帧一起处理
+    for frame in frames:
+        for pin_mask in np.unique(frame.pin_mask):
+            selected = frame.pin_mask == pin_mask
+            channels = pin_count(pin_mask)
+            if channels == 0:
+                continue
+            values = frame.values[selected]
+            samples = values.shape[1] // channels
+            offsets = np.arange(samples, dtype=np.float64)
+            times = frame.time_ms[selected, None] + offsets * frame.dt_ms[selected, None]
+            yield int(pin_mask), times.ravel(), values[:, :samples * channels].reshape(-1, channels)
+
+
+def frames_to_columns(frames, pin_order=FRAME_PIN_ORDER):
+    # 按引脚拆成 {引脚: (时间戳 ms, 数值)}；每种 pin_mask 只做一次 reshape，各列是切片视图
+    parts = {}
+    for pin_mask, times, values in frames_to_samples(frames):
+        for column, pin in enumerate(mask_pins(pin_mask, pin_order)):
+            parts.setdefault(pin, []).append((times, values[:, column]))
+    columns = {}
+    for pin, chunks in parts.items():
+        if len(chunks) == 1:
+            columns[pin] = chunks[0]
+        else:
+            columns[pin] = (np.concatenate([times for times, _ in chunks]),
+                            np.concatenate([values for _, values in chunks]))
+    return columns
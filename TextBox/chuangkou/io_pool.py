@@ -0,0 +1,179 @@
+import selectors
+import socket
+import threading
+import time
+
+import serial
+
+# 串口较多时（测试架上 16~32 块板子）不再每个串口一个读取线程加一个命令写线程，
+# 由固定数量的工作线程轮流服务：每个工作线程用 selectors 等待它负责的串口可读，一次读空已到达的字节交给
+# 该串口的 SerialReader.feed 解析，同时写出命令通道中排队的命令、检查命令超时。
+# 线程数与串口数无关，空闲的串口不占 CPU；没有文件描述符的串口（Windows）每 POLL_INTERVAL 秒查询一次 in_waiting。
+# 回调在工作线程中调用，同一个工作线程上的串口共用它，回调应尽快返回（界面经 Qt 信号转交）。
+
+# 默认工作线程数；解析受 GIL 限制，线程再多也不会更快，两个线程可以让一个串口的回调不拖住其他串口太久
+IO_WORKERS = 2
+# 无法 select 的串口的查询间隔（秒）
+POLL_INTERVAL = 0.002
+# 没有数据时最长的等待（秒），到时检查命令超时和不完整的行
+IDLE_INTERVAL = 0.05
+
+READ_ERRORS = (serial.SerialException, OSError, TypeError, AttributeError)
+
+
+class IOWorker(threading.Thread):
+    # 一个工作线程及其负责的串口。增删串口只是登记请求再唤醒线程，由线程自己修改 selector
+    def __init__(self, number):
+        super().__init__(name=f'IOWorker-{number}', daemon=True)
+        self.selector = selectors.DefaultSelector()
+        self.readers = {}  # SerialReader -> 最后一次收到数据的时间
+        self.polled = set()  # 无法 select、需要查询 in_waiting 的串口
+        self.load = 0  # 已分配（含尚未生效）的串口数
+        self._changes = []
+        self._lock = threading.Lock()
+        self._stopping = False
+        # 用一对本地 socket 唤醒 select，Windows 上 select 只支持 socket
+        self._wake_recv, self._wake_send = socket.socketpair()
+        self._wake_recv.setblocking(False)
+        self._wake_send.setblocking(False)
+        self.selector.register(self._wake_recv, selectors.EVENT_READ, None)
+
+    def wake(self):
+        try:
+            self._wake_send.send(b'\0')
+        except OSError:
+            # 缓冲区已满说明线程已经会被唤醒
+            pass
+
+    def request(self, action, reader=None):
+        # 登记增删请求，返回请求生效后置位的 Event
+        done = threading.Event()
+        with self._lock:
+            self._changes.append((action, reader, done))
+        self.wake()
+        return done
+
+    def run(self):
+        while self._apply_changes():
+            timeout = POLL_INTERVAL if self.polled else IDLE_INTERVAL
+            ready = set()
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self._drain_wake()
+                else:
+                    ready.add(key.data)
+            now = time.monotonic()
+            for reader in list(self.readers):
+                self._service(reader, reader in ready, now)
+        self.selector.close()
+        self._wake_recv.close()
+        self._wake_send.close()
+
+    def _drain_wake(self):
+        try:
+            while self._wake_recv.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def _apply_changes(self):
+        with self._lock:
+            changes, self._changes = self._changes, []
+        running = True
+        for action, reader, done in changes:
+            if action == 'add':
+                self.readers[reader] = time.monotonic()
+                try:
+                    self.selector.register(reader.ser.fileno(), selectors.EVENT_READ, reader)
+                except (AttributeError, OSError, ValueError):
+                    self.polled.add(reader)
+            elif action == 'remove':
+                self._drop(reader)
+            else:
+                running = False
+            done.set()
+        return running
+
+    def _drop(self, reader):
+        if self.readers.pop(reader, None) is None:
+            return
+        if reader in self.polled:
+            self.polled.discard(reader)
+        else:
+            try:
+                self.selector.unregister(reader.ser.fileno())
+            except (KeyError, AttributeError, OSError, ValueError):
+                pass
+
+    def _service(self, reader, ready, now):
+        client = reader.command_client
+        if client is not None:
+            client.flush_writes()
+            client.expire()
+        ser = reader.ser
+        try:
+            if ready:
+                # 可读但 in_waiting 为 0 说明串口已断开，read 会抛出异常
+                data = ser.read(ser.in_waiting or 1)
+            elif reader in self.polled:
+                waiting = ser.in_waiting
+                data = ser.read(waiting) if waiting else b''
+            else:
+                data = b''
+        except READ_ERRORS as e:
+            self._drop(reader)
+            reader.fail(e)
+            return
+        try:
+            if data:
+                self.readers[reader] = now
+                reader.feed(data)
+            elif reader.framer.pending and ser.timeout is not None and now - self.readers[reader] >= ser.timeout:
+                # 读超时仍有残留的不完整行，与读取线程的行为一致
+                reader.feed(b'')
+        except Exception as e:
+            # 一个串口的回调出错不能让同一线程上的其他串口停下来
+            self._drop(reader)
+            reader.fail(e)
+
+
+class IOPool:
+    # 固定数量的 IOWorker，新串口分给当前负责串口最少的线程；线程在第一次 add 时启动
+    def __init__(self, workers=IO_WORKERS):
+        self.workers = [IOWorker(number) for number in range(max(1, workers))]
+        self._assigned = {}
+        self._lock = threading.Lock()
+
+    def add(self, reader):
+        # reader 为未启动的 SerialReader，其命令通道应以 writer=False 创建
+        with self._lock:
+            worker = min(self.workers, key=lambda w: w.load)
+            worker.load += 1
+            self._assigned[reader] = worker
+            if not worker.is_alive():
+                worker.start()
+        if reader.command_client is not None:
+            reader.command_client.on_submit = worker.wake
+        worker.request('add', reader)
+
+    def remove(self, reader, timeout=1.0):
+        # 等工作线程不再读这个串口后返回，之后可以安全地关闭串口
+        with self._lock:
+            worker = self._assigned.pop(reader, None)
+            if worker is None:
+                return
+            worker.load -= 1
+        done = worker.request('remove', reader)
+        if threading.current_thread() is not worker:
+            done.wait(timeout)
+
+    def close(self, timeout=1.0):
+        for worker in self.workers:
+            if worker.is_alive():
+                worker.request('stop')
+                if threading.current_thread() is not worker:
+                    worker.join(timeout)
+
+    @property
+    def size(self):
+        return len(self._assigned)
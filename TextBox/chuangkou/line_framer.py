@@ -0,0 +1,58 @@
+import numpy as np
+
+
+class LineFramer:
+    # 增量式按行分帧：一次 read(in_waiting) 读入整块字节，保留末尾不完整的行到下一次，
+    # 一次扫描缓冲区就得到所有完整的行，代替每行一次 readline() 的系统调用和内存分配。
+    def __init__(self, delimiter=b'\n'):
+        self.delimiter = delimiter
+        self._buffer = b''
+
+    def feed(self, data):
+        # 追加一块字节，返回其中所有完整的行（bytes，未解码）
+        if not data:
+            return []
+        buffer = self._buffer + data if self._buffer else data
+        end = buffer.rfind(self.delimiter)
+        if end < 0:
+            self._buffer = buffer
+            return []
+        self._buffer = buffer[end + len(self.delimiter):]
+        return buffer[:end].split(self.delimiter)
+
+    def feed_lines(self, data):
+        # 与 readline().decode().strip() 结果一致，空行被丢弃
+        return [line for line in (raw.decode(errors='replace').strip() for raw in self.feed(data)) if line]
+
+    def feed_values(self, data):
+        # 把完整的行批量解析为 float 数组；无法解析的行原样返回，便于显示或记录
+        raw_lines = [raw.strip() for raw in self.feed(data)]
+        raw_lines = [raw for raw in raw_lines if raw]
+        if not raw_lines:
+            return np.empty(0), []
+        try:
+            return np.array(raw_lines).astype(np.float64), []
+        except ValueError:
+            values, invalid = [], []
+            for raw in raw_lines:
+                try:
+                    values.append(float(raw))
+                except ValueError:
+                    invalid.append(raw.decode(errors='replace'))
+            return np.array(values, dtype=np.float64), invalid
+
+    def read_lines(self, ser):
+        # 非阻塞：只读取已经到达的字节
+        waiting = ser.in_waiting
+        if not waiting:
+            return []
+        return self.feed_lines(ser.read(waiting))
+
+    def flush(self):
+        # 取出残留的不完整行（例如读超时后），与 readline 超时返回部分数据的行为一致
+        rest, self._buffer = self._buffer, b''
+        return rest.decode(errors='replace').strip()
+
+    @property
+    def pending(self):
+        return len(self._buffer)
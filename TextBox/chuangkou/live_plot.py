@@ -0,0 +1,137 @@
+import numpy as np
+
+from decimate import MinMaxDecimator
+
+# 数据超出横轴时，新的横轴范围在数据右侧预留的比例，避免每个新采样都改变坐标范围
+X_HEADROOM = 0.5
+# 纵轴在数据范围上下预留的比例
+Y_MARGIN = 0.25
+# 每条曲线交给 matplotlib 的点数约为坐标区宽度（像素）的 2 倍，但不少于 MIN_POINTS
+MIN_POINTS = 200
+
+
+class LivePlot:
+    # 增量绘图：坐标轴和每条曲线只创建一次，新数据用 set_data 更新，只重画曲线所在的坐标区域（blit），
+    # 不再每个采样 fig.clear() + add_subplot + plot。只有坐标范围、标签、图例或曲线集合改变时才完整重绘，
+    # 完整重绘时缓存不含曲线的背景，之后的更新只恢复背景并重画曲线。
+    # 曲线设为 animated，不参与普通重绘，窗口缩放等引起的重绘在 draw_event 中补画曲线。
+    def __init__(self, canvas, ax=None, title=None, xlabel=None, ylabel=None):
+        self.canvas = canvas
+        self.ax = ax if ax is not None else canvas.figure.add_subplot(111)
+        self.lines = {}
+        self._decimators = {}
+        self.legend = False
+        self.full_draws = 0
+        self.blits = 0
+        self._background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.set_labels(title, xlabel, ylabel)
+
+    def set_labels(self, title=None, xlabel=None, ylabel=None):
+        # 与当前不同时才修改，修改后下一次 update 完整重绘
+        changed = False
+        for current, setter, text in ((self.ax.get_title(), self.ax.set_title, title),
+                                      (self.ax.get_xlabel(), self.ax.set_xlabel, xlabel),
+                                      (self.ax.get_ylabel(), self.ax.set_ylabel, ylabel)):
+            if text is not None and current != text:
+                setter(text)
+                changed = True
+        if changed:
+            self._background = None
+        return changed
+
+    def update(self, series, legend=False):
+        # series 为 {标签: (x, y)}，不在其中的曲线会被移除
+        full = self._background is None
+        # 曲线集合改变（例如重新开始循环、读取的引脚改变）时按新数据重新确定坐标范围
+        refit = False
+        for label in [label for label in self.lines if label not in series]:
+            self.lines.pop(label).remove()
+            refit = True
+        for label, (x, y) in series.items():
+            line = self.lines.get(label)
+            if line is None:
+                line, = self.ax.plot([], [], label=label, animated=True)
+                self.lines[label] = line
+                refit = True
+            line.set_data(x, y)
+        if refit:
+            full = True
+        if legend != self.legend or (legend and full):
+            self._update_legend(legend)
+            full = True
+        if self._update_limits(series.values(), refit):
+            full = True
+        if full:
+            self.redraw()
+        else:
+            self._blit()
+
+    def update_rings(self, rings, legend=False):
+        # rings 为 {标签: RingBuffer}，每条曲线先抽取到 point_budget() 个点再更新，重绘开销与缓冲区长度无关
+        budget = self.point_budget()
+        series = {}
+        for label, ring in rings.items():
+            decimator = self._decimators.get(label)
+            if decimator is None or decimator.ring is not ring:
+                decimator = self._decimators[label] = MinMaxDecimator(ring)
+            series[label] = decimator.decimate(budget)
+        for label in [label for label in self._decimators if label not in rings]:
+            del self._decimators[label]
+        self.update(series, legend)
+
+    def point_budget(self):
+        return max(MIN_POINTS, 2 * int(self.ax.bbox.width))
+
+    def redraw(self):
+        # 完整重绘，背景在 _on_draw 中缓存
+        self.full_draws += 1
+        self.canvas.draw()
+
+    def clear(self):
+        self.update({})
+
+    def _blit(self):
+        self.canvas.restore_region(self._background)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
+        self.blits += 1
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def _update_legend(self, legend):
+        self.legend = legend
+        if legend and self.lines:
+            self.ax.legend()
+        elif self.ax.get_legend() is not None:
+            self.ax.get_legend().remove()
+
+    def _update_limits(self, series, refit=False):
+        # 数据超出当前坐标范围（或 refit）时才改变范围，横轴在右侧预留 X_HEADROOM，返回是否改变
+        ranges = [(x[0], x[-1], np.min(y), np.max(y)) for x, y in series if len(x)]
+        if not ranges:
+            return False
+        x_min = min(r[0] for r in ranges)
+        x_max = max(r[1] for r in ranges)
+        y_min = min(r[2] for r in ranges)
+        y_max = max(r[3] for r in ranges)
+        changed = False
+        x0, x1 = self.ax.get_xlim()
+        if refit or x_min < x0 or x_max > x1:
+            span = x_max - x_min or 1.0
+            self.ax.set_xlim(x_min, x_max + X_HEADROOM * span)
+            changed = True
+        y0, y1 = self.ax.get_ylim()
+        if refit or y_min < y0 or y_max > y1:
+            # 扩展时至少把原范围扩大一倍，启动阶段幅度逐渐变大时也只重绘几次
+            margin = Y_MARGIN * (y_max - y_min)
+            if not refit:
+                margin = max(margin, (y1 - y0) / 2)
+            margin = margin or 1.0
+            self.ax.set_ylim(y_min - margin, y_max + margin)
+            changed = True
+        return changed
@@ -0,0 +1,124 @@
+from collections import deque
+from itertools import islice
+
+from PyQt5.QtWidgets import QCheckBox, QHBoxLayout, QLabel, QPlainTextEdit, QScrollBar, QVBoxLayout, QWidget
+from PyQt5.QtGui import QTextCursor
+from PyQt5.QtCore import Qt
+
+# 文本框中最多显示的行数，超出后自动删除最旧的行，排版开销不随运行时间增长
+LOG_MAX_LINES = 1000
+# 内存中保留的日志行数，暂停后可以回看
+LOG_HISTORY_LINES = 100000
+
+
+class LogView(QWidget):
+    # 有界的日志显示：QPlainTextEdit 设置 maximumBlockCount，只保留最近 max_lines 行；
+    # 高速数据用 extend 先排队，由调用方每帧调用一次 flush 成批追加，不再每个采样 append 一次。
+    # 全部日志另存在内存中的 history（有界 deque），勾选“暂停”后文本框停止刷新，
+    # 用下方的滚动条从 history 的快照中回看任意位置，不依赖文本框里的内容；取消暂停后回到最新的数据。
+    # 不可见时（例如在未选中的标签页里）flush 不追加文本，只保留最后 max_lines 行，显示时再一次追加。
+    def __init__(self, max_lines=LOG_MAX_LINES, history_lines=LOG_HISTORY_LINES, parent=None):
+        super().__init__(parent)
+        self.max_lines = max_lines
+        self.history = deque(maxlen=history_lines)
+        self._pending = []
+        self._snapshot = None
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setMaximumBlockCount(max_lines)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text.setUndoRedoEnabled(False)
+
+        self.pause_check = QCheckBox('暂停')
+        self.pause_check.toggled.connect(self.set_paused)
+        self.scroll_bar = QScrollBar(Qt.Horizontal)
+        self.scroll_bar.valueChanged.connect(self._show_snapshot)
+        self.scroll_bar.hide()
+        self.position_label = QLabel()
+        self.position_label.hide()
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.pause_check)
+        controls.addWidget(self.scroll_bar, 1)
+        controls.addWidget(self.position_label)
+        controls.addStretch()
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.text)
+        layout.addLayout(controls)
+        self.setLayout(layout)
+
+    @property
+    def paused(self):
+        return self._snapshot is not None
+
+    def append(self, text):
+        # 状态、应答等少量消息立即显示
+        self.extend([text])
+        self.flush()
+
+    def extend(self, lines):
+        # 高速数据先排队，下一次 flush 时一起显示
+        self.history.extend(lines)
+        if not self.paused:
+            self._pending.extend(lines)
+            if len(self._pending) > 2 * self.max_lines:
+                del self._pending[:-self.max_lines]
+
+    def flush(self):
+        if not self._pending or not self.isVisible():
+            return
+        # 超过文本框容量的部分反正会被删掉，只追加最后 max_lines 行
+        lines = self._pending[-self.max_lines:]
+        self._pending = []
+        self.text.appendPlainText('\n'.join(lines))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.flush()
+
+    def clear(self):
+        self.history.clear()
+        self._pending = []
+        self.text.clear()
+        if self.paused:
+            self.pause_check.setChecked(False)
+
+    def set_paused(self, paused):
+        if paused == self.paused:
+            return
+        if paused:
+            # 回看的是暂停时刻的快照，之后到达的数据继续写入 history，位置不会随之移动
+            self._snapshot = list(self.history)
+            self._pending = []
+            top = max(0, len(self._snapshot) - self.max_lines)
+            self.scroll_bar.blockSignals(True)
+            self.scroll_bar.setRange(0, top)
+            self.scroll_bar.setPageStep(self.max_lines)
+            self.scroll_bar.setValue(top)
+            self.scroll_bar.blockSignals(False)
+            self.scroll_bar.show()
+            self.position_label.show()
+            self._update_position(top)
+        else:
+            self._snapshot = None
+            self.scroll_bar.hide()
+            self.position_label.hide()
+            # 恢复为最新的 max_lines 行
+            self.text.setPlainText('\n'.join(islice(self.history, max(0, len(self.history) - self.max_lines), None)))
+            self.text.moveCursor(QTextCursor.End)
+        if self.pause_check.isChecked() != paused:
+            self.pause_check.setChecked(paused)
+
+    def _show_snapshot(self, start):
+        if self._snapshot is None:
+            return
+        self.text.setPlainText('\n'.join(self._snapshot[start:start + self.max_lines]))
+        self._update_position(start)
+
+    def _update_position(self, start):
+        end = min(start + self.max_lines, len(self._snapshot))
+        self.position_label.setText(f'{start + 1}-{end} / {len(self._snapshot)}')
+        if start >= self.scroll_bar.maximum():
+            self.text.moveCursor(QTextCursor.End)
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import serial
+
+from command_client import CommandClient
+from line_framer import LineFramer
+from protocol import BAUDRATE, TIMEOUT, command_map
+from serial_ports import open_serial
+
+# 启动时并行探测候选串口：每个串口一个线程，打开后发送带序号的 functionMap 命令，
+# 在 PROBE_TIMEOUT 秒内收到应答的才是 TestBox；打不开、无应答的串口（失效的蓝牙、ACM 口等）跳过。
+# 打开串口会让 Arduino 复位，固件启动完成前收不到命令，因此每隔 PROBE_RETRY_INTERVAL 秒重发一次。
+# 探测成功的串口保持打开交给调用方，避免再次打开时又复位一次。
+
+# 每个串口的探测时长（秒），足够 Arduino 复位后启动
+PROBE_TIMEOUT = 3.0
+# 没有应答时重发命令的间隔（秒）
+PROBE_RETRY_INTERVAL = 0.3
+# 探测期间的读超时（秒），越短越能及时重发
+PROBE_READ_TIMEOUT = 0.05
+
+
+def probe_port(port, baudrate=BAUDRATE, timeout=PROBE_TIMEOUT):
+    # 返回已打开、读超时恢复为 TIMEOUT 的串口；打不开或不是 TestBox 时抛出 serial.SerialException
+    ser = open_serial(port, baudrate, PROBE_READ_TIMEOUT)
+    client = CommandClient(ser, PROBE_RETRY_INTERVAL, writer=False)
+    framer = LineFramer()
+    deadline = time.monotonic() + timeout
+    answered = False
+    try:
+        while not answered:
+            if time.monotonic() >= deadline:
+                raise serial.SerialException(f'{timeout:g} 秒内没有应答 TestBox 命令')
+            future = client.submit(command_map['functionMap'])
+            client.flush_writes()
+            while not future.done() and not answered:
+                data = ser.read(ser.in_waiting or 1)
+                # 应答较慢时之前已超时的命令也可能收到应答，任何带序号的应答行都说明是 TestBox
+                answered = any([client.handle_line(line) for line in framer.feed_lines(data)])
+                client.expire()
+            error = future.exception() if future.done() else None
+            if error is not None and not isinstance(error, TimeoutError):
+                raise serial.SerialException(f'写入失败: {error}')
+        ser.timeout = TIMEOUT
+        return ser
+    except (serial.SerialException, OSError) as e:
+        ser.close()
+        if isinstance(e, serial.SerialException):
+            raise
+        raise serial.SerialException(str(e)) from e
+    finally:
+        client.close()
+
+
+def probe_ports(ports, on_result, baudrate=BAUDRATE, timeout=PROBE_TIMEOUT):
+    # 每个串口一个线程同时探测，总耗时约为最慢的一个而不是所有串口之和。
+    # 每个串口探测结束时在探测线程中调用 on_result(port, ser, error)：成功时 ser 为已打开的串口、error 为空字符串，
+    # 失败时 ser 为 None。打开串口本身卡住（失效的蓝牙串口）的线程不会阻止程序退出，调用方按需自行设定截止时间
+    def run(port):
+        try:
+            ser = probe_port(port, baudrate, timeout)
+        except (serial.SerialException, ValueError) as e:
+            on_result(port, None, str(e))
+        else:
+            on_result(port, ser, '')
+
+    threads = [threading.Thread(target=run, args=(port,), name=f'PortProbe-{port}', daemon=True) for port in ports]
+    for thread in threads:
+        thread.start()
+    return threads
@@ -0,0 +1,358 @@
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+import serial
+
+from device import DEFAULT_SAMPLE_PERIOD_MS, TestBoxDevice
+from frame_protocol import FRAME_PIN_ORDER
+from protocol import BAUDRATE, TIMEOUT
+
+# 每个串口一个采集进程：进程内的 TestBoxDevice 读串口、解析循环数据、写采集文件，
+# 解码后的采样写入共享内存环形缓冲区，界面进程只读映射，不经过管道序列化。
+# 界面进程里的绘图、排版再慢也不会占用采集进程的 GIL，串口照常读空，多个串口分布在多个 CPU 核上；
+# 界面卡顿不超过环形缓冲区的时长（RING_CAPACITY / 采样率）就不丢数据，超出时丢弃最旧的采样并计入 lost。
+# 数据行（日志）、命令和应答、错误经 multiprocessing 队列传递。数据行只用于显示日志，采集进程每 POLL_INTERVAL 秒
+# 最多转发最新的 MAX_LINES_PER_POLL 行，其余只计数（dropped_lines），高速 ASCII 模式下不会逐行序列化塞满队列。
+
+# 共享环形缓冲区中的一条采样记录
+RING_DTYPE = np.dtype([('time', '<f8'), ('channel', '<u2'), ('value', '<f8')])
+# 环形缓冲区容量（记录数），约 18 MB，10 kHz 下可以容纳约 100 秒
+RING_CAPACITY = 1 << 20
+# 头部：容量和累计写入的记录数，各一个 uint64
+HEADER_BYTES = 16
+# 通道编号固定：0 为 ASCII 数值行，其余按二进制帧的引脚顺序
+CHANNELS = ['raw'] + FRAME_PIN_ORDER
+CHANNEL_IDS = {name: number for number, name in enumerate(CHANNELS)}
+# 界面进程取数据的间隔（秒）
+POLL_INTERVAL = 0.01
+# 采集进程每次转发的数据行数上限
+MAX_LINES_PER_POLL = 200
+# 等待采集进程启动并打开串口的时间（秒），spawn 方式启动需要重新导入模块
+START_TIMEOUT = 30.0
+
+
+class SharedRing:
+    # 单写单读的共享内存环形缓冲区：写端（采集进程）写入记录后再更新头部的累计数，
+    # 读端（界面进程）记住自己读到的位置，read() 返回新记录的只读视图，不复制。
+    # 视图在写端再写满一圈之前有效，读端应及时处理；读端落后超过一圈时丢弃最旧的记录并计入 lost。
+    def __init__(self, capacity=RING_CAPACITY, name=None):
+        create = name is None
+        size = HEADER_BYTES + capacity * RING_DTYPE.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self.owner = create
+        self._header = np.ndarray(2, np.uint64, self.shm.buf)
+        if create:
+            self._header[:] = (capacity, 0)
+        self.capacity = int(self._header[0])
+        self.records = np.ndarray(self.capacity, RING_DTYPE, self.shm.buf, offset=HEADER_BYTES)
+        self.position = 0  # 读端已读到的累计位置
+        self.lost = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def total(self):
+        return int(self._header[1])
+
+    def write(self, records):
+        count = len(records)
+        total = self.total
+        if count > self.capacity:
+            total += count - self.capacity
+            records = records[-self.capacity:]
+            count = self.capacity
+        start = total % self.capacity
+        first = min(count, self.capacity - start)
+        self.records[start:start + first] = records[:first]
+        self.records[:count - first] = records[first:]
+        self._header[1] = total + count
+
+    def read(self):
+        # 返回新记录的只读视图列表（绕回时为两段）
+        total = self.total
+        if total - self.position > self.capacity:
+            self.lost += total - self.capacity - self.position
+            self.position = total - self.capacity
+        segments = []
+        while self.position < total:
+            start = self.position % self.capacity
+            end = min(self.capacity, start + total - self.position)
+            segment = self.records[start:end]
+            segment.flags.writeable = False
+            segments.append(segment)
+            self.position += end - start
+        return segments
+
+    def close(self):
+        # 先释放指向共享内存的数组，否则 SharedMemory.close 会报告仍有引用
+        self._header = self.records = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def samples_to_records(samples):
+    # {通道: (时间戳, 数值)} -> RING_DTYPE 记录
+    count = sum(len(values) for _, values in samples.values())
+    records = np.empty(count, RING_DTYPE)
+    pos = 0
+    for channel, (times, values) in samples.items():
+        end = pos + len(values)
+        records['time'][pos:end] = times
+        records['channel'][pos:end] = CHANNEL_IDS[channel]
+        records['value'][pos:end] = values
+        pos = end
+    return records
+
+
+def records_to_samples(segments):
+    # 一次取回的记录按通道拆回 {通道: (时间戳, 数值)}，每个通道保持写入顺序；
+    # 结果是共享内存之外的副本，交给界面线程排队处理期间写端绕回也不受影响
+    records = segments[0] if len(segments) == 1 else np.concatenate(segments)
+    channels = records['channel']
+    first = channels[0]
+    if (channels == first).all():
+        return {CHANNELS[first]: (records['time'].copy(), records['value'].copy())}
+    samples = {}
+    for number in np.unique(channels):
+        mask = channels == number
+        samples[CHANNELS[number]] = (records['time'][mask], records['value'][mask])
+    return samples
+
+
+def _worker_main(port, index, baudrate, timeout, sample_period_ms, ring_name, control, events):
+    # 采集进程：打开串口后按 control 队列中的请求工作，直到收到 close
+    ring = SharedRing(name=ring_name)
+    device = TestBoxDevice(port, index, baudrate, timeout, sample_period_ms)
+    # 读取线程收到的数据行只保留最新的 MAX_LINES_PER_POLL 行，由主循环定时转发
+    lines = deque(maxlen=MAX_LINES_PER_POLL)
+    received = [0]
+    lines_lock = threading.Lock()
+
+    def on_lines(_, new_lines):
+        with lines_lock:
+            lines.extend(new_lines)
+            received[0] += len(new_lines)
+
+    def forward_lines():
+        with lines_lock:
+            batch = list(lines)
+            dropped = received[0] - len(batch)
+            lines.clear()
+            received[0] = 0
+        if batch or dropped:
+            events.put(('lines', batch, dropped))
+
+    device.subscribe(on_lines,
+                     lambda _, samples: ring.write(samples_to_records(samples)),
+                     lambda _, error: events.put(('error', str(error))))
+    try:
+        device.open()
+    except (serial.SerialException, OSError, ValueError) as e:
+        events.put(('failed', str(e)))
+        ring.close()
+        return
+    events.put(('opened', None))
+    while True:
+        try:
+            message = control.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            message = ('idle',)
+        forward_lines()
+        if message[0] == 'close':
+            break
+        if message[0] == 'send':
+            _, request, command, args = message
+            try:
+                device.send(command, args, lambda response, request=request: events.put(('reply', request, response)))
+            except (KeyError, RuntimeError):
+                events.put(('reply', request, None))
+        elif message[0] == 'record':
+            _, request, path = message
+            try:
+                device.start_recording(path)
+                events.put(('recording', request, None))
+            except OSError as e:
+                events.put(('recording', request, str(e)))
+        elif message[0] == 'period':
+            device.sample_period_ms = message[1]
+    device.close()
+    ring.close()
+
+
+class RemoteRecorder:
+    # 采集进程中的采集文件在界面进程中的代表，只保留路径
+    def __init__(self, path):
+        self.path = path
+
+
+class ProcessDevice:
+    # 与 TestBoxDevice 接口相同，串口在独立的采集进程中读取。订阅者的回调在本进程的取数线程中调用：
+    # on_samples 每 POLL_INTERVAL 秒最多一次，拿到这段时间内从共享内存读到的全部采样
+    def __init__(self, port, index=0, baudrate=BAUDRATE, timeout=TIMEOUT, sample_period_ms=DEFAULT_SAMPLE_PERIOD_MS,
+                 capacity=RING_CAPACITY):
+        self.port = port
+        self.index = index
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.capacity = capacity
+        self.recorder = None
+        self.ring = None
+        self.process = None
+        self.dropped_lines = 0  # 采集进程没有转发的数据行数
+        self._sample_period_ms = sample_period_ms
+        self._subscribers = []
+        self._requests = {}
+        self._next_request = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._poller = None
+        self._early_events = []  # 等待打开串口期间已经到达的数据行等
+
+    @property
+    def is_open(self):
+        return self.process is not None
+
+    @property
+    def lost(self):
+        # 界面进程来不及读取而被覆盖的采样数
+        return self.ring.lost if self.ring is not None else 0
+
+    @property
+    def sample_period_ms(self):
+        return self._sample_period_ms
+
+    @sample_period_ms.setter
+    def sample_period_ms(self, value):
+        self._sample_period_ms = value
+        if self.process is not None:
+            self._control.put(('period', value))
+
+    def subscribe(self, on_lines=None, on_samples=None, on_error=None):
+        self._subscribers.append((on_lines, on_samples, on_error))
+
+    def open(self):
+        # 启动采集进程并等待它打开串口，失败时抛出 serial.SerialException
+        # 用 spawn 启动：界面进程已有多个线程，fork 出的子进程可能继承被占用的锁
+        context = multiprocessing.get_context('spawn')
+        self.ring = SharedRing(self.capacity)
+        self._control = context.Queue()
+        self._events = context.Queue()
+        self.process = context.Process(
+            target=_worker_main, name=f'TestBoxPort-{self.index}', daemon=True,
+            args=(self.port, self.index, self.baudrate, self.timeout, self._sample_period_ms, self.ring.name,
+                  self._control, self._events))
+        self.process.start()
+        self._early_events = []
+        while True:
+            try:
+                event = self._events.get(timeout=START_TIMEOUT)
+            except queue.Empty:
+                event = ('failed', '采集进程没有响应')
+            if event[0] == 'opened':
+                break
+            if event[0] == 'failed':
+                self._shutdown()
+                raise serial.SerialException(event[1])
+            self._early_events.append(event)
+        self._stop_event.clear()
+        self._poller = threading.Thread(target=self._poll_loop, name=f'ProcessDevice-{self.index}', daemon=True)
+        self._poller.start()
+        return self
+
+    def start_recording(self, path):
+        # 采集文件由采集进程写；文件无法创建时抛出 OSError
+        error = self._request(('record', path)).result(START_TIMEOUT)
+        if error is not None:
+            raise OSError(error)
+        self.recorder = RemoteRecorder(path)
+
+    def send(self, command, args=(), callback=None):
+        # 命令由采集进程中的命令通道发送，Future 和 callback(response) 在取数线程中完成
+        if self.process is None:
+            raise RuntimeError('串口未连接')
+        future = self._request(('send', command, tuple(args)))
+        if callback is not None:
+            future.add_done_callback(lambda done: callback(done.result()))
+        return future
+
+    def close(self):
+        if self.process is None:
+            return
+        self._stop_event.set()
+        if self._poller is not None and self._poller is not threading.current_thread():
+            self._poller.join(1.0)
+        self._poller = None
+        self._control.put(('close',))
+        self._shutdown()
+        self.recorder = None
+
+    def _request(self, message):
+        future = Future()
+        with self._lock:
+            request = self._next_request
+            self._next_request += 1
+            self._requests[request] = future
+        self._control.put((message[0], request) + message[1:])
+        return future
+
+    def _shutdown(self):
+        self.process.join(2 * self.timeout + 1)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.process = None
+        self.ring.close()
+        self.ring = None
+        with self._lock:
+            requests, self._requests = self._requests, {}
+        for future in requests.values():
+            future.set_result(None)
+
+    def _complete(self, request, result):
+        with self._lock:
+            future = self._requests.pop(request, None)
+        if future is not None:
+            future.set_result(result)
+
+    def _poll_loop(self):
+        events, self._early_events = self._early_events, []
+        while not self._stop_event.is_set():
+            try:
+                events.append(self._events.get(timeout=POLL_INTERVAL))
+                while True:
+                    events.append(self._events.get_nowait())
+            except queue.Empty:
+                pass
+            if not self.process.is_alive():
+                # 采集进程异常退出
+                events.append(('error', f'采集进程已退出 ({self.process.exitcode})'))
+                self._stop_event.set()
+            segments = self.ring.read()
+            if segments:
+                samples = records_to_samples(segments)
+                for _, on_samples, _ in self._subscribers:
+                    if on_samples is not None:
+                        on_samples(self.index, samples)
+            for event in events:
+                if event[0] == 'lines':
+                    self.dropped_lines += event[2]
+                    if not event[1]:
+                        continue
+                    for on_lines, _, _ in self._subscribers:
+                        if on_lines is not None:
+                            on_lines(self.index, event[1])
+                elif event[0] == 'error':
+                    for _, _, on_error in self._subscribers:
+                        if on_error is not None:
+                            on_error(self.index, event[1])
+                elif event[0] in ('reply', 'recording'):
+                    self._complete(event[1], event[2])
+            events = []
@@ -0,0 +1,90 @@
+from command_client import RESPONSE_ERROR, RESPONSE_OK
+from frame_protocol import STREAM_MODE_ASCII, STREAM_MODE_BINARY
+
+# TestBox 固件协议的共用定义，不依赖 Qt，各版本界面、TestBoxDevice 和命令行工具都从这里导入
+
+BAUDRATE = 115200
+# 命令应答超时（秒）
+TIMEOUT = 1
+
+# 定义命令类型及其枚举值
+command_map = {
+    'functionMap': 0,
+    'getPinFunction': 1,
+    'getcurrentPinFunction': 2,
+    'setPinFunction': 3,
+    'startLoop': 4,
+    'stopLoop': 5,
+    'setStreamMode': 6,
+    'setSampleRate': 7,
+    'getAllPinFunctions': 8
+}
+
+# 定义响应映射
+Response_map = {
+    'ok': RESPONSE_OK,
+    'error': RESPONSE_ERROR
+}
+
+# 定义功能名称及其枚举值
+function_map = {
+    'disable': 0,
+    'readDigital': 1,
+    'writeDigital': 2,
+    'readAnalog': 3,
+    'writeAnalog': 4
+}
+
+# 循环数据的传输格式
+stream_mode_map = {
+    'ascii': STREAM_MODE_ASCII,
+    'binary': STREAM_MODE_BINARY
+}
+
+# 采样率选项及对应的采样周期（毫秒），0 表示固件以最快速度采样
+sample_rate_map = {
+    '1 Hz': 1000,
+    '10 Hz': 100,
+    '20 Hz': 50,
+    '50 Hz': 20,
+    '最快': 0
+}
+
+# 需要额外参数的命令及其选项，显示在功能选择下拉框中
+command_options = {
+    'setStreamMode': stream_mode_map,
+    'setSampleRate': sample_rate_map
+}
+
+# 假设引脚范围，可根据实际情况调整
+pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
+
+# 定义每个引脚支持的功能
+pin_functions = {
+    4: ['readDigital', 'writeDigital'],
+    5: ['readDigital', 'writeDigital', 'writeAnalog'],
+    6: ['readDigital', 'writeDigital', 'writeAnalog'],
+    7: ['readDigital', 'writeDigital'],
+    8: ['readDigital', 'writeDigital'],
+    9: ['readDigital', 'writeDigital', 'writeAnalog'],
+    10: ['readDigital', 'writeDigital', 'writeAnalog'],
+    11: ['readDigital', 'writeDigital', 'writeAnalog'],
+    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
+    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
+    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
+    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
+    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
+    'A5': ['readDigital', 'writeDigital', 'readAnalog']
+}
+
+
+def pin_number(pin):
+    # 引脚名换算为固件的引脚号：A0 -> 14, A1 -> 15, ...，数字引脚原样返回
+    if isinstance(pin, str) and pin.startswith('A'):
+        return ord(pin[1]) - ord('0') + 14
+    return int(pin)
+
+
+def function_name(number, default='未知功能'):
+    # 功能编号（整数或数字字符）换算为功能名称
+    return next((key for key, value in function_map.items() if str(value) == str(number)), default)
@@ -0,0 +1,172 @@
+import argparse
+import os
+import re
+import signal
+import sys
+import threading
+import time
+
+from command_client import parse_reply
+from device import TestBoxDevice
+from io_pool import IO_WORKERS, IOPool
+from protocol import BAUDRATE, TIMEOUT, Response_map, function_map, pin_number, stream_mode_map
+
+# 无界面记录：不加载 PyQt5 和 matplotlib，适合长时间无人值守的测试。
+# 连接 N 个串口（或 sim:// 虚拟设备、replay:// 回放），等板子复位启动后逐个 setPinFunction 配置引脚，设置传输格式和采样率后 startLoop，
+# 每个串口的数据直接写入各自的采集文件（.tbcap，见 capture.py）；每隔 STATS_INTERVAL 秒向 stderr 打印吞吐量和丢弃数。
+# 收到 SIGINT/SIGTERM 后向各串口发送 stopLoop，关闭采集文件后退出。
+# 所有串口由 --workers 个读取线程服务（见 io_pool.py），测试架上几十块板子也不会有几十个线程。
+# 用法：python record.py COM3 COM4 --pin A0=readAnalog --pin A1=readAnalog --mode binary --period 0 --out captures
+
+# 统计输出间隔（秒）
+STATS_INTERVAL = 5.0
+# 二进制流模式下每帧打包的采样数，记录时越大越省带宽
+SAMPLES_PER_FRAME = 32
+
+
+class PortCounter:
+    # 统计一个串口收到的采样数，作为 TestBoxDevice 的 on_samples 订阅者在读取线程中调用
+    def __init__(self):
+        self.samples = 0
+        self.errors = []
+
+    def on_samples(self, index, samples):
+        self.samples += sum(len(values) for _, values in samples.values())
+
+    def on_error(self, index, error):
+        self.errors.append(error)
+
+
+def parse_pin(text):
+    # "A0=readAnalog" 或 "A0=3" -> (引脚号, 功能编号)
+    pin, _, function = text.partition('=')
+    try:
+        number = pin_number(pin.strip())
+        function = function.strip()
+        return number, function_map[function] if function in function_map else int(function)
+    except (ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f'引脚配置应为 引脚=功能，例如 A0=readAnalog: {text}')
+
+
+def capture_path(out_dir, port, used):
+    # 串口名去掉路径和地址参数后作为文件名，重名时加序号
+    name = re.sub(r'[^\w.-]', '_', os.path.basename(port.split('?')[0].rstrip('/'))) or 'port'
+    if name in used:
+        name = f'{name}-{len(used)}'
+    used.add(name)
+    return os.path.join(out_dir, f'{name}_{time.strftime("%Y%m%d-%H%M%S")}.tbcap')
+
+
+def request(device, command, args=()):
+    # 发送命令并等待应答，失败时抛出 RuntimeError
+    response = device.send(command, args).result()
+    status, payload = parse_reply(response)
+    if status != Response_map['ok']:
+        raise RuntimeError(f'{device.port} {command} 失败: {response}')
+    return payload
+
+
+def configure(device, pins, mode, period_ms):
+    for pin, function in pins:
+        request(device, 'setPinFunction', (pin, function))
+    request(device, 'setStreamMode', (stream_mode_map[mode], SAMPLES_PER_FRAME))
+    if period_ms is not None:
+        payload = request(device, 'setSampleRate', (period_ms & 0xFF, period_ms >> 8))
+        device.sample_period_ms = int(payload) if payload.isdigit() else period_ms
+    request(device, 'startLoop')
+
+
+def loss_stats(device):
+    # 记录队列满时丢弃的采样数，以及帧解码器统计的序号缺口（丢失的帧数）和校验失败（损坏的帧数）
+    dropped = device.recorder.dropped if device.recorder is not None else 0
+    decoder = device.reader.decoder if device.reader is not None else None
+    if decoder is None:
+        return f'丢弃 {dropped}'
+    return f'丢弃 {dropped} 丢帧 {decoder.dropped_frames} 校验错误 {decoder.checksum_errors}'
+
+
+def print_stats(devices, counters, last, elapsed):
+    parts = []
+    for index, (device, counter) in enumerate(zip(devices, counters)):
+        rate = (counter.samples - last.get(index, 0)) / elapsed
+        last[index] = counter.samples
+        parts.append(f'{device.port}: {rate:.0f}/s 共 {counter.samples} {loss_stats(device)}')
+    print(f'[{time.strftime("%H:%M:%S")}] ' + ' | '.join(parts), file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='无界面记录 TestBox 循环数据到采集文件')
+    parser.add_argument('ports', nargs='+', help='串口名，或 sim://、replay:// 地址')
+    parser.add_argument('--pin', type=parse_pin, action='append', default=[],
+                        help='引脚功能，例如 A0=readAnalog，可以重复，对所有串口生效')
+    parser.add_argument('--mode', choices=list(stream_mode_map), default='binary', help='循环数据格式')
+    parser.add_argument('--period', type=int, help='采样周期（毫秒），0 为固件最快速度；不给时保持固件当前设置')
+    parser.add_argument('--out', default='captures', help='采集文件目录')
+    parser.add_argument('--duration', type=float, help='记录时长（秒），不给时一直记录到 Ctrl+C')
+    parser.add_argument('--stats', type=float, default=STATS_INTERVAL, help='统计输出间隔（秒）')
+    parser.add_argument('--baudrate', type=int, default=BAUDRATE)
+    parser.add_argument('--workers', type=int, default=IO_WORKERS, help='服务所有串口的读取线程数，0 为每个串口一个读取线程')
+    args = parser.parse_args()
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+
+    os.makedirs(args.out, exist_ok=True)
+    devices, counters, used = [], [], set()
+    pool = IOPool(args.workers) if args.workers > 0 else None
+    try:
+        for index, port in enumerate(args.ports):
+            counter = PortCounter()
+            device = TestBoxDevice(port, index, args.baudrate, TIMEOUT, pool=pool)
+            device.subscribe(on_samples=counter.on_samples, on_error=counter.on_error)
+            device.open()
+            devices.append(device)
+            # 打开串口时板子复位，等固件启动后再配置
+            device.wait_ready()
+            counters.append(counter)
+            device.start_recording(capture_path(args.out, port, used))
+            configure(device, args.pin, args.mode, args.period)
+            print(f'{port} -> {device.recorder.path}', file=sys.stderr, flush=True)
+    except Exception as e:
+        print(f'启动失败: {e}', file=sys.stderr)
+        for device in devices:
+            device.close()
+        if pool is not None:
+            pool.close()
+        return 1
+
+    start = last_time = time.monotonic()
+    last = {}
+    while not stop.is_set():
+        stop.wait(min(args.stats, 0.5))
+        now = time.monotonic()
+        if now - last_time >= args.stats:
+            print_stats(devices, counters, last, now - last_time)
+            last_time = now
+        if args.duration is not None and now - start >= args.duration:
+            break
+        for device, counter in zip(devices, counters):
+            if counter.errors:
+                print(f'{device.port} 读取出错: {counter.errors[-1]}', file=sys.stderr, flush=True)
+                stop.set()
+
+    # 先停止循环，再关闭采集文件和串口
+    for device in devices:
+        try:
+            device.send('stopLoop').result()
+        except Exception as e:
+            print(f'{device.port} stopLoop 失败: {e}', file=sys.stderr)
+    for device, counter in zip(devices, counters):
+        path = device.recorder.path
+        # 关闭后读取线程和采集文件都不在了，先取统计
+        losses = loss_stats(device)
+        device.close()
+        print(f'{device.port}: 共 {counter.samples} 个采样 {losses} -> {path}', file=sys.stderr)
+    if pool is not None:
+        pool.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+
+
+class RenderScheduler(QObject):
+    # 限制重绘帧率：数据到达时只把画布标记为需要重绘（mark_dirty），由界面线程按不超过 max_fps 的频率统一重绘，
+    # 两帧之间到达的多批数据合并为一次重绘，接收速率与绘图开销无关。
+    # 重绘本身比帧间隔还慢时自动降帧（跳帧）：两帧之间至少留出与重绘耗时相同的时间给数据接收。
+    # 大量排队的信号会压住 Qt 定时器，因此标记时发现已经超时一帧以上就直接重绘。
+    # 只能在界面线程中使用。
+    def __init__(self, max_fps=30, parent=None):
+        super().__init__(parent)
+        self.interval = 1.0 / max_fps
+        self.frames = 0  # 实际重绘的帧数
+        self.coalesced = 0  # 被合并到下一帧的标记次数
+        self._dirty = {}
+        self._frame_start = 0.0
+        self._render_cost = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.render)
+
+    def set_max_fps(self, max_fps):
+        self.interval = 1.0 / max_fps
+
+    def mark_dirty(self, key, callback):
+        # 同一个 key（通常是一个画布）在一帧内只重绘一次，以最后一次给出的 callback 为准
+        if key in self._dirty:
+            self.coalesced += 1
+        self._dirty[key] = callback
+        delay = self._next_frame_time() - time.monotonic()
+        if delay <= -self.interval:
+            self.render()
+        elif not self._timer.isActive():
+            self._timer.start(max(0, int(delay * 1000)))
+
+    def discard(self, key):
+        # 画布被删除时取消尚未执行的重绘
+        self._dirty.pop(key, None)
+
+    def _next_frame_time(self):
+        return self._frame_start + max(self.interval, 2 * self._render_cost)
+
+    def render(self):
+        self._timer.stop()
+        dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+        self._frame_start = time.monotonic()
+        for callback in dirty.values():
+            callback()
+        self._render_cost = time.monotonic() - self._frame_start
+        self.frames += 1
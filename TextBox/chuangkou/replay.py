@@ -0,0 +1,153 @@
+import argparse
+import time
+from urllib.parse import parse_qs
+
+import numpy as np
+import serial
+
+from capture import CaptureReader
+from device_simulator import VirtualTestBox, connect_virtual
+from frame_protocol import FRAME_PIN_ORDER, encode_frames
+from serial_ports import REPLAY_SCHEME
+
+# 回放采集文件：在伪终端上模拟一台 TestBox，命令照常应答，startLoop 之后按记录的时间间隔输出记录的数据，
+# 上位机像连接真实串口一样经过读取线程、分帧、绘图、日志和记录的完整数据路径，同一份记录可以反复用作固定负载，
+# 对比不同版本的接收和绘图性能（仅 Linux/macOS）。
+# speed 为回放倍速，0 表示上位机能读多快就发多快。
+# 每条记录按二进制帧输出（一帧一个采样），帧中的时间为记录的时间（相对第一条记录，毫秒），
+# 上位机经 FrameDecoder 按引脚拆分，得到与记录时相同的通道和时间；循环回放时时间接着上一遍继续增长。
+# 引脚通道按 FRAME_PIN_ORDER 取 pin_mask 位，ASCII 默认模式记录的 'raw' 通道是 A0 的读数，按 A0 回放；
+# 帧中的数值为 u16，记录的数值取整后截断到 0..65535。其他名称的通道无法回放。
+
+# ASCII 默认模式读取的引脚
+RAW_PIN = 'A0'
+
+# 每批最多输出的记录数，倍速很高或尽快回放时也分批写出
+MAX_BATCH_RECORDS = 4096
+# 两批之间的间隔（秒）
+BATCH_SECONDS = 0.005
+
+
+class CaptureReplay(VirtualTestBox):
+    def __init__(self, path, speed=1.0, loop=False, autostart=False, debug=False):
+        super().__init__(debug=debug)
+        self.reader = CaptureReader(path)
+        self.speed = speed
+        self.loop = loop
+        self.looping = autostart
+        self.finished = False  # 记录已全部输出（loop 为 False 时）
+        self.replayed = 0  # 已输出的记录数
+        # 通道编号 -> pin_mask
+        self._masks = np.zeros(max(self.reader.channels, default=0) + 1, dtype=np.uint16)
+        for number, name in self.reader.channels.items():
+            pin = RAW_PIN if name == 'raw' else name
+            if pin not in FRAME_PIN_ORDER:
+                raise ValueError(f'无法回放通道 {name}')
+            self._masks[number] = 1 << FRAME_PIN_ORDER.index(pin)
+        span = self.reader.time_range()
+        self._start_time = span[0] if span else 0.0
+        # 每多回放一遍，帧时间增加一遍记录的时长
+        self._loop_span_ms = round((span[1] - span[0]) * 1000) + 1 if span else 0
+        self._time_base_ms = 0
+
+    def _sample_loop(self):
+        # 按记录的时间戳安排输出：开始（或暂停后继续）时把第一条未输出的记录对齐到当前墙钟
+        while not self._stop_event.is_set():
+            for records in self.reader.iter_chunks():
+                if not self._replay_chunk(records):
+                    return
+            if not self.loop:
+                self.finished = True
+                return
+            self._time_base_ms += self._loop_span_ms
+
+    def _replay_chunk(self, records):
+        # 输出一块记录，停止时返回 False
+        times = records['time']
+        position = 0
+        anchor = None
+        while position < len(records):
+            if self._stop_event.is_set():
+                return False
+            with self._state_lock:
+                looping = self.looping
+            if not looping:
+                anchor = None
+                time.sleep(0.01)
+                continue
+            now = time.monotonic()
+            if anchor is None:
+                anchor = (now, times[position])
+            end = min(position + MAX_BATCH_RECORDS, len(records))
+            if self.speed > 0:
+                # 到当前墙钟为止应该输出的记录
+                due_time = anchor[1] + (now - anchor[0]) * self.speed
+                due = position + int(np.argmax(times[position:end] > due_time)) if times[end - 1] > due_time else end
+                end = max(due, position)
+            if end > position:
+                self._emit_records(records[position:end])
+                position = end
+            self._stop_event.wait(BATCH_SECONDS)
+        return True
+
+    def _emit_records(self, records):
+        count = len(records)
+        time_ms = np.rint((records['time'] - self._start_time) * 1000).astype(np.int64) + self._time_base_ms
+        values = np.clip(np.rint(records['value']), 0, 0xFFFF).reshape(count, 1)
+        seq = (self._frame_sequence + np.arange(count)) & 0xFFFF
+        data = encode_frames(seq, time_ms, 0, self._masks[records['channel']], values)
+        self._frame_sequence = (self._frame_sequence + count) & 0xFFFF
+        self.replayed += count
+        self.samples_sent += count
+        self.frames_sent += count
+        sent_time = time.monotonic()
+        self._write_loop_data(data)
+        if self.record_send_times:
+            self.send_log.append((self.samples_sent, sent_time))
+
+
+def parse_replay_url(url):
+    # replay://路径?speed=倍速&loop=1&start=1，返回 (路径, 参数)
+    if not url.startswith(REPLAY_SCHEME):
+        raise ValueError(f'不是回放地址: {url}')
+    path, _, query = url[len(REPLAY_SCHEME):].partition('?')
+    query = parse_qs(query)
+    options = {
+        'speed': float(query.get('speed', ['1'])[0]),
+        'loop': query.get('loop', ['0'])[0] not in ('0', 'false', ''),
+        'autostart': query.get('start', ['0'])[0] not in ('0', 'false', ''),
+    }
+    return path, options
+
+
+def open_replay(url, baudrate, timeout):
+    # 地址或采集文件有误时与打不开串口一样抛出 SerialException
+    try:
+        path, options = parse_replay_url(url)
+        device = CaptureReplay(path, **options)
+    except (OSError, ValueError, KeyError) as e:
+        raise serial.SerialException(f'无法回放 {url}: {e}') from e
+    return connect_virtual(device, baudrate, timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把采集文件作为虚拟 TestBox 回放，打印可连接的串口路径')
+    parser.add_argument('path', help='采集文件（.tbcap 目录）')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 为尽快')
+    parser.add_argument('--loop', action='store_true', help='结束后从头重复')
+    parser.add_argument('--start', action='store_true', help='不等 startLoop 直接开始回放')
+    args = parser.parse_args()
+
+    device = CaptureReplay(args.path, args.speed, args.loop, args.start).start()
+    print(device.port, flush=True)
+    try:
+        while not device.finished:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.stop()
+
+
+if __name__ == '__main__':
+    main()
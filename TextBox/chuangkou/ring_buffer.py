@@ -0,0 +1,93 @@
+from time import time as unix_time
+
+import numpy as np
+
+
+class RingBuffer:
+    # 单通道定长环形缓冲区：时间戳和数值成对保存在 NumPy 数组中，追加为 O(1)，超出容量时覆盖最旧的数据，
+    # 长时间运行内存也保持不变。每个数据写两份（i 和 i + capacity），任意"最近 N 个"都是连续的一段，
+    # last() 直接返回只读视图而不复制，可以直接交给 matplotlib 或 NumPy 统计函数。
+    # 视图在下一次写入后内容会变化，需要保留时自行 copy()。
+    # 第一次写入时记下系统时间与第一个时间戳的差 time_offset，时间戳 + time_offset 即采样的 Unix 时间（秒）。
+    def __init__(self, capacity, dtype=np.float64):
+        if capacity < 1:
+            raise ValueError(f'容量必须大于 0: {capacity}')
+        self.capacity = int(capacity)
+        self.dtype = np.dtype(dtype)
+        self._times = np.zeros(2 * self.capacity)
+        self._values = np.zeros(2 * self.capacity, dtype=self.dtype)
+        self.total = 0  # 累计写入的数据个数，包括已被覆盖的
+        self._head = 0  # 下一个写入位置
+        self._size = 0
+        self.time_offset = 0.0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dropped(self):
+        # 因超出容量被覆盖的数据个数
+        return self.total - len(self)
+
+    def append(self, time, value):
+        if not self.total:
+            self.time_offset = unix_time() - time
+        head = self._head
+        self._times[head] = self._times[head + self.capacity] = time
+        self._values[head] = self._values[head + self.capacity] = value
+        self._head = (head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, times, values):
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=self.dtype)
+        if len(times) != len(values):
+            raise ValueError(f'时间戳和数值个数不一致: {len(times)} != {len(values)}')
+        if not self.total and len(times):
+            self.time_offset = unix_time() - times[0]
+        skipped = max(0, len(values) - self.capacity)
+        if skipped:
+            times, values = times[skipped:], values[skipped:]
+        positions = (self._head + np.arange(len(values))) % self.capacity
+        self._times[positions] = self._times[positions + self.capacity] = times
+        self._values[positions] = self._values[positions + self.capacity] = values
+        self._head = (self._head + len(values)) % self.capacity
+        self._size = min(self._size + len(values), self.capacity)
+        self.total += skipped + len(values)
+
+    def last(self, count=None):
+        # 返回最近 count 个（默认全部）数据的 (时间戳, 数值) 只读视图，按时间顺序排列
+        size = len(self) if count is None else min(count, len(self))
+        end = self._head + self.capacity
+        times = self._times[end - size:end]
+        values = self._values[end - size:end]
+        times.flags.writeable = False
+        values.flags.writeable = False
+        return times, values
+
+    def snapshot(self):
+        # 全部数据的副本 (Unix 时间戳, 数值)，可以交给其他线程（例如后台导出）使用
+        times, values = self.last()
+        return times + self.time_offset, values.copy()
+
+    @property
+    def times(self):
+        return self.last()[0]
+
+    @property
+    def values(self):
+        return self.last()[1]
+
+    def resize(self, capacity):
+        # 改变容量（例如采样率改变后按历史时长重新换算），保留最近的数据
+        if int(capacity) == self.capacity:
+            return
+        times, values = self.last(capacity)
+        total, time_offset = self.total, self.time_offset
+        self.__init__(capacity, self.dtype)
+        self.extend(times.copy(), values.copy())
+        self.total, self.time_offset = total, time_offset
+
+    def clear(self):
+        self.total = self._head = self._size = 0
@@ -0,0 +1,22 @@
+import serial
+
+# 以 replay:// 开头的“串口”是采集文件回放（见 replay.py），例如 replay://captures/COM3_20240101-120000.tbcap?speed=4
+REPLAY_SCHEME = 'replay://'
+# 以 sim:// 开头的“串口”是虚拟 TestBox（见 device_simulator.py），例如 sim://?rate=1000&noise=2
+SIMULATOR_SCHEME = 'sim://'
+
+
+def is_replay(port):
+    return port.startswith(REPLAY_SCHEME)
+
+
+def open_serial(port, baudrate, timeout):
+    # 打开串口；回放和虚拟设备地址先启动虚拟设备再连接它的伪终端，关闭串口时虚拟设备随之停止
+    # 虚拟设备基于伪终端，只在需要时导入（Windows 上没有 pty）
+    if is_replay(port):
+        from replay import open_replay
+        return open_replay(port, baudrate, timeout)
+    if port.startswith(SIMULATOR_SCHEME):
+        from device_simulator import open_simulator
+        return open_simulator(port, baudrate, timeout)
+    return serial.Serial(port, baudrate, timeout=timeout)
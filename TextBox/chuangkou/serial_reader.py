@@ -0,0 +1,82 @@
+import threading
+
+import serial
+
+from frame_protocol import FrameDecoder
+from line_framer import LineFramer
+
+
+class SerialReader(threading.Thread):
+    # 每个串口一个读取线程：阻塞等待数据，每次把缓冲区读空，再把完整的行成批交给回调，
+    # 持续速率只受链路限制，不再受 GUI 定时器周期限制。
+    # 给出 on_frames 时同时解码二进制采样帧，帧以外的字节仍按行处理；
+    # 给出 command_client 时，带序号的命令应答行交给它，不会混入循环数据。
+    # on_lines(index, lines)、on_frames(index, frames) 和 on_error(index, error) 都在读取线程中调用，
+    # GUI 端需要通过 Qt 信号（跨线程自动排队）或线程安全队列转交给界面线程。
+    def __init__(self, index, ser, on_lines, on_error=None, on_frames=None, command_client=None):
+        super().__init__(name=f'SerialReader-{index}', daemon=True)
+        self.index = index
+        self.ser = ser
+        self.on_lines = on_lines
+        self.on_error = on_error
+        self.on_frames = on_frames
+        self.decoder = FrameDecoder() if on_frames else None
+        self.command_client = command_client
+        self._stop_event = threading.Event()
+        self.framer = LineFramer()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            try:
+                # 空闲时阻塞读 1 字节，有数据时一次读完已到达的全部字节
+                data = self.ser.read(self.ser.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+                # 串口被关闭时 read 会抛异常，主动停止的情况不算错误
+                if not self._stop_event.is_set():
+                    self.fail(e)
+                elif self.command_client is not None:
+                    self.command_client.cancel_all()
+                return
+            if self.command_client is not None:
+                self.command_client.expire()
+            self.feed(data)
+
+    def feed(self, data):
+        # 处理一次读到的字节，data 为空表示读超时。不启动线程时由 IOPool 的工作线程调用
+        if data:
+            if self.decoder is not None:
+                frames, data = self.decoder.feed(data)
+                if frames:
+                    self.on_frames(self.index, frames)
+            lines = self.framer.feed_lines(data)
+        elif self.framer.pending:
+            # 读超时仍有残留的不完整行，与 readline 超时的行为一致
+            lines = [self.framer.flush()]
+        else:
+            return
+        if self.command_client is not None:
+            lines = [line for line in lines if not self.command_client.handle_line(line)]
+        lines = [line for line in lines if line]
+        if lines:
+            self.on_lines(self.index, lines)
+
+    def fail(self, error):
+        # 读取出错：通知订阅者并取消在途命令
+        if self.on_error:
+            self.on_error(self.index, error)
+        if self.command_client is not None:
+            self.command_client.cancel_all()
+
+    def stop(self, timeout=1.0):
+        self._stop_event.set()
+        # posix 下可以直接打断阻塞中的 read
+        cancel_read = getattr(self.ser, 'cancel_read', None)
+        if cancel_read is not None:
+            try:
+                cancel_read()
+            except Exception:
+                pass
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+        if self.command_client is not None:
+            self.command_client.cancel_all()
@@ -0,0 +1,101 @@
+import numpy as np
+
+from capture import SUMMARY_FACTOR, CaptureReader, CaptureRecorder, CaptureWriter, capture_series
+
+
+def write_capture(path, chunk_records=64):
+    # 两个通道交替写入，块很小，读取时要跨块
+    times = 1000.0 + np.arange(300) * 0.01
+    values = np.sin(np.arange(300) / 10.0) * 100
+    with CaptureWriter(path, chunk_records) as writer:
+        for start in range(0, 300, 50):
+            writer.append('A0', times[start:start + 50], values[start:start + 50])
+            writer.append('D4', times[start:start + 50], -values[start:start + 50])
+    return times, values
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'run.tbcap')
+    times, values = write_capture(path)
+    reader = CaptureReader(path)
+    assert len(reader) == 600
+    assert len(reader.chunks) > 1
+    assert reader.channel_names() == ['A0', 'D4']
+    assert reader.time_range() == (times[0], times[-1])
+    read_times, read_values = reader.read(channel='A0')
+    assert np.array_equal(read_times, times)
+    assert np.allclose(read_values, values.astype(np.float32))
+    assert np.allclose(reader.read(channel='D4')[1], -values.astype(np.float32))
+
+
+def test_read_time_range(tmp_path):
+    path = str(tmp_path / 'run.tbcap')
+    times, _ = write_capture(path)
+    read_times, _ = CaptureReader(path).read(times[100], times[200], 'A0')
+    assert np.array_equal(read_times, times[100:200])
+
+
+def test_capture_series_gives_every_channel(tmp_path):
+    path = str(tmp_path / 'run.tbcap')
+    write_capture(path)
+    counts = {}
+    for name, times, values in capture_series(CaptureReader(path)):
+        counts[name] = counts.get(name, 0) + len(values)
+    assert counts == {'A0': 300, 'D4': 300}
+
+
+def test_summary_pyramid(tmp_path):
+    # 第一级每条摘要覆盖 SUMMARY_FACTOR 个采样，最后不足一组的也有一条
+    path = str(tmp_path / 'run.tbcap')
+    times, values = write_capture(path)
+    reader = CaptureReader(path)
+    level1 = reader.summary('A0', 1)
+    assert len(level1) == -(-300 // SUMMARY_FACTOR)
+    values = values.astype(np.float32)
+    for i, entry in enumerate(level1):
+        group = values[i * SUMMARY_FACTOR:(i + 1) * SUMMARY_FACTOR]
+        assert entry['time'] == times[i * SUMMARY_FACTOR]
+        assert entry['min'] == group.min()
+        assert entry['max'] == group.max()
+    level2 = reader.summary('A0', 2)
+    assert level2['min'].min() == values.min()
+    assert level2['max'].max() == values.max()
+
+
+def test_view_picks_raw_samples_or_summary(tmp_path):
+    path = str(tmp_path / 'run.tbcap')
+    times, values = write_capture(path)
+    reader = CaptureReader(path)
+    view_times, view_values, level = reader.view('A0', times[0], times[-1] + 1, 10000)
+    assert level == 0
+    assert np.array_equal(view_times, times)
+    view_times, view_values, level = reader.view('A0', times[0], times[-1] + 1, 50)
+    assert level >= 1
+    assert len(view_values) <= 50
+    assert view_values.min() == values.astype(np.float32).min()
+    assert view_values.max() == values.astype(np.float32).max()
+
+
+def test_reader_sees_chunks_missing_from_index(tmp_path):
+    # 异常退出时最后一块还没写进 header.json，读取时按文件补上
+    path = str(tmp_path / 'run.tbcap')
+    writer = CaptureWriter(path, chunk_records=1000)
+    writer.append('A0', [1.0, 2.0, 3.0], [1, 2, 3])
+    writer.flush()
+    reader = CaptureReader(path)
+    assert len(reader) == 3
+    assert list(reader.read(channel='A0')[1]) == [1, 2, 3]
+    writer.close()
+
+
+def test_recorder_writes_in_background(tmp_path):
+    path = str(tmp_path / 'run.tbcap')
+    recorder = CaptureRecorder(path, flush_interval=0.01)
+    recorder.start()
+    for start in range(0, 100, 10):
+        recorder.write('raw', np.arange(start, start + 10, dtype=np.float64), np.arange(10))
+    recorder.close()
+    assert recorder.error is None
+    assert recorder.dropped == 0
+    read_times, _ = CaptureReader(path).read(channel='raw')
+    assert np.array_equal(read_times, np.arange(100))
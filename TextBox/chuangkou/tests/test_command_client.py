@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from command_client import COMMAND_TAG, CommandClient, parse_reply
+
+
+class FakeSerial:
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+
+def make_client(timeout=1.0):
+    # 不启动写线程，由测试调用 flush_writes 写出命令、调用 expire 检查超时
+    ser = FakeSerial()
+    return ser, CommandClient(ser, timeout, writer=False)
+
+
+def test_command_is_written_with_tag_and_sequence():
+    ser, client = make_client()
+    future = client.submit(3, (14, 2))
+    assert ser.written == []
+    client.flush_writes()
+    assert ser.written == [bytes([3 | COMMAND_TAG, future.seq, 14, 2]) + b'\r\n']
+
+
+def test_replies_are_matched_by_sequence():
+    ser, client = make_client()
+    first = client.submit(1, (4,))
+    second = client.submit(1, (5,))
+    client.flush_writes()
+    assert client.handle_line(f'@{second.seq} 02')
+    assert client.handle_line(f'@{first.seq} 01')
+    assert first.result(0) == '01'
+    assert second.result(0) == '02'
+    assert client.pending == 0
+
+
+def test_loop_data_is_not_a_reply():
+    ser, client = make_client()
+    future = client.submit(0)
+    assert not client.handle_line('512.00')
+    assert not client.handle_line('@x 0')
+    assert not future.done()
+
+
+def test_reply_for_unknown_sequence_is_consumed():
+    # 已超时的命令迟到的应答也不能当作循环数据
+    ser, client = make_client()
+    assert client.handle_line('@7 0')
+
+
+def test_unanswered_command_times_out():
+    ser, client = make_client(timeout=0.01)
+    replies = []
+    future = client.send(5, callback=replies.append)
+    client.flush_writes()
+    time.sleep(0.02)
+    client.expire()
+    with pytest.raises(TimeoutError):
+        future.result(0)
+    assert replies == [None]
+    assert client.pending == 0
+
+
+def test_expired_command_is_not_written():
+    ser, client = make_client(timeout=0.01)
+    client.submit(4)
+    time.sleep(0.02)
+    client.expire()
+    client.flush_writes()
+    assert ser.written == []
+
+
+def test_close_cancels_pending_commands():
+    ser, client = make_client()
+    future = client.submit(0)
+    client.close()
+    assert future.cancelled()
+    with pytest.raises(RuntimeError):
+        client.submit(0)
+
+
+def test_parse_reply():
+    assert parse_reply('014') == (0, '14')
+    assert parse_reply('') == (None, '')
+    assert parse_reply(None) == (None, '')
@@ -0,0 +1,36 @@
+import numpy as np
+
+from decimate import MinMaxDecimator, minmax_buckets
+from ring_buffer import RingBuffer
+
+
+def test_minmax_buckets_keeps_extremes_in_time_order():
+    times = np.arange(8.0)
+    values = np.array([3, 9, 1, 5, 7, 2, 8, 4], dtype=np.float64)
+    out_times, out_values = minmax_buckets(times, values, 4)
+    assert list(out_times) == [1, 2, 5, 6]
+    assert list(out_values) == [9, 1, 2, 8]
+
+
+def test_short_history_is_not_decimated():
+    ring = RingBuffer(100)
+    ring.extend(np.arange(10.0), np.arange(10.0))
+    times, values = MinMaxDecimator(ring).decimate(50)
+    assert len(values) == 10
+
+
+def test_incremental_result_matches_fresh_decimation():
+    # 缓存的桶在新数据到达、环形缓冲区绕回后仍与从头计算的结果一致
+    rng = np.random.default_rng(0)
+    ring = RingBuffer(5000)
+    decimator = MinMaxDecimator(ring)
+    for start in range(0, 20000, 700):
+        ring.extend(np.arange(start, start + 700, dtype=np.float64), rng.normal(size=700))
+        times, values = decimator.decimate(400)
+        fresh_times, fresh_values = MinMaxDecimator(ring).decimate(400)
+        assert np.array_equal(times, fresh_times)
+        assert np.array_equal(values, fresh_values)
+        assert len(values) <= 400 + 4
+        assert values.min() == ring.values.min()
+        assert values.max() == ring.values.max()
+        assert np.all(np.diff(times) >= 0)
@@ -0,0 +1,31 @@
+import numpy as np
+
+# 只导入模块：pytest 会把名字以 Test 开头的类当作测试收集
+import device
+
+
+def raw_times(box, lines):
+    # 不打开串口，直接把一批数据行交给读取线程的回调，取回 'raw' 通道的时间戳
+    batches = []
+    box.subscribe(on_samples=lambda index, samples: batches.append(samples['raw'][0]))
+    box._on_lines(0, lines)
+    box._subscribers.clear()
+    return batches[0]
+
+
+def test_ascii_times_follow_sample_period():
+    box = device.TestBoxDevice('sim://', sample_period_ms=100)
+    assert np.allclose(raw_times(box, ['1', '2', 'x', '3']), [0.0, 0.1, 0.2])
+
+
+def test_sample_rate_change_during_streaming_keeps_earlier_times():
+    # 改变采样周期后从改变时的时间接着计算，之前的采样时间不变，时间轴不跳变
+    box = device.TestBoxDevice('sim://', sample_period_ms=100)
+    before = raw_times(box, ['1'] * 5)
+    box.sample_period_ms = 10
+    after = raw_times(box, ['1'] * 3)
+    box.sample_period_ms = 50
+    later = raw_times(box, ['1'] * 2)
+    assert np.allclose(before, [0.0, 0.1, 0.2, 0.3, 0.4])
+    assert np.allclose(after, [0.5, 0.51, 0.52])
+    assert np.allclose(later, [0.53, 0.58])
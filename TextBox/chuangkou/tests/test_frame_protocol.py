@@ -0,0 +1,40 @@
+from frame_protocol import FRAME_SYNC, FrameDecoder, encode_frame
+
+
+def frame_ending_in_sync_byte():
+    # 找一个校验和恰好为 0xA5（同步头第一个字节）的帧
+    for seq in range(256):
+        frame = encode_frame(seq, 1000, 1, 1, [seq])
+        if frame[-1] == FRAME_SYNC[0]:
+            return frame
+    raise AssertionError('没有找到校验和为 0xA5 的帧')
+
+
+def test_frame_ending_in_sync_byte_is_not_held_back():
+    # 已解码的帧的最后一个字节不能被当作下一个同步头的前半部分留到下一次 feed
+    frame = frame_ending_in_sync_byte()
+    decoder = FrameDecoder()
+    frames, text = decoder.feed(frame)
+    assert len(frames) == 1 and text == b''
+    frames, text = decoder.feed(b'@3 0\r\n')
+    assert frames == [] and text == b'@3 0\r\n'
+
+
+def test_frame_ending_in_sync_byte_followed_by_frame():
+    frame = frame_ending_in_sync_byte()
+    decoder = FrameDecoder()
+    frames, _ = decoder.feed(frame)
+    following = encode_frame(frames[0].seq[0] + 1, 1001, 1, 1, [7])
+    frames, text = decoder.feed(following)
+    assert text == b'' and list(frames[0].values[:, 0]) == [7]
+    assert decoder.checksum_errors == 0 and decoder.dropped_frames == 0
+
+
+def test_trailing_sync_byte_of_text_is_held_back():
+    # 帧以外的文本末尾的 0xA5 仍可能是下一个同步头的前半部分
+    frame = encode_frame(1, 1000, 1, 1, [5])
+    decoder = FrameDecoder()
+    frames, text = decoder.feed(b'abc' + FRAME_SYNC[:1])
+    assert frames == [] and text == b'abc'
+    frames, text = decoder.feed(frame[1:])
+    assert len(frames) == 1 and text == b''
@@ -0,0 +1,55 @@
+import numpy as np
+
+from line_framer import LineFramer
+
+
+class FakeSerial:
+    # 每次 read 取出已到达的全部字节
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    @property
+    def in_waiting(self):
+        return len(self.chunks[0]) if self.chunks else 0
+
+    def read(self, size):
+        return self.chunks.pop(0)
+
+
+def test_partial_line_is_kept_until_delimiter_arrives():
+    framer = LineFramer()
+    assert framer.feed_lines(b'12') == []
+    assert framer.pending == 2
+    assert framer.feed_lines(b'3\r\n45') == ['123']
+    assert framer.feed_lines(b'6\r\n7\r\n') == ['456', '7']
+    assert framer.pending == 0
+
+
+def test_empty_lines_are_dropped():
+    framer = LineFramer()
+    assert framer.feed_lines(b'\r\n1\r\n\r\n2\r\n') == ['1', '2']
+
+
+def test_flush_returns_incomplete_line():
+    framer = LineFramer()
+    framer.feed_lines(b'1\r\n2')
+    assert framer.flush() == '2'
+    assert framer.pending == 0
+    assert framer.flush() == ''
+
+
+def test_feed_values_returns_invalid_lines_separately():
+    framer = LineFramer()
+    values, invalid = framer.feed_values(b'1.5\r\nabc\r\n2\r\n3')
+    assert np.array_equal(values, [1.5, 2.0])
+    assert invalid == ['abc']
+    values, invalid = framer.feed_values(b'\r\n')
+    assert np.array_equal(values, [3.0])
+
+
+def test_read_lines_reads_only_what_has_arrived():
+    framer = LineFramer()
+    ser = FakeSerial([b'1\r\n2', b'\r\n'])
+    assert framer.read_lines(ser) == ['1']
+    assert framer.read_lines(ser) == ['2']
+    assert framer.read_lines(ser) == []
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from port_process import RING_DTYPE, SharedRing, records_to_samples, samples_to_records
+
+
+def make_records(start, count):
+    records = np.zeros(count, RING_DTYPE)
+    records['time'] = np.arange(start, start + count)
+    records['value'] = records['time'] * 2
+    return records
+
+
+@pytest.fixture
+def rings():
+    # 写端创建共享内存，读端按名称打开，与采集进程和界面进程一样
+    writer = SharedRing(8)
+    reader = SharedRing(name=writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def read_times(ring):
+    segments = ring.read()
+    return [time for segment in segments for time in segment['time']], len(segments)
+
+
+def test_read_returns_new_records(rings):
+    writer, reader = rings
+    writer.write(make_records(0, 5))
+    assert read_times(reader) == ([0, 1, 2, 3, 4], 1)
+    assert read_times(reader) == ([], 0)
+
+
+def test_wraparound_is_read_in_two_segments(rings):
+    writer, reader = rings
+    writer.write(make_records(0, 6))
+    read_times(reader)
+    writer.write(make_records(6, 5))
+    assert read_times(reader) == ([6, 7, 8, 9, 10], 2)
+    assert reader.lost == 0
+
+
+def test_reader_falling_behind_counts_lost_records(rings):
+    writer, reader = rings
+    writer.write(make_records(0, 5))
+    read_times(reader)
+    writer.write(make_records(5, 6))
+    writer.write(make_records(11, 4))
+    # 写了 10 条，容量只有 8，最旧的 2 条被覆盖
+    assert read_times(reader)[0] == list(range(7, 15))
+    assert reader.lost == 2
+
+
+def test_batch_larger_than_capacity_keeps_newest(rings):
+    writer, reader = rings
+    writer.write(make_records(0, 20))
+    assert writer.total == 20
+    assert read_times(reader)[0] == list(range(12, 20))
+    assert reader.lost == 12
+
+
+def test_samples_round_trip_through_records():
+    samples = {'raw': (np.array([0.0, 0.1]), np.array([1.0, 2.0])), 'A0': (np.array([0.5]), np.array([3.0]))}
+    back = records_to_samples([samples_to_records(samples)])
+    assert set(back) == {'raw', 'A0'}
+    for channel, (times, values) in samples.items():
+        assert np.array_equal(back[channel][0], times)
+        assert np.array_equal(back[channel][1], values)
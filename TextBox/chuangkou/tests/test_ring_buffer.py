@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from ring_buffer import RingBuffer
+
+
+def test_append_wraps_around_and_keeps_newest():
+    ring = RingBuffer(4)
+    for i in range(10):
+        ring.append(i, i * 10)
+    times, values = ring.last()
+    assert list(times) == [6, 7, 8, 9]
+    assert list(values) == [60, 70, 80, 90]
+    assert ring.total == 10
+    assert ring.dropped == 6
+
+
+def test_extend_across_the_end_of_the_buffer():
+    # 第二批从缓冲区末尾绕回开头，last() 仍按时间顺序给出连续的一段
+    ring = RingBuffer(5)
+    ring.extend([0, 1, 2], [0, 1, 2])
+    ring.extend([3, 4, 5, 6], [3, 4, 5, 6])
+    assert list(ring.last()[0]) == [2, 3, 4, 5, 6]
+    assert list(ring.last(3)[1]) == [4, 5, 6]
+
+
+def test_extend_larger_than_capacity():
+    ring = RingBuffer(3)
+    ring.extend(np.arange(8), np.arange(8) * 2)
+    assert list(ring.last()[1]) == [10, 12, 14]
+    assert ring.total == 8
+
+
+def test_last_returns_read_only_views():
+    ring = RingBuffer(4)
+    ring.extend([0, 1], [5, 6])
+    times, values = ring.last(10)
+    assert len(times) == 2
+    assert times.base is not None
+    with pytest.raises(ValueError):
+        values[0] = 0
+
+
+def test_resize_keeps_most_recent_data():
+    ring = RingBuffer(6)
+    ring.extend(np.arange(6), np.arange(6))
+    ring.resize(3)
+    assert list(ring.last()[1]) == [3, 4, 5]
+    assert ring.total == 6
+    ring.append(6, 6)
+    assert list(ring.last()[1]) == [4, 5, 6]
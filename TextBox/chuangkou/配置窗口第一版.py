@@ -1,77 +1,80 @@
 import sys
 import serial
 import serial.tools.list_ports
-import threading
+import os
 import time
 import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox,
-    QTextEdit, QPushButton, QTabWidget, QRadioButton, QButtonGroup,
-    QGridLayout, QGroupBox
+    QPushButton, QTabWidget, QRadioButton, QButtonGroup,
+    QGridLayout, QGroupBox, QFileDialog
 )
 from PyQt5.QtGui import QFont, QPalette, QColor
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import csv
-
-
-# 定义命令类型及其枚举值
-command_map = {
-    'functionMap': 0,
-    'getPinFunction': 1,
-    'getcurrentPinFunction': 2,
-    'setPinFunction': 3,
-    'startLoop': 4,
-    'stopLoop': 5
-}
-
-# 定义功能名称及其枚举值
-function_map = {
-    'disable': 0,
-    'readDigital': 1,
-    'writeDigital': 2,
-    'readAnalog': 3,
-    'writeAnalog': 4
-}
-
-# 假设引脚范围，可根据实际情况调整
-pin_ranges = [i for i in range(4, 12)] + [f'A{i}' for i in range(0, 6)]
-
-# 定义每个引脚支持的功能
-pin_functions = {
-    4: ['readDigital', 'writeDigital'],
-    5: ['readDigital', 'writeDigital', 'writeAnalog'],
-    6: ['readDigital', 'writeDigital', 'writeAnalog'],
-    7: ['readDigital', 'writeDigital'],
-    8: ['readDigital', 'writeDigital'],
-    9: ['readDigital', 'writeDigital', 'writeAnalog'],
-    10: ['readDigital', 'writeDigital', 'writeAnalog'],
-    11: ['readDigital', 'writeDigital', 'writeAnalog'],
-    'A0': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A1': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A2': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A3': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A4': ['readDigital', 'writeDigital', 'readAnalog'],
-    'A5': ['readDigital', 'writeDigital', 'readAnalog']
-}
+from command_client import RESPONSE_OK, parse_reply
+from capture import CSV_HEADER, VALUE_FORMAT, CaptureReader, CaptureRecorder, capture_series
+from csv_export import export_in_background
+from csv_recorder import CsvRecorder
+from device import TestBoxDevice
+from live_plot import LivePlot
+from log_view import LogView
+from port_probe import PROBE_TIMEOUT, probe_ports
+from protocol import (BAUDRATE, TIMEOUT, command_map, command_options, function_map, function_name, pin_functions,
+                      pin_number, pin_ranges, sample_rate_map, stream_mode_map)
+from render_scheduler import RenderScheduler
+from ring_buffer import RingBuffer
+
+
+# 波形图保留的最近数据点数，长时间运行内存保持不变
+MAX_HISTORY_POINTS = 200000
+# 图表最高重绘帧率，数据到达时只标记需要重绘
+RENDER_FPS = 30
+# 数据记录格式：'capture' 为二进制采集文件（见 capture.py，可随机访问，按需转换为 CSV），'csv' 为直接写 CSV
+RECORD_FORMAT = 'capture'
+# 数据记录文件每隔多少秒刷一次盘；CSV 文件超过 CSV_MAX_BYTES 字节或 CSV_MAX_SECONDS 秒时换新文件，None 表示不限
+CSV_FLUSH_INTERVAL = 1.0
+CSV_MAX_BYTES = 100 * 1024 * 1024
+CSV_MAX_SECONDS = None
+# 二进制流模式下每帧打包的采样数
+SAMPLES_PER_FRAME = 8
+
+
+# 读取线程到界面线程的信号桥：命令应答回调、数据行和读取错误在界面线程中处理
+class SerialTabSignals(QObject):
+    command_reply = pyqtSignal(object, object)
+    lines_received = pyqtSignal(list)
+    read_error = pyqtSignal(str)
+
+
+# 探测线程到界面线程的信号桥：(串口, 已打开的串口或 None, 错误信息)
+class PortDiscoverySignals(QObject):
+    probed = pyqtSignal(str, object, str)
 
 
 class SerialTab(QWidget):
-    def __init__(self, port):
+    # ser 为启动时探测成功、已经打开的串口，不再重新打开（打开会让 Arduino 复位）
+    def __init__(self, port, ser=None):
         super().__init__()
         self.port = port
-        self.ser = None
-        self.data_x = []
-        self.data_y = []
-        self.counter = 0
+        self.device = None  # TestBoxDevice：串口、读取线程和带序号的命令通道
+        self.signals = SerialTabSignals()
+        self.signals.command_reply.connect(lambda handler, response: handler(response))
+        self.signals.lines_received.connect(self.process_serial_lines)
+        self.signals.read_error.connect(self.on_read_error)
+        self.data = RingBuffer(MAX_HISTORY_POINTS)  # 横轴为数据序号
         self.mode = "serial_display"
-        self.lock = threading.Lock()  # 添加线程锁
+        # 数据记录在后台线程中写盘，读取线程只把数据放进队列
+        name = os.path.basename(port)
+        if RECORD_FORMAT == 'capture':
+            self.recorder = CaptureRecorder(f'{name}_{time.strftime("%Y%m%d-%H%M%S")}.tbcap', CSV_FLUSH_INTERVAL)
+        else:
+            self.recorder = CsvRecorder(f'{name}.csv', ['Time', 'Data'], CSV_FLUSH_INTERVAL,
+                                        CSV_MAX_BYTES, CSV_MAX_SECONDS)
+        self.recorder.start()
         self.init_ui()
-        self.start_serial_thread()
-        self.csv_file = open(f'{port}.csv', 'w', newline='')
-        self.csv_writer = csv.writer(self.csv_file)
-        self.csv_writer.writerow(['Time', 'Data'])
+        self.start_serial_thread(ser)
 
     def init_ui(self):
         main_layout = QVBoxLayout()
@@ -155,8 +158,7 @@ class SerialTab(QWidget):
         data_group = QGroupBox("数据显示")
         data_layout = QVBoxLayout()
         self.response_label = QLabel('响应:')
-        self.response_text = QTextEdit()
-        self.response_text.setReadOnly(True)
+        self.response_text = LogView()
         data_layout.addWidget(self.response_label)
         data_layout.addWidget(self.response_text)
 
@@ -164,9 +166,13 @@ class SerialTab(QWidget):
         self.figure = Figure()
         self.canvas = FigureCanvas(self.figure)
         self.ax = self.figure.add_subplot(111)
-        self.ax.set_xlabel('Time')
-        self.ax.set_ylabel('Data')
+        self.live_plot = LivePlot(self.canvas, self.ax, xlabel='Time', ylabel='Data')
+        self.render_scheduler = RenderScheduler(RENDER_FPS, self)
         data_layout.addWidget(self.canvas)
+        if RECORD_FORMAT == 'capture':
+            self.export_button = QPushButton('导出数据为CSV')
+            self.export_button.clicked.connect(self.export_to_csv)
+            data_layout.addWidget(self.export_button)
         data_group.setLayout(data_layout)
         display_layout.addWidget(data_group)
 
@@ -191,49 +197,81 @@ class SerialTab(QWidget):
         palette.setColor(QPalette.HighlightedText, QColor(255, 255, 255))
         self.setPalette(palette)
 
-    def start_serial_thread(self):
+    def start_serial_thread(self, ser=None):
+        self.open_device(self.port, ser)
+
+    def open_device(self, port, ser=None):
+        # 换串口时先关闭旧连接，旧串口上的在途命令全部取消。读取线程中带序号的命令应答交给命令通道，
+        # 其余为循环数据，串口显示模式下成批经信号交给界面线程，设备解析出的采样在读取线程中记录
+        if self.device is not None:
+            self.device.close()
+            self.device = None
         try:
-            self.ser = serial.Serial(self.port, baudrate=115200, timeout=1)
-            self.response_text.append(f"已成功连接到 {self.port}")
-            thread = threading.Thread(target=self.read_serial_data)
-            thread.daemon = True
-            thread.start()
+            device = TestBoxDevice(port, baudrate=BAUDRATE, timeout=TIMEOUT)
+            device.subscribe(self.on_lines, lambda _, samples: self.on_samples(device, samples),
+                             lambda _, e: self.signals.read_error.emit(str(e)))
+            self.device = device.open(ser)
+            self.response_text.append(f"已成功连接到 {port}")
         except serial.SerialException as e:
-            self.response_text.append(f"连接 {self.port} 时出现错误: {e}")
-
-    def read_serial_data(self):
-        while True:
-            if self.ser and self.ser.is_open:
-                try:
-                    line = self.ser.readline().decode().strip()
-                    if line:
-                        if self.mode == "serial_display":
-                            self.process_serial_data(line)
-                except Exception as e:
-                    self.response_text.append(f"读取数据时出错: {e}")
-            time.sleep(0.01)
+            self.response_text.append(f"连接 {port} 时出现错误: {e}")
+
+    def on_lines(self, index, lines):
+        # 读取线程中执行
+        if self.mode == "serial_display":
+            self.signals.lines_received.emit(lines)
+
+    def on_samples(self, device, samples):
+        # 读取线程中执行，只记录 ASCII 数值行（无效数据设备已经丢掉）
+        if self.mode == "serial_display" and 'raw' in samples:
+            self.record_samples(device, *samples['raw'])
+
+    def on_read_error(self, error):
+        # 读取线程出错后已经停止；关闭窗口时串口在读取中被关闭，不算错误
+        if self.device is not None:
+            self.response_text.append(f"读取数据时出错: {error}")
+
+    def record_samples(self, device, times, values):
+        # 读取线程中执行。时间戳由设备按采样周期逐个排开，再换算为 Unix 时间，
+        # 同一批中的采样不会共用一个时间；最快模式下没有周期，整批取收到的时间
+        times = device.unix_times('data', times, device.sample_period_ms > 0)
+        if RECORD_FORMAT == 'capture':
+            self.recorder.write('data', times, values)
+        else:
+            self.recorder.write_rows(np.column_stack((times, values)).tolist())
+
+    def export_to_csv(self):
+        # 从采集文件转换：后台线程按块读取 memmap 并格式化，界面线程只显示进度；
+        # 正在记录时只包含已写盘的部分（最多晚 CSV_FLUSH_INTERVAL 秒）
+        reader = CaptureReader(self.recorder.path)
+        if not len(reader):
+            self.response_text.append("没有可导出的数据。")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出数据为CSV", "", "CSV Files (*.csv)")
+        if file_path:
+            export_in_background(self, file_path, CSV_HEADER, capture_series(reader), self.response_text.append,
+                                 total=len(reader), value_format=VALUE_FORMAT)
+
+    def process_serial_lines(self, lines):
+        # 界面线程中执行，重绘由 render_scheduler 按帧率合并
+        for line in lines:
+            self.process_serial_data(line)
+        self.render_scheduler.mark_dirty('log', self.response_text.flush)
+        self.render_scheduler.mark_dirty('plot', self.update_plot)
 
     def process_serial_data(self, line):
         try:
             data = float(line)
-            self.data_x.append(self.counter)
-            self.data_y.append(data)
-            self.counter += 1
-            self.response_text.append(f"收到数据: {data}")
-            self.csv_writer.writerow([time.time(), data])
-            self.update_plot()
+            self.data.append(self.data.total, data)
+            self.response_text.extend([f"收到数据: {data}"])
         except ValueError:
-            self.response_text.append(f"无效数据: {line}")
+            self.response_text.extend([f"无效数据: {line}"])
 
     def update_plot(self):
-        self.ax.clear()
-        self.ax.set_xlabel('Time')
-        self.ax.set_ylabel('Data')
-        self.ax.plot(self.data_x, self.data_y)
-        self.canvas.draw()
+        if len(self.data):
+            self.live_plot.update_rings({'data': self.data})
 
     def send_command(self):
-        if not self.ser or not self.ser.is_open:
+        if self.device is None or not self.device.is_open:
             self.response_text.append("请先连接串口")
             return
 
@@ -245,44 +283,48 @@ class SerialTab(QWidget):
         elif command == 'functionMap':
             self.send_function_map()
         elif command == 'getPinFunction':
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 10
-            else:
-                pin_num = int(selected_pin)
-            self.send_get_pin_function(pin_num)
+            self.send_get_pin_function(pin_number(selected_pin))
         elif command == 'setPinFunction':
             selected_function = self.function_combo.currentText()
             function_num = function_map[selected_function]
-            if isinstance(selected_pin, str) and selected_pin.startswith('A'):
-                pin_num = ord(selected_pin[1]) - ord('0') + 10
-            else:
-                pin_num = int(selected_pin)
-            self.send_set_pin_function(pin_num, function_num)
+            self.send_set_pin_function(pin_number(selected_pin), function_num)
         elif command == 'startLoop':
             self.send_general_command(command)
         elif command == 'stopLoop':
             self.send_general_command(command)
+        elif command == 'getAllPinFunctions':
+            self.get_all_currentpin()
+        elif command == 'setStreamMode':
+            self.send_general_command(command, (stream_mode_map[self.function_combo.currentText()], SAMPLES_PER_FRAME))
+        elif command == 'setSampleRate':
+            self.send_set_sample_rate(sample_rate_map[self.function_combo.currentText()])
+
+    def send_request(self, command, args, handler):
+        # 命令进入写队列后立即返回 Future，不阻塞界面线程；应答按序号匹配后经信号回到界面线程调用 handler，
+        # 超时或写入失败时为 None
+        if self.device is None:
+            raise RuntimeError('串口未连接')
+        future = self.device.send(command_map[command], args,
+                                  lambda response: self.signals.command_reply.emit(handler, response))
+        self.response_text.append(f"已发送命令: {command} {list(args)}")
+        return future
 
     def send_get_current_function(self, pin):
         try:
-            if isinstance(pin, str) and pin.startswith('A'):
-                pin_num = ord(pin[1]) - ord('0') + 10
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
-            else:
-                pin_num = int(pin)
-                cmd_bytes = bytes([command_map['getcurrentPinFunction'], pin_num])
-
-            with self.lock:
-                self.ser.write(cmd_bytes + b'\r\n')
-            self.response_text.append(f"已发送命令: {cmd_bytes + b'\r\n'}")
-            time.sleep(0.1)
-            with self.lock:
-                response = self.ser.readline().decode().strip()
-            self.response_text.append(f"接收到的响应: {response}")
-            if response:
-                self.pin_labels[pin].setText(f'引脚 {pin}: {response}')
-            else:
-                self.pin_labels[pin].setText(f'引脚 {pin}: 未获取到功能')
+            pin_num = pin_number(pin)
+            label = self.pin_labels[pin]
+
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                status, payload = parse_reply(response)
+                if status == RESPONSE_OK and payload:
+                    # 与 disiban.py 一样显示功能名称
+                    label.setText(f'引脚 {pin}: {function_name(payload)}')
+                elif response:
+                    label.setText(f'引脚 {pin}: {response}')
+                else:
+                    label.setText(f'引脚 {pin}: 未获取到功能')
+            self.send_request('getcurrentPinFunction', (pin_num,), handle_response)
         except KeyError:
             self.response_text.append(f"错误：在 self.pin_labels 字典中未找到键 {pin}")
         except Exception as e:
@@ -290,83 +332,88 @@ class SerialTab(QWidget):
 
     def send_function_map(self):
         try:
-            cmd_bytes = bytes([command_map['functionMap']])
-            with self.lock:
-                self.ser.write(cmd_bytes + b'\r\n')
-            self.response_text.append(f"已发送命令: {cmd_bytes + b'\r\n'}")
-            time.sleep(0.1)
-            with self.lock:
-                response = self.ser.readline().decode().strip()
-            self.response_text.append(f"接收到的响应: {response}")
-            if response:
-                self.response_text.append(f"响应: {response}")
-            else:
-                self.response_text.append("未收到响应。")
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                if response:
+                    self.response_text.append(f"响应: {response}")
+                else:
+                    self.response_text.append("未收到响应。")
+            self.send_request('functionMap', (), handle_response)
         except Exception as e:
             self.response_text.append(f"发送 functionMap 命令时出错: {e}")
 
     def send_get_pin_function(self, pin):
         try:
-            cmd_bytes = bytes([command_map['getPinFunction'], pin])
-            with self.lock:
-                self.ser.write(cmd_bytes + b'\r\n')
-            self.response_text.append(f"已发送命令: {cmd_bytes + b'\r\n'}")
-            time.sleep(0.1)
-            with self.lock:
-                response = self.ser.readline().decode().strip()
-            self.response_text.append(f"接收到的响应: {response}")
-            if response:
-                self.response_text.append(f"引脚 {pin} 功能响应: {response}")
-            else:
-                self.response_text.append(f"引脚 {pin} 未收到响应。")
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                if response:
+                    self.response_text.append(f"引脚 {pin} 功能响应: {response}")
+                else:
+                    self.response_text.append(f"引脚 {pin} 未收到响应。")
+            self.send_request('getPinFunction', (pin,), handle_response)
         except Exception as e:
             self.response_text.append(f"发送 getPinFunction 命令时出错: {e}")
 
     def send_set_pin_function(self, pin, function):
         try:
-            cmd_bytes = bytes([command_map['setPinFunction'], pin, function])
-            with self.lock:
-                self.ser.write(cmd_bytes + b'\r\n')
-            self.response_text.append(f"已发送命令: {cmd_bytes + b'\r\n'}")
-            time.sleep(0.1)
-            with self.lock:
-                response = self.ser.readline().decode().strip()
-            self.response_text.append(f"接收到的响应: {response}")
-            if response:
-                self.response_text.append(f"设置引脚 {pin} 功能为 {function} 响应: {response}")
-            else:
-                self.response_text.append(f"设置引脚 {pin} 功能为 {function} 未收到响应。")
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                if response:
+                    self.response_text.append(f"设置引脚 {pin} 功能为 {function} 响应: {response}")
+                else:
+                    self.response_text.append(f"设置引脚 {pin} 功能为 {function} 未收到响应。")
+            self.send_request('setPinFunction', (pin, function), handle_response)
         except Exception as e:
             self.response_text.append(f"发送 setPinFunction 命令时出错: {e}")
 
-    def send_general_command(self, command):
+    def send_general_command(self, command, args=()):
         try:
-            cmd_bytes = bytes([command_map[command]])
-            with self.lock:
-                self.ser.write(cmd_bytes + b'\r\n')
-            self.response_text.append(f"已发送命令: {cmd_bytes + b'\r\n'}")
-            time.sleep(0.1)
-            with self.lock:
-                response = self.ser.readline().decode().strip()
-            self.response_text.append(f"接收到的响应: {response}")
-            if response:
-                self.response_text.append(f"响应: {response}")
-            else:
-                self.response_text.append("未收到响应。")
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                if response:
+                    self.response_text.append(f"响应: {response}")
+                else:
+                    self.response_text.append("未收到响应。")
+            self.send_request(command, args, handle_response)
         except Exception as e:
             self.response_text.append(f"发送 {command} 命令时出错: {e}")
 
+    def send_set_sample_rate(self, period_ms):
+        try:
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                if not response:
+                    self.response_text.append(f"设置采样周期为 {period_ms} ms 未收到响应。")
+                    return
+                # 响应为 ok 枚举值后接实际采样周期，固件按系统节拍取整；记录的时间戳按实际周期排开
+                status, payload = parse_reply(response)
+                actual_ms = int(payload) if status == RESPONSE_OK and payload.isdigit() else period_ms
+                if self.device is not None:
+                    self.device.sample_period_ms = actual_ms
+                self.response_text.append(f"设置采样周期为 {period_ms} ms 响应: {response}，实际周期 {actual_ms} ms")
+            self.send_request('setSampleRate', (period_ms & 0xFF, period_ms >> 8), handle_response)
+        except Exception as e:
+            self.response_text.append(f"发送 setSampleRate 命令时出错: {e}")
+
     def update_function_combo_visibility(self):
         command = self.command_combo.currentText()
         if command == 'setPinFunction':
             self.function_label.show()
             self.function_combo.show()
             self.update_function_options()
+        elif command in command_options:
+            self.function_label.show()
+            self.function_combo.show()
+            self.function_combo.clear()
+            self.function_combo.addItems(list(command_options[command].keys()))
         else:
             self.function_label.hide()
             self.function_combo.hide()
 
     def update_function_options(self):
+        # setStreamMode、setSampleRate 的选项与引脚无关
+        if self.command_combo.currentText() in command_options:
+            return
         selected_pin = self.pin_combo.currentText()
         if isinstance(selected_pin, str) and selected_pin.startswith('A'):
             pin = selected_pin
@@ -386,8 +433,36 @@ class SerialTab(QWidget):
             self.response_text.append("已切换到串口显示模式")
 
     def get_all_currentpin(self):
-        for pin in pin_ranges:
-            self.send_get_current_function(str(pin))
+        # 一条 getAllPinFunctions 命令取回所有引脚的当前功能，应答为 ok 后按 pin_ranges 顺序每个引脚一位数字
+        try:
+            def handle_response(response):
+                self.response_text.append(f"接收到的响应: {response}")
+                if response is None:
+                    # 超时说明板子没有应答，逐个查询只会再多 14 个超时
+                    self.response_text.append("getAllPinFunctions 未收到响应。")
+                    return
+                status, payload = parse_reply(response)
+                if status != RESPONSE_OK or len(payload) < len(pin_ranges):
+                    # 旧固件不认识该命令（应答为空或出错）时逐个引脚查询
+                    for pin in pin_ranges:
+                        self.send_get_current_function(str(pin))
+                    return
+                for pin, digit in zip(pin_ranges, payload):
+                    self.pin_labels[str(pin)].setText(f'引脚 {pin}: {function_name(digit)}')
+            self.send_request('getAllPinFunctions', (), handle_response)
+        except Exception as e:
+            self.response_text.append(f"发送 getAllPinFunctions 命令时出错: {e}")
+
+    def shutdown(self):
+        # 窗口关闭时调用：写完并关闭数据记录文件，停止读取线程和命令通道，关闭串口
+        self.recorder.close()
+        device, self.device = self.device, None
+        if device is not None:
+            device.close()
+
+    def closeEvent(self, event):
+        self.shutdown()
+        super().closeEvent(event)
 
     def refresh_ports(self):
         ports = serial.tools.list_ports.comports()
@@ -396,37 +471,79 @@ class SerialTab(QWidget):
             self.serial_combo.addItem(port.device)
 
     def connect_serial(self):
-        port = self.serial_combo.currentText()
-        try:
-            if self.ser and self.ser.is_open:
-                self.ser.close()
-            self.ser = serial.Serial(port, baudrate=115200, timeout=1)
-            self.response_text.append(f"已成功连接到 {port}")
-        except serial.SerialException as e:
-            self.response_text.append(f"连接 {port} 时出现错误: {e}")
+        self.open_device(self.serial_combo.currentText())
 
 
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
+        self.pending_probes = set()  # 尚未探测完的串口
+        self.skipped_ports = []  # 打不开或没有应答、已跳过的串口
+        self.discovery_signals = PortDiscoverySignals()
+        self.discovery_signals.probed.connect(self.on_port_probed)
         self.init_ui()
 
     def init_ui(self):
         layout = QVBoxLayout()
+        self.status_label = QLabel()
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
         self.tab_widget = QTabWidget()
         layout.addWidget(self.tab_widget)
         self.setLayout(layout)
 
-    def add_serial_tab(self, port):
-        tab = SerialTab(port)
+    def add_serial_tab(self, port, ser=None):
+        tab = SerialTab(port, ser)
         self.tab_widget.addTab(tab, port)
 
+    def discover(self, ports):
+        # 窗口先显示，所有候选串口同时在后台探测，应答 TestBox 协议的串口探测完就添加标签页
+        self.pending_probes.update(ports)
+        self.update_discovery_status()
+        probe_ports(ports, self.discovery_signals.probed.emit)
+        # 打开串口本身卡住的探测不再等待
+        QTimer.singleShot(int((PROBE_TIMEOUT + 1) * 1000), self.finish_discovery)
+
+    def on_port_probed(self, port, ser, error):
+        if port not in self.pending_probes:
+            # 截止后才结束的探测：不再添加标签页
+            if ser is not None:
+                ser.close()
+            return
+        self.pending_probes.discard(port)
+        if ser is not None:
+            self.add_serial_tab(port, ser)
+        else:
+            self.skipped_ports.append(f'{port}（{error}）')
+        self.update_discovery_status()
+
+    def finish_discovery(self):
+        self.skipped_ports.extend(f'{port}（打开超时）' for port in sorted(self.pending_probes))
+        self.pending_probes.clear()
+        self.update_discovery_status()
+
+    def update_discovery_status(self):
+        if self.pending_probes:
+            status = f'正在查找 TestBox：还有 {len(self.pending_probes)} 个串口'
+        else:
+            status = f'找到 {self.tab_widget.count()} 个 TestBox'
+        if self.skipped_ports:
+            status += '，已跳过 ' + '、'.join(self.skipped_ports)
+        self.status_label.setText(status)
+
+    def closeEvent(self, event):
+        # 标签页不会收到 closeEvent，由主窗口逐个关闭
+        self.pending_probes.clear()
+        for i in range(self.tab_widget.count()):
+            self.tab_widget.widget(i).shutdown()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
     window = MainWindow()
-    ports = serial.tools.list_ports.comports()
-    for port in ports:
-        window.add_serial_tab(port.device)
     window.show()
+    # 命令行可以指定候选串口（包括 sim:// 虚拟设备），否则探测系统中所有串口
+    ports = sys.argv[1:] or [port.device for port in serial.tools.list_ports.comports()]
+    window.discover(ports)
     sys.exit(app.exec_())
\ No newline at end of file